@@ -0,0 +1,353 @@
+"""Admission control for the model-backed endpoints.
+
+Every /generateanswer request passes ``AdmissionController.admit`` before
+the graph runs:
+
+1. Quota. Each user, and the service as a whole, has a token bucket
+   measured in model tokens, not requests. A request reserves the expected
+   usage (a running average of recent requests). When it finishes, the
+   bucket is charged the tokens it actually used. A turn answered by the
+   router gives its whole reservation back; one that needed five tool
+   rounds pays for all of them. Turns that never reached the model
+   (router or cache answers) are left out of the running average, which
+   would otherwise sink towards zero and under-reserve model turns.
+2. Concurrency. At most ADMISSION_MAX_INFLIGHT graph runs execute at once.
+   Further requests wait in a short queue.
+3. Load shedding. A request that finds the queue full, or waits in it
+   longer than ADMISSION_QUEUE_SECONDS, is turned away. So is a user or
+   the service that is over quota. Rejections raise ``Rejected``, which
+   carries the seconds until a retry can succeed (HTTP 429 + Retry-After).
+
+Settings:
+
+    ADMISSION_ENABLED                   false turns all of this off (default true)
+    ADMISSION_USER_TOKENS_PER_MINUTE    per-user refill rate (default 60000; 0 = no user limit)
+    ADMISSION_USER_BURST                per-user bucket size (default 2x the per-minute rate)
+    ADMISSION_GLOBAL_TOKENS_PER_MINUTE  service-wide refill rate (default 1000000; 0 = no limit)
+    ADMISSION_GLOBAL_BURST              service-wide bucket size (default the per-minute rate)
+    ADMISSION_ESTIMATE_TOKENS           reservation before any usage has been seen (default 3000)
+    ADMISSION_MAX_INFLIGHT              graph runs at once (default 32)
+    ADMISSION_QUEUE_SIZE                requests allowed to wait for a slot (default 64)
+    ADMISSION_QUEUE_SECONDS             longest wait for a slot (default 5)
+    ADMISSION_USER_HEADER               header naming the user, e.g. X-User-ID set by a
+                                        gateway (default: unset, the client address is used)
+    ADMISSION_BACKEND                   "memory" (default) or "sql" to share the buckets
+                                        between workers through ADMISSION_DB_URI (falls
+                                        back to DB_URI)
+
+The concurrency limit and queue are per worker; they protect the process
+they run in. With ``sql`` the quotas hold across all workers.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Field, Session, SQLModel, select
+
+from executor import run_blocking
+
+GLOBAL_KEY = "global"
+
+
+class Rejected(Exception):
+    """A request turned away; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class MemoryBuckets:
+    """Token buckets in this process."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, rate, capacity)
+        self._buckets: Dict[str, Tuple[float, float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _level(self, key: str, rate: float, capacity: float, now: float) -> float:
+        tokens, updated, _, _ = self._buckets.get(key, (capacity, now, rate, capacity))
+        return min(capacity, tokens + (now - updated) * rate)
+
+    def take(self, key: str, rate: float, capacity: float, amount: float) -> float:
+        """Take ``amount`` tokens if the bucket holds that many; otherwise return the seconds until it will."""
+        now = time.time()
+        with self._lock:
+            level = self._level(key, rate, capacity, now)
+            if level < amount:
+                return (amount - level) / rate
+            self._buckets[key] = (level - amount, now, rate, capacity)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def charge(self, key: str, rate: float, capacity: float, amount: float) -> None:
+        """Take ``amount`` more (negative refunds, up to a full bucket); the bucket may go into debt."""
+        now = time.time()
+        with self._lock:
+            self._buckets[key] = (min(capacity, self._level(key, rate, capacity, now) - amount), now, rate, capacity)
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled is the same as a missing one.
+        full = [
+            key for key, (tokens, updated, rate, capacity) in self._buckets.items()
+            if tokens + (now - updated) * rate >= capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+
+
+class RateBucket(SQLModel, table=True):
+    key: str = Field(primary_key=True, max_length=200)
+    tokens: float
+    updated_at: float
+
+
+class SQLBuckets:
+    """Token buckets in a SQL table, shared by every worker that uses the same database.
+
+    Each take is a single conditional UPDATE, so concurrent workers cannot
+    both spend the same tokens.
+    """
+
+    blocking = True
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._is_setup = False
+
+    def setup(self) -> None:
+        if not self._is_setup:
+            SQLModel.metadata.create_all(self.engine, tables=[RateBucket.__table__])
+            self._is_setup = True
+
+    def _level(self, rate: float, capacity: float, now: float):
+        refilled = RateBucket.tokens + (now - RateBucket.updated_at) * rate
+        return case((refilled > capacity, capacity), else_=refilled)
+
+    def take(self, key: str, rate: float, capacity: float, amount: float) -> float:
+        self.setup()
+        now = time.time()
+        level = self._level(rate, capacity, now)
+        with Session(self.engine) as session:
+            result = session.execute(
+                update(RateBucket).where(RateBucket.key == key, level >= amount).values(tokens=level - amount, updated_at=now)
+            )
+            if result.rowcount == 1:
+                session.commit()
+                return 0.0
+            row = session.exec(select(RateBucket).where(RateBucket.key == key)).first()
+            if row is None:
+                if capacity < amount:
+                    return (amount - capacity) / rate
+                try:
+                    with session.begin_nested():
+                        session.add(RateBucket(key=key, tokens=capacity - amount, updated_at=now))
+                    session.commit()
+                    return 0.0
+                except IntegrityError:
+                    # Another worker created it first; go through the UPDATE again.
+                    session.rollback()
+                    return self.take(key, rate, capacity, amount)
+            current = min(capacity, row.tokens + (now - row.updated_at) * rate)
+            return max(amount - current, 1.0) / rate
+
+    def charge(self, key: str, rate: float, capacity: float, amount: float) -> None:
+        self.setup()
+        now = time.time()
+        with Session(self.engine) as session:
+            charged = self._level(rate, capacity, now) - amount
+            session.execute(
+                update(RateBucket).where(RateBucket.key == key).values(tokens=case((charged > capacity, capacity), else_=charged), updated_at=now)
+            )
+            session.commit()
+
+
+@dataclass
+class Limit:
+    """A token bucket's refill rate (tokens per second) and size."""
+
+    rate: float
+    capacity: float
+
+    @classmethod
+    def per_minute(cls, tokens_per_minute: float, burst: Optional[float] = None) -> Optional["Limit"]:
+        if tokens_per_minute <= 0:
+            return None
+        return cls(tokens_per_minute / 60, burst if burst else tokens_per_minute)
+
+
+@dataclass
+class Ticket:
+    user: str
+    reserved: float
+    started: float
+
+
+class AdmissionController:
+    """Quota, concurrency limit and wait queue in front of the graph.
+
+    Args:
+        user_limit: Per-user token bucket, or None for no per-user quota.
+        global_limit: Service-wide token bucket, or None.
+        max_inflight: Graph runs allowed at once.
+        queue_size: Requests allowed to wait for a free slot.
+        queue_seconds: Longest a request waits before it is shed.
+        estimate_tokens: Tokens reserved per request until usage has been seen.
+        buckets: MemoryBuckets or SQLBuckets.
+        enabled: False admits everything.
+    """
+
+    def __init__(
+        self,
+        user_limit: Optional[Limit] = None,
+        global_limit: Optional[Limit] = None,
+        max_inflight: int = 32,
+        queue_size: int = 64,
+        queue_seconds: float = 5.0,
+        estimate_tokens: float = 3000,
+        buckets: Any = None,
+        enabled: bool = True,
+    ):
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.queue_seconds = queue_seconds
+        self.estimate_tokens = estimate_tokens
+        self.buckets = buckets or MemoryBuckets()
+        self.enabled = enabled
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.tokens_used = 0
+        self.avg_run_seconds = 1.0
+        self._slots = asyncio.Semaphore(max_inflight)
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        def burst(name: str) -> Optional[float]:
+            return float(os.environ[name]) if os.getenv(name) else None
+
+        user_rate = float(os.getenv("ADMISSION_USER_TOKENS_PER_MINUTE", "60000"))
+        buckets = MemoryBuckets()
+        if os.getenv("ADMISSION_BACKEND", "memory") == "sql":
+            from shared.db import create_db_engine
+
+            buckets = SQLBuckets(create_db_engine("admission", os.getenv("ADMISSION_DB_URI") or os.getenv("DB_URI")))
+        return cls(
+            user_limit=Limit.per_minute(user_rate, burst("ADMISSION_USER_BURST") or 2 * user_rate),
+            global_limit=Limit.per_minute(float(os.getenv("ADMISSION_GLOBAL_TOKENS_PER_MINUTE", "1000000")), burst("ADMISSION_GLOBAL_BURST")),
+            max_inflight=int(os.getenv("ADMISSION_MAX_INFLIGHT", "32")),
+            queue_size=int(os.getenv("ADMISSION_QUEUE_SIZE", "64")),
+            queue_seconds=float(os.getenv("ADMISSION_QUEUE_SECONDS", "5")),
+            estimate_tokens=float(os.getenv("ADMISSION_ESTIMATE_TOKENS", "3000")),
+            buckets=buckets,
+            enabled=os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "tokens_used": self.tokens_used,
+            "estimate_tokens": round(self.estimate_tokens),
+            "avg_run_seconds": round(self.avg_run_seconds, 3),
+        }
+
+    def _limits(self, user: str):
+        limits = []
+        if self.user_limit:
+            limits.append((f"user:{user}", self.user_limit))
+        if self.global_limit:
+            limits.append((GLOBAL_KEY, self.global_limit))
+        return limits
+
+    def _reject(self, reason: str, retry_after: float) -> Rejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return Rejected(reason, retry_after)
+
+    def _reserve(self, user: str, amount: float) -> None:
+        taken = []
+        for key, limit in self._limits(user):
+            wait = self.buckets.take(key, limit.rate, limit.capacity, min(amount, limit.capacity))
+            if wait > 0:
+                for taken_key, taken_limit in taken:
+                    self.buckets.charge(taken_key, taken_limit.rate, taken_limit.capacity, -min(amount, taken_limit.capacity))
+                raise self._reject("global_quota" if key == GLOBAL_KEY else "user_quota", wait)
+            taken.append((key, limit))
+
+    def _settle(self, user: str, amount: float) -> None:
+        if amount:
+            for key, limit in self._limits(user):
+                self.buckets.charge(key, limit.rate, limit.capacity, amount)
+
+    async def _buckets_call(self, func, *args) -> None:
+        # The SQL backend blocks; keep it off the event loop.
+        if self.buckets.blocking:
+            await run_blocking(func, *args)
+        else:
+            func(*args)
+
+    async def admit(self, user: str) -> Optional[Ticket]:
+        """Reserve quota and a run slot for ``user``, waiting in the queue if needed.
+
+        Raises:
+            Rejected: The user or the service is over quota, or the queue is full.
+        """
+        if not self.enabled:
+            return None
+        reserved = max(1.0, self.estimate_tokens)
+        await self._buckets_call(self._reserve, user, reserved)
+        try:
+            if self._slots.locked():
+                if self.waiting >= self.queue_size:
+                    raise self._reject("overloaded", self.avg_run_seconds * (self.waiting + 1) / self.max_inflight)
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_seconds)
+                except asyncio.TimeoutError:
+                    raise self._reject("queue_timeout", self.avg_run_seconds * (self.waiting + 1) / self.max_inflight)
+                finally:
+                    self.waiting -= 1
+            else:
+                await self._slots.acquire()
+        except BaseException:
+            # Turned away, or cancelled while queued because the client went
+            # away: the reservation was never used. Shielded, so a second
+            # cancellation can't interrupt the refund.
+            await asyncio.shield(self._buckets_call(self._settle, user, -reserved))
+            raise
+        self.inflight += 1
+        self.admitted += 1
+        return Ticket(user, reserved, time.perf_counter())
+
+    async def release(self, ticket: Optional[Ticket], tokens_used: int) -> None:
+        """Free the run slot and charge the tokens actually used instead of the reservation."""
+        if ticket is None:
+            return
+        self._slots.release()
+        self.inflight -= 1
+        self.tokens_used += tokens_used
+        self.avg_run_seconds = 0.9 * self.avg_run_seconds + 0.1 * (time.perf_counter() - ticket.started)
+        if tokens_used > 0:
+            self.estimate_tokens = 0.9 * self.estimate_tokens + 0.1 * tokens_used
+        await self._buckets_call(self._settle, ticket.user, tokens_used - ticket.reserved)
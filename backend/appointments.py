@@ -0,0 +1,198 @@
+import base64
+import datetime
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import Index, UniqueConstraint, inspect, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Field, Session, SQLModel, select
+
+from nutritionist_directory import format_time, parse_time
+
+
+class Appointment(SQLModel, table=True):
+    """A booked slot. A doctor can hold at most one appointment per date and time.
+
+    The unique constraint doubles as the (doctor, date, time) index used by
+    per-doctor lookups; the second index serves lookups by day.
+    """
+
+    __table_args__ = (
+        UniqueConstraint("doctor", "date", "time", name="uq_appointment_slot"),
+        Index("ix_appointment_date_time", "date", "time"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    doctor: str
+    date: datetime.date
+    time: datetime.time
+    specialization: str
+
+
+def ensure_slot_index(engine) -> bool:
+    """Create the (doctor, date, time) unique index if the table lacks it.
+
+    create_all only adds the constraint when it creates the table, so an
+    ``appointment`` table from before the constraint existed would still
+    accept double bookings. Returns True if the index had to be created;
+    raises RuntimeError if existing rows already double-book a slot.
+    """
+    with engine.begin() as connection:
+        schema = inspect(connection)
+        if not schema.has_table(Appointment.__tablename__):
+            return False
+        slot = {"doctor", "date", "time"}
+        existing = [info for info in schema.get_unique_constraints(Appointment.__tablename__)] + [
+            info for info in schema.get_indexes(Appointment.__tablename__) if info.get("unique")
+        ]
+        if any(set(info["column_names"]) == slot for info in existing):
+            return False
+        duplicates = connection.execute(text(
+            "SELECT doctor, date, time, COUNT(*) FROM appointment GROUP BY doctor, date, time HAVING COUNT(*) > 1"
+        )).fetchall()
+        if duplicates:
+            doctor, day, at, _ = duplicates[0]
+            raise RuntimeError(
+                f"Cannot add the unique appointment slot index; {len(duplicates)} slots are booked more than once, "
+                f"e.g. {doctor} on {day} at {at}. Resolve them and restart."
+            )
+        connection.execute(text("CREATE UNIQUE INDEX uq_appointment_slot ON appointment (doctor, date, time)"))
+    print("Created the unique appointment slot index uq_appointment_slot.")
+    return True
+
+
+@dataclass
+class BookingResult:
+    status: str  # "booked", "conflict" or "invalid"
+    message: str
+    appointment: Optional[Appointment] = None
+
+    @property
+    def booked(self) -> bool:
+        return self.status == "booked"
+
+
+def book(engine, doctor: str, date: str, time: str, specialization: str) -> BookingResult:
+    """Insert an appointment, or report a conflict if the slot is taken.
+
+    The insert relies on the unique constraint rather than a prior SELECT,
+    so concurrent bookings of one slot cannot both succeed: exactly one
+    commit wins and the others get an IntegrityError.
+    """
+    try:
+        slot_date = datetime.date.fromisoformat(date.strip())
+        slot_time = parse_time(time).replace(second=0, microsecond=0)
+    except ValueError as e:
+        return BookingResult("invalid", f"Could not book: {e}. Use YYYY-MM-DD for the date and HH:MM for the time.")
+
+    appointment = Appointment(doctor=doctor.strip(), date=slot_date, time=slot_time, specialization=specialization)
+    with Session(engine, expire_on_commit=False) as session:
+        session.add(appointment)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return BookingResult(
+                "conflict",
+                f"Dr. {appointment.doctor} is already booked on {slot_date.isoformat()} at {format_time(slot_time)}. "
+                "Please choose another time.",
+            )
+    return BookingResult(
+        "booked",
+        f"Appointment booked successfully with Dr. {appointment.doctor} (Specialization: {specialization}) "
+        f"on {slot_date.isoformat()} at {format_time(slot_time)}. Appointment ID: {appointment.id}.",
+        appointment,
+    )
+
+
+@dataclass
+class AppointmentFilter:
+    doctor: Optional[str] = None
+    date_from: Optional[datetime.date] = None
+    date_to: Optional[datetime.date] = None
+    specialization: Optional[str] = None
+
+    @classmethod
+    def parse(cls, doctor: str = "", date_from: str = "", date_to: str = "", specialization: str = "") -> "AppointmentFilter":
+        """Build a filter from optional strings; raises ValueError on a bad date."""
+        return cls(
+            doctor=doctor.strip() or None,
+            date_from=datetime.date.fromisoformat(date_from.strip()) if date_from.strip() else None,
+            date_to=datetime.date.fromisoformat(date_to.strip()) if date_to.strip() else None,
+            specialization=specialization.strip() or None,
+        )
+
+
+def encode_cursor(appointment: Appointment) -> str:
+    raw = f"{appointment.date.isoformat()}|{appointment.time.isoformat()}|{appointment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.date, datetime.time, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, at, appointment_id = raw.split("|")
+        return datetime.date.fromisoformat(day), datetime.time.fromisoformat(at), int(appointment_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def query_appointments(
+    session: Session,
+    filters: AppointmentFilter,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Appointment], Optional[str]]:
+    """Return one page of appointments ordered by (date, time, id) and the next cursor.
+
+    Pages are keyset-based: the cursor holds the last (date, time, id) seen and
+    the next page starts strictly after it, so deep pages cost the same as the
+    first one. ``next_cursor`` is None on the last page.
+    """
+    statement = select(Appointment)
+    if filters.doctor:
+        statement = statement.where(Appointment.doctor == filters.doctor)
+    if filters.date_from:
+        statement = statement.where(Appointment.date >= filters.date_from)
+    if filters.date_to:
+        statement = statement.where(Appointment.date <= filters.date_to)
+    if filters.specialization:
+        statement = statement.where(Appointment.specialization == filters.specialization)
+    if cursor:
+        statement = statement.where(
+            tuple_(Appointment.date, Appointment.time, Appointment.id) > tuple_(*decode_cursor(cursor))
+        )
+    # Fetch one extra row to know whether another page exists.
+    statement = statement.order_by(Appointment.date, Appointment.time, Appointment.id).limit(limit + 1)
+    rows = list(session.exec(statement))
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def iter_appointments(engine, filters: AppointmentFilter, batch_size: int = 500) -> Iterator[Appointment]:
+    """Yield every matching appointment, one keyset page at a time."""
+    cursor = None
+    while True:
+        with Session(engine) as session:
+            page, cursor = query_appointments(session, filters, batch_size, cursor)
+        yield from page
+        if cursor is None:
+            return
+
+
+def summarize(appointment: Appointment) -> str:
+    return (
+        f"#{appointment.id} {appointment.date.isoformat()} {format_time(appointment.time)} "
+        f"{appointment.doctor} ({appointment.specialization})"
+    )
+
+
+def to_record(appointment: Appointment) -> dict:
+    return {
+        "id": appointment.id,
+        "doctor": appointment.doctor,
+        "date": appointment.date.isoformat(),
+        "time": appointment.time.strftime("%H:%M"),
+        "specialization": appointment.specialization,
+    }
@@ -0,0 +1,112 @@
+"""One client bursts /generateanswer while another asks at a normal pace, with and without admission control.
+
+    poetry run python bench/admission_burst.py --burst 64 --concurrency 32
+
+Runs bench/fake_services.py twice (ADMISSION_ENABLED=false, then true with
+the limits below) and prints, per client, how many requests were answered
+or turned away with 429 and the quiet client's latency. With admission
+control, the bursting client hits its token quota and gets Retry-After,
+and the quiet client's latency stays close to an idle service.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import Service, percentile
+
+
+def ask(url: str, user: str, text: str) -> tuple:
+    request = urllib.request.Request(
+        url, data=json.dumps({"input_text": text}).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-User-ID": user},
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            status, retry_after = response.status, None
+    except urllib.error.HTTPError as e:
+        status, retry_after = e.code, e.headers.get("Retry-After")
+    return status, time.perf_counter() - started, retry_after
+
+
+def run(enabled: bool, args, env: Dict[str, str], work_dir: str) -> None:
+    service = Service("chat", {**env, "ADMISSION_ENABLED": str(enabled).lower()}, work_dir)
+    try:
+        service.wait("/health/ready")
+        url = service.url + "/generateanswer"
+        statuses: Dict[str, Dict[int, int]] = {"burst": {}, "quiet": {}}
+        quiet_latencies: List[float] = []
+        retry_afters: List[str] = []
+        lock = threading.Lock()
+
+        def record(user: str, result: tuple) -> None:
+            status, elapsed, retry_after = result
+            with lock:
+                statuses[user][status] = statuses[user].get(status, 0) + 1
+                if user == "quiet" and status == 200:
+                    quiet_latencies.append(elapsed)
+                if retry_after:
+                    retry_afters.append(retry_after)
+
+        def quiet() -> None:
+            for i in range(args.quiet):
+                record("quiet", ask(url, "quiet", "What should I eat for breakfast?"))
+                time.sleep(args.quiet_interval)
+
+        quiet_thread = threading.Thread(target=quiet)
+        quiet_thread.start()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for result in pool.map(lambda i: ask(url, "burst", f"Which snacks are high in protein? ({i})"), range(args.burst)):
+                record("burst", result)
+        quiet_thread.join()
+
+        label = "admission on " if enabled else "admission off"
+        print(f"{label}  burst {statuses['burst']}  quiet {statuses['quiet']}  "
+              f"quiet p50 {1000 * percentile(quiet_latencies, 50):.0f} ms  p95 {1000 * percentile(quiet_latencies, 95):.0f} ms"
+              + (f"  Retry-After {min(retry_afters)}-{max(retry_afters)}s" if retry_afters else ""))
+    finally:
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=64, help="requests from the bursting client")
+    parser.add_argument("--concurrency", type=int, default=32, help="parallel requests of the bursting client")
+    parser.add_argument("--quiet", type=int, default=10, help="requests from the quiet client")
+    parser.add_argument("--quiet-interval", type=float, default=0.3)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    parser.add_argument("--user-tokens-per-minute", type=int, default=60000)
+    parser.add_argument("--max-inflight", type=int, default=8)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-admission-")
+    env = {
+        **os.environ,
+        "DB_URI": f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+        "INDEX_STORE_DIR": os.path.join(work_dir, "index"),
+        "FAKE_LLM_MS": str(args.llm_ms),
+        "SEMANTIC_CACHE_THRESHOLD": "0",
+        "RESPONSE_CACHE_SIZE": "0",
+        "LOG_LEVEL": "warning",
+        "ADMISSION_USER_HEADER": "X-User-ID",
+        "ADMISSION_USER_TOKENS_PER_MINUTE": str(args.user_tokens_per_minute),
+        "ADMISSION_USER_BURST": str(args.user_tokens_per_minute // 2),
+        "ADMISSION_MAX_INFLIGHT": str(args.max_inflight),
+    }
+    for enabled in (False, True):
+        run(enabled, args, env, work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Recall@k, latency and memory of the FAISS index types on a synthetic corpus.
+
+    poetry run python bench/ann_indexes.py --vectors 50000 --dim 768
+
+Vectors are drawn around random cluster centres, which resembles embedded
+text better than uniform noise. Ground truth comes from the exact flat
+index. Each ANN type is swept over its query-time knob (nprobe for IVF,
+efSearch for HNSW); queries run one at a time, as they do in the app.
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.ann import AnnConfig, apply_search_params, build_index, factory_string, index_bytes
+
+
+def synthetic(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=count)
+    return centres[labels] + 0.35 * rng.normal(size=(count, dim)).astype("float32")
+
+
+def evaluate(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> tuple:
+    latencies = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+    latencies.sort()
+    return recall, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    corpus = synthetic(args.vectors + args.queries, args.dim, args.clusters, args.seed)
+    vectors, queries = corpus[: args.vectors], corpus[args.vectors:]
+
+    flat = build_index(vectors, AnnConfig("flat"))
+    _, truth = flat.search(queries, args.k)
+
+    sweeps = {
+        "flat": [None],
+        "ivf_flat": [1, 4, 16, 64],
+        "ivf_sq8": [4, 16, 64],
+        "ivf_pq": [4, 16, 64],
+        "hnsw": [16, 64, 256],
+        "hnsw_sq8": [16, 64, 256],
+    }
+    print(f"{args.vectors} x {args.dim} vectors, {args.queries} queries, recall@{args.k}, single-threaded\n")
+    print(f"{'index':<24}{'knob':>10}{'build s':>9}{'MB':>9}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for kind, knobs in sweeps.items():
+        config = AnnConfig(kind)
+        start = time.perf_counter()
+        index = flat if kind == "flat" else build_index(vectors, config)
+        build = 0.0 if kind == "flat" else time.perf_counter() - start
+        megabytes = index_bytes(index) / 2 ** 20
+        for knob in knobs:
+            if knob is not None:
+                config.nprobe = config.ef_search = knob
+                apply_search_params(index, config)
+            recall, p50, p99 = evaluate(index, queries, truth, args.k)
+            label = factory_string(config, args.dim, args.vectors)
+            knob_label = "" if knob is None else (f"nprobe={knob}" if kind.startswith("ivf") else f"ef={knob}")
+            print(f"{label:<24}{knob_label:>10}{build:>9.1f}{megabytes:>9.1f}{recall:>8.3f}{p50:>9.3f}{p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compare POST /calories/batch with looping the single-call function.
+
+    poetry run python bench/calorie_batch.py --rows 100000
+
+The endpoint is called in process through FastAPI's TestClient on the real
+chat app (with the offline fakes from bench/fake_services.py), so its times
+include parsing the JSON body, validation, the batch computation and
+encoding the response, for both ``format=columns`` (the default) and
+``format=records``. The function-level times show how that splits up;
+parsing the request alone bounds how far the endpoint can beat the loop.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calories import (
+    ACTIVITY_MULTIPLIERS,
+    batch_to_columns,
+    batch_to_records,
+    calculate_daily_calories,
+    calculate_daily_calories_batch,
+)
+
+
+def roster(rows: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {
+        "gender": [rng.choice(["male", "female"]) for _ in range(rows)],
+        "weight": [rng.uniform(20, 150) for _ in range(rows)],
+        "height": [rng.uniform(100, 210) for _ in range(rows)],
+        "age": [rng.randint(2, 90) for _ in range(rows)],
+        "activity_level": [rng.choice(list(ACTIVITY_MULTIPLIERS)) for _ in range(rows)],
+    }
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def endpoint_client():
+    os.environ.setdefault("INDEX_STORE_DIR", tempfile.mkdtemp(prefix="bench-calories-"))
+    os.environ.setdefault("DB_URI", f"sqlite:///{os.path.join(os.environ['INDEX_STORE_DIR'], 'bench.db')}")
+    from fastapi.testclient import TestClient
+
+    from fake_services import chat_app
+
+    return TestClient(chat_app().app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    data = roster(args.rows)
+    columns = list(data.values())
+    body = json.dumps(data)
+    client = endpoint_client()
+    from main import CalorieBatch
+
+    def post(format: str):
+        response = client.post(f"/calories/batch?format={format}", content=body, headers={"Content-Type": "application/json"})
+        response.raise_for_status()
+        return response
+
+    post("columns")  # warm up
+    looped, loop_seconds = timed(lambda: [calculate_daily_calories(*row) for row in zip(*columns)])
+    endpoint_columns, columns_seconds = timed(lambda: post("columns"))
+    endpoint_records, records_seconds = timed(lambda: post("records"))
+    _, parse_seconds = timed(lambda: CalorieBatch(**orjson.loads(body)))
+    batch, batch_seconds = timed(lambda: calculate_daily_calories_batch(**data))
+    columns_body, encode_columns_seconds = timed(
+        lambda: orjson.dumps(batch_to_columns(batch), option=orjson.OPT_SERIALIZE_NUMPY)
+    )
+    records, encode_records_seconds = timed(lambda: batch_to_records(batch))
+    codes = {**data, "gender": np.array([g == "female" for g in data["gender"]], dtype=np.intp)}
+    _, codes_seconds = timed(lambda: calculate_daily_calories_batch(**codes))
+
+    assert records == looped, "batch results differ from the single-call function"
+    assert endpoint_records.json()["results"] == json.loads(json.dumps(looped)), "endpoint records differ"
+    assert endpoint_columns.json()["maintain"] == [row["maintenance_plan"]["maintain"] for row in looped], "endpoint columns differ"
+
+    print(f"rows:                                {args.rows}")
+    print(f"loop over single-call:               {loop_seconds * 1000:8.1f} ms")
+    print(f"POST /calories/batch (columns):      {columns_seconds * 1000:8.1f} ms  ({loop_seconds / columns_seconds:.1f}x)")
+    print(f"POST /calories/batch?format=records: {records_seconds * 1000:8.1f} ms  ({loop_seconds / records_seconds:.1f}x)")
+    print(f"  parse and validate the request:    {parse_seconds * 1000:8.1f} ms")
+    print(f"  batch computation:                 {batch_seconds * 1000:8.1f} ms  ({loop_seconds / batch_seconds:.0f}x)")
+    print(f"    with precomputed gender codes:   {codes_seconds * 1000:8.1f} ms")
+    print(f"  batch_to_columns + orjson:         {encode_columns_seconds * 1000:8.1f} ms  ({len(columns_body) / 1e6:.1f} MB)")
+    print(f"  batch_to_records:                  {encode_records_seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Drain the email outbox into a local aiosmtpd server and check nothing is lost.
+
+    poetry run python bench/email_outbox.py --messages 500 --busy-every 10
+
+Needs aiosmtpd (``pip install aiosmtpd``). Every ``--busy-every``-th
+recipient is refused with a transient 451 on its first attempt, so the
+retry path is exercised too. Uses a throwaway SQLite outbox.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "login")]
+
+from aiosmtpd.controller import Controller
+from sqlmodel import Session, SQLModel
+
+from mailer import OutboxWorker, SMTPConnectionPool, SMTPSettings, enqueue_email, outbox_stats
+from shared.db import create_db_engine
+
+
+class Handler:
+    def __init__(self, busy_every: int):
+        self.busy_every = busy_every
+        self.refused = set()
+        self.delivered = Counter()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        number = int(address.split("@")[0].removeprefix("user"))
+        if self.busy_every and number % self.busy_every == 0 and address not in self.refused:
+            self.refused.add(address)
+            return "451 4.7.1 Rate limited, try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        # Simulate a little server-side latency per message.
+        await asyncio.sleep(0.002)
+        self.delivered.update(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--busy-every", type=int, default=10)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = Handler(args.busy_every)
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+
+    engine = create_db_engine("email_bench", f"sqlite:///{tempfile.mkdtemp()}/outbox.db")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for number in range(1, args.messages + 1):
+            enqueue_email(session, f"user{number}@example.com", "Bench", "Hello")
+        session.commit()
+
+    settings = SMTPSettings("127.0.0.1", args.port, None, None, False, "bench@example.com", 10.0)
+    pool = SMTPConnectionPool(settings, size=args.pool_size)
+    worker = OutboxWorker(
+        engine,
+        pool,
+        batch_size=args.batch_size,
+        retry_base=0.1,
+        retry_max=0.5,
+    )
+    start = time.perf_counter()
+    while True:
+        stats = outbox_stats(engine)
+        if not stats.get("pending") and not stats.get("sending"):
+            break
+        if not worker.run_once():
+            time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    controller.stop()
+
+    print(f"{args.messages} messages in {elapsed:.2f}s ({args.messages / elapsed:.0f}/s)")
+    print(f"outbox: {stats}; SMTP connections opened: {pool.opened}; transient refusals: {len(handler.refused)}")
+    assert stats.get("sent") == args.messages, "messages were lost or dead-lettered"
+    assert all(count == 1 for count in handler.delivered.values()), "a message was delivered twice"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Run the chat or login service with the fakes from bench/fakes.py instead of Google, Tavily and SMTP.
+
+    poetry run python bench/fake_services.py chat --port 8101
+    SMTP_PORT=8025 poetry run python bench/fake_services.py login --port 8155
+    poetry run python bench/fake_services.py chat --port 8101 --workers 4
+
+Everything else (graph, tools, caches, database, outbox) is the real code.
+The chat service gets a private index store, built offline with the fake
+embeddings from FAKE_KB_PAGES generated pages (or KNOWLEDGE_MANIFEST when
+set), so runs never touch the network. bench/suite.py starts these for you.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+FOODS = ["oats", "lentils", "salmon", "greek yogurt", "quinoa", "almonds", "spinach", "eggs", "chickpeas", "brown rice",
+         "avocado", "tofu", "sweet potato", "berries", "chicken breast", "broccoli", "cottage cheese", "olive oil"]
+TOPICS = ["weight loss", "muscle gain", "heart health", "blood sugar", "a 1500 calorie diet", "a 2000 calorie diet"]
+
+
+def synthetic_manifest(directory: str, pages: int) -> str:
+    """Write ``pages`` plain-text nutrition pages and a manifest for them; returns the manifest path."""
+    sources = []
+    for page in range(pages):
+        paragraphs = []
+        for i in range(40):
+            food, topic = FOODS[(page * 7 + i) % len(FOODS)], TOPICS[(page + i) % len(TOPICS)]
+            paragraphs.append(
+                f"{food.capitalize()} fits well into {topic}. A typical portion provides about {80 + (i * 37) % 300} kcal, "
+                f"{2 + (i * 5) % 25} g of protein and {1 + (i * 3) % 12} g of fibre. Pair {food} with "
+                f"{FOODS[(page + i * 5) % len(FOODS)]} at breakfast or lunch to stay full for longer."
+            )
+        path = os.path.join(directory, f"page-{page}.txt")
+        with open(path, "w") as f:
+            f.write("\n\n".join(paragraphs))
+        sources.append({"name": f"bench-page-{page}", "path": path})
+    manifest = os.path.join(directory, "knowledge_sources.json")
+    with open(manifest, "w") as f:
+        json.dump({"sources": sources}, f)
+    return manifest
+
+
+def chat_app():
+    # Read at import time by rag.sources, so they must be set first.
+    store = os.environ.setdefault("INDEX_STORE_DIR", tempfile.mkdtemp(prefix="bench-index-"))
+    os.environ.setdefault("INGEST_DIR", os.path.join(store, "ingest"))
+    if "KNOWLEDGE_MANIFEST" not in os.environ:
+        # The saved pages in knowledge/ are not checked in; index generated ones instead.
+        pages = os.path.join(store, "pages")
+        os.makedirs(pages, exist_ok=True)
+        os.environ["KNOWLEDGE_MANIFEST"] = synthetic_manifest(pages, int(os.getenv("FAKE_KB_PAGES", "3")))
+    os.environ["INGEST_OFFLINE"] = "true"
+    os.environ.setdefault("GOOGLE_API_KEY", "fake")
+    os.environ.setdefault("TAVILY_API_KEY", "fake")
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+
+    import main
+    from fakes import FakeChatModel, FakeEmbeddings, FakeSearchTool
+    from rag.ann import AnnConfig
+    from rag.embedding_cache import CachedEmbeddings
+    from rag.index_store import IndexStore
+
+    main.llm.factory = FakeChatModel.from_env
+    main.embedding_client = FakeEmbeddings.from_env
+    main.index_store.factory = lambda: IndexStore(
+        os.environ["INDEX_STORE_DIR"],
+        CachedEmbeddings(FakeEmbeddings.from_env(), os.path.join(os.environ["INDEX_STORE_DIR"], "embeddings"), "fake-embedding"),
+        "fake-embedding",
+        AnnConfig.from_env(),
+    )
+    search = FakeSearchTool.from_env()
+    main.tool_node.tools[search.name] = search
+    return main
+
+
+def login_app():
+    os.environ.setdefault("SMTP_SERVER", "127.0.0.1")
+    os.environ.setdefault("SMTP_PORT", "8025")
+    os.environ.setdefault("SMTP_STARTTLS", "false")
+    os.environ.setdefault("SMTP_FROM", "bench@example.com")
+    os.environ.setdefault("MAIL_POLL_SECONDS", "0.5")
+    login_dir = os.path.join(BACKEND_DIR, "login")
+    os.chdir(login_dir)
+    sys.path.insert(0, login_dir)
+
+    import main
+
+    main.create_tables()
+    return main
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("service", choices=["chat", "login"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--workers", type=int, default=1, help="pre-forked workers, as with serve.py")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        os.environ.setdefault("CHECKPOINTER", "sql")
+    service = chat_app() if args.service == "chat" else login_app()
+    sys.path.append(BACKEND_DIR)
+    from serve import serve
+
+    serve(service.app, args.workers, args.host, args.port, getattr(service, "PRELOAD", []), getattr(service, "after_fork", None))
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
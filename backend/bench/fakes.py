@@ -0,0 +1,239 @@
+"""Local stand-ins for Gemini, the Gemini embeddings, Tavily and an SMTP server.
+
+They behave like the real services closely enough to exercise the same code
+paths (tool calls, retrieval, confirmation mail) and take a configurable
+amount of time, so benchmarks measure our overhead rather than a network:
+
+    FAKE_LLM_MS          time per model call (default 400)
+    FAKE_LLM_JITTER      +/- share of that time drawn at random (default 0.25)
+    FAKE_EMBED_MS        time per embedding request (default 40)
+    FAKE_SEARCH_MS       time per web search (default 600)
+    FAKE_SMTP_MS         time the SMTP server takes per message (default 20)
+    FAKE_SEED            seed for the jitter (default 0)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+
+def _ms(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default))) / 1000
+
+
+_rng = random.Random(int(os.getenv("FAKE_SEED", "0")))
+_rng_lock = threading.Lock()
+
+
+def jittered(seconds: float) -> float:
+    jitter = float(os.getenv("FAKE_LLM_JITTER", "0.25"))
+    with _rng_lock:
+        return max(0.0, seconds * (1 + _rng.uniform(-jitter, jitter)))
+
+
+def _last_human(messages: List[BaseMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage) and isinstance(message.content, str):
+            return message.content.lower()
+    return ""
+
+
+def _count_tokens(messages: List[BaseMessage]) -> int:
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """A chat model that picks tools by keyword, like a well-behaved Gemini would.
+
+    A question about diets or food calls ``healthline_search``, one about
+    news or research calls ``tavily_search_results_json``, one about
+    nutritionists calls ``find_available_nutritionists`` and a calorie
+    question with numbers calls ``calorie_calculator_tool``. After the tool
+    results come back, or for anything else, it answers in prose. Each
+    call sleeps ``FAKE_LLM_MS`` and reports token usage.
+    """
+
+    latency: float = 0.4
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": "fake-gemini"}
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _decide(self, messages: List[BaseMessage]) -> AIMessage:
+        usage = {"input_tokens": _count_tokens(messages)}
+        if not isinstance(messages[-1], ToolMessage):
+            text = _last_human(messages)
+            call = None
+            if re.search(r"\b(latest|news|research|study|studies)\b", text):
+                call = ("tavily_search_results_json", {"query": text[:200]})
+            elif re.search(r"\bnutritionists?\b", text):
+                call = ("find_available_nutritionists", {"specialization": "", "date": "", "time": ""})
+            elif re.search(r"\bcalorie", text) and re.search(r"\d", text):
+                call = ("calorie_calculator_tool", {"gender": "female", "weight": 65, "height": 168, "age": 30, "activity_level": "moderate"})
+            elif re.search(r"\b(diet|eat|food|meal|protein|snack)s?\b", text):
+                call = ("healthline_search", {"query": text[:200]})
+            if call is not None:
+                name, args = call
+                call_id = hashlib.sha1(f"{name}{len(messages)}{time.time_ns()}".encode()).hexdigest()[:12]
+                return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}],
+                                 usage_metadata={**usage, "output_tokens": 20, "total_tokens": usage["input_tokens"] + 20})
+        words = " ".join(["Here is a balanced suggestion based on what you told me."] * max(1, self.answer_words // 10))
+        output = len(words) // 4
+        return AIMessage(content=words, usage_metadata={**usage, "output_tokens": output, "total_tokens": usage["input_tokens"] + output})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(jittered(self.latency))
+        return ChatResult(generations=[ChatGeneration(message=self._decide(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(jittered(self.latency))
+        return ChatResult(generations=[ChatGeneration(message=self._decide(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        # First token after ~40% of the call, the rest streamed over the remainder.
+        total = jittered(self.latency)
+        await asyncio.sleep(total * 0.4)
+        message = self._decide(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                    for call in message.tool_calls
+                ], usage_metadata=message.usage_metadata))
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(total * 0.6 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + (" " if i < len(words) - 1 else "")))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+    @classmethod
+    def from_env(cls) -> "FakeChatModel":
+        return cls(latency=_ms("FAKE_LLM_MS", 400))
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors from word hashes, so similar texts land close together."""
+
+    def __init__(self, dim: int = 768, latency: float = 0.04):
+        self.dim = dim
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype="float32")
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+    @classmethod
+    def from_env(cls) -> "FakeEmbeddings":
+        return cls(latency=_ms("FAKE_EMBED_MS", 40))
+
+
+class FakeSearchTool(BaseTool):
+    """Stands in for TavilySearchResults under the same tool name."""
+
+    name: str = "tavily_search_results_json"
+    description: str = "A search engine for current events and research. Input should be a search query."
+    latency: float = 0.6
+
+    def _results(self, query: str) -> List[Dict[str, str]]:
+        return [
+            {"url": f"https://example.org/{i}", "content": f"Result {i} about {query}: " + "lorem ipsum " * 40}
+            for i in range(5)
+        ]
+
+    def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> List[Dict[str, str]]:
+        time.sleep(jittered(self.latency))
+        return self._results(query)
+
+    async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> List[Dict[str, str]]:
+        await asyncio.sleep(jittered(self.latency))
+        return self._results(query)
+
+    @classmethod
+    def from_env(cls) -> "FakeSearchTool":
+        return cls(latency=_ms("FAKE_SEARCH_MS", 600))
+
+
+class CapturingSMTPServer:
+    """A local SMTP server (aiosmtpd) that keeps the confirmation token of every message.
+
+    ``wait_for(address)`` returns the token mailed to ``address``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025, latency: Optional[float] = None):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise ImportError("The fake SMTP server needs aiosmtpd; install it with `pip install aiosmtpd`.")
+        self.latency = _ms("FAKE_SMTP_MS", 20) if latency is None else latency
+        self.tokens: Dict[str, str] = {}
+        self.messages = 0
+        self._condition = threading.Condition()
+        self.controller = Controller(self, hostname=host, port=port)
+        self.host, self.port = host, port
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        body = envelope.content.decode("utf-8", errors="replace")
+        match = re.search(r"/confirm-email/([\w-]+)", body)
+        with self._condition:
+            self.messages += 1
+            if match:
+                for address in envelope.rcpt_tos:
+                    self.tokens[address.lower()] = match.group(1)
+            self._condition.notify_all()
+        return "250 Message accepted for delivery"
+
+    def wait_for(self, address: str, timeout: float = 30.0) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while address.lower() not in self.tokens:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            return self.tokens.pop(address.lower())
+
+    def __enter__(self) -> "CapturingSMTPServer":
+        self.controller.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.controller.stop()
@@ -0,0 +1,46 @@
+"""Fire concurrent requests at /generateanswer and check that they overlap.
+
+Run the chat service first, then:
+    poetry run python bench/load_generateanswer.py --concurrency 16
+
+If requests were serialized on the event loop, the wall time would be close
+to the sum of the individual latencies (overlap ~1.0). With the async graph
+path the overlap factor should approach the concurrency level.
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post(url: str, text: str) -> float:
+    body = json.dumps({"input_text": text}).encode("utf-8")
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8001/generateanswer")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--text", default="What can I eat on a 1500 calorie diet?")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(lambda _: post(args.url, args.text), range(args.concurrency)))
+    wall = time.perf_counter() - start
+
+    print(f"requests:        {len(latencies)}")
+    print(f"wall time:       {wall:.2f}s")
+    print(f"sum of latency:  {sum(latencies):.2f}s")
+    print(f"max latency:     {max(latencies):.2f}s")
+    print(f"overlap factor:  {sum(latencies) / wall:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Measure latency of an unrelated endpoint while a signup burst is hashed.
+
+Run the login service first, then:
+    poetry run python bench/login_signup_burst.py --signups 50
+
+/system-status is probed at a steady rate before and during a burst of
+registrations. When bcrypt runs on the event loop, the probe's p99 grows
+with every hash queued ahead of it; with hashing on the pool it should stay
+close to the idle baseline.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def timed_get(url: str) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def register(url: str) -> float:
+    body = json.dumps({
+        "First_Name": "Bench",
+        "Last_Name": "User",
+        "email": f"bench-{uuid.uuid4().hex}@example.com",
+        "password": "Bench-pass1",
+        "confirm_password": "Bench-pass1",
+    }).encode("utf-8")
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        e.read()
+    return time.perf_counter() - start
+
+
+def probe(url: str, stop: threading.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        latencies.append(timed_get(url))
+        time.sleep(interval)
+    return latencies
+
+
+def percentile(values: list, q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def report(label: str, latencies: list) -> None:
+    print(f"{label:<14} n={len(latencies):<4} p50={percentile(latencies, 50) * 1000:7.1f}ms  "
+          f"p99={percentile(latencies, 99) * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8055")
+    parser.add_argument("--signups", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    status_url = f"{args.base_url}/system-status"
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as prober:
+        baseline = prober.submit(probe, status_url, stop, args.interval)
+        time.sleep(args.baseline_seconds)
+        stop.set()
+        report("idle", baseline.result())
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as prober:
+        during = prober.submit(probe, status_url, stop, args.interval)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            signups = list(pool.map(lambda _: register(f"{args.base_url}/register/"), range(args.signups)))
+        wall = time.perf_counter() - start
+        stop.set()
+        report("during burst", during.result())
+
+    report("signup", signups)
+    print(f"{args.signups} signups in {wall:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
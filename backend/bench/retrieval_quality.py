@@ -0,0 +1,92 @@
+"""Compare dense, hybrid and reranked retrieval on a fixed query set.
+
+    poetry run python bench/retrieval_quality.py
+    poetry run python bench/retrieval_quality.py --offline --fake-embeddings
+
+Each query in bench/retrieval_queries.json lists substrings, any of which
+marks a retrieved chunk as relevant. Reports hit rate and MRR at k plus
+search latency (the query embedding is computed once per query and shared
+by every mode, so latency covers retrieval only).
+
+``--fake-embeddings`` indexes the ingested chunks with deterministic random
+vectors so the run needs no API key; dense scores are then meaningless and
+only the BM25 contribution and the latencies are informative.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from rag.hybrid import HybridSearcher
+from rag.sources import get_index_store, knowledge_base
+
+MODES = {
+    "dense": dict(bm25_weight=0.0, rerank=False),
+    "hybrid": dict(rerank=False),
+    "hybrid+rerank": dict(rerank=True),
+    "hybrid+rerank+mmr": dict(rerank=True, mmr=True),
+}
+
+
+def relevant(text: str, expect: list) -> bool:
+    text = text.lower()
+    return any(needle.lower() in text for needle in expect)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", default=os.path.join(BACKEND_DIR, "bench", "retrieval_queries.json"))
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query and mode")
+    parser.add_argument("--offline", action="store_true", help="ingest from local snapshots only")
+    parser.add_argument("--fake-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        queries = json.load(f)["queries"]
+
+    sources = knowledge_base(offline=args.offline)
+    if args.fake_embeddings:
+        embedding = DeterministicFakeEmbedding(size=256)
+        chunks = [chunk for source in sources for chunk in source.loader().load()]
+        vectorstore = FAISS.from_documents(chunks, embedding)
+    else:
+        vectorstore = get_index_store().load_merged(sources)
+        embedding = vectorstore.embedding_function
+    query_vectors = [embedding.embed_query(item["query"]) for item in queries]
+    print(f"{vectorstore.index.ntotal} chunks, {len(queries)} queries, k={args.k}\n")
+
+    print(f"{'mode':<20}{'hit@k':>8}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode, options in MODES.items():
+        searcher = HybridSearcher(vectorstore, k=args.k, fetch_k=args.fetch_k, **options)
+        hits, reciprocal_ranks, latencies = 0, [], []
+        for item, query_vector in zip(queries, query_vectors):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                documents = searcher.search(item["query"], query_vector)
+                latencies.append(time.perf_counter() - start)
+            ranks = [rank for rank, document in enumerate(documents, start=1) if relevant(document.page_content, item["expect"])]
+            hits += bool(ranks)
+            reciprocal_ranks.append(1.0 / ranks[0] if ranks else 0.0)
+        latencies.sort()
+        print(
+            f"{mode:<20}{hits / len(queries):>8.2f}{statistics.mean(reciprocal_ranks):>8.3f}"
+            f"{latencies[len(latencies) // 2] * 1000:>10.2f}{latencies[int(len(latencies) * 0.95)] * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Exercise the guarded tools stage with fake local tools that sleep or fail.
+
+    poetry run python bench/tool_timeouts.py --hang 30 --timeout 1
+
+Three tools stand in for the real ones: ``fast_lookup`` (50 ms),
+``slow_search`` (sleeps ``--hang`` seconds, like a stuck Tavily request)
+and ``flaky_api`` (always raises). Each scenario prints the wall time
+and the content of every tool result, so you can check that:
+
+- calls run concurrently
+- the hung call is cut off at its timeout
+- the breaker opens after repeated failures
+- the turn budget and round cap hold
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+
+from tool_runner import GuardedToolNode
+
+
+def build_tools(hang: float):
+    @tool
+    async def fast_lookup(query: str) -> str:
+        """Answers after 50 ms."""
+        await asyncio.sleep(0.05)
+        return f"fast result for {query}"
+
+    @tool
+    async def slow_search(query: str) -> str:
+        """Hangs like a stuck HTTP request."""
+        await asyncio.sleep(hang)
+        return f"slow result for {query}"
+
+    @tool
+    async def flaky_api(query: str) -> str:
+        """Always fails."""
+        raise ConnectionError("upstream reset the connection")
+
+    return [fast_lookup, slow_search, flaky_api]
+
+
+def state(names, rounds: int = 1, started: float = None):
+    messages = [HumanMessage(content="question")]
+    for round_number in range(rounds):
+        calls = [{"name": name, "args": {"query": "q"}, "id": f"{round_number}-{i}", "type": "tool_call"} for i, name in enumerate(names)]
+        messages.append(AIMessage(content="", tool_calls=calls))
+    return {"messages": messages, "turn_started": started or time.time()}
+
+
+async def scenario(title: str, node: GuardedToolNode, turn: dict) -> None:
+    start = time.perf_counter()
+    result = await node.ainvoke(turn)
+    print(f"\n{title}: {time.perf_counter() - start:.2f}s")
+    for message in result["messages"]:
+        print(f"  {getattr(message, 'name', None) or message.type}: {str(message.content)[:90]}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hang", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--budget", type=float, default=5.0)
+    args = parser.parse_args()
+
+    node = GuardedToolNode(
+        build_tools(args.hang), timeout=args.timeout, turn_budget=args.budget,
+        max_rounds=2, breaker_failures=3, breaker_reset=60,
+    )
+    await scenario("five fast calls in parallel", node, state(["fast_lookup"] * 5))
+    await scenario("fast + hung + failing", node, state(["fast_lookup", "slow_search", "flaky_api"]))
+    await scenario("flaky again (2nd and 3rd failure open the breaker)", node, state(["flaky_api", "flaky_api"]))
+    await scenario("flaky with the breaker open", node, state(["flaky_api"]))
+    await scenario("turn budget already spent", node, state(["fast_lookup"], started=time.time() - args.budget))
+    await scenario("third round (cap is 2)", node, state(["fast_lookup"], rounds=3))
+    await scenario("fourth round: the turn is closed", node, state(["fast_lookup"], rounds=4))
+    print()
+    for name, stats in node.stats()["tools"].items():
+        print(f"{name}: {stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""Throughput of the chat service with 1, 2, 4... pre-forked workers (see serve.py).
+
+    poetry run python bench/worker_scaling.py --workers 1,2,4 --requests 400
+
+Each step starts bench/fake_services.py with that many workers and zero
+fake model, embedding and search latency, so requests are CPU bound: half
+are /generateanswer questions answered from the knowledge base (hybrid
+retrieval plus the graph), half are /calories/batch rosters. Reports
+throughput, speedup over one worker and the workers' memory: RSS counts
+shared pages in every worker, PSS splits them, so a PSS total well below
+the RSS total means the preloaded indexes are shared. Speedup can only
+approach the worker count up to the number of free cores.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from suite import Service, percentile, request
+
+QUESTIONS = [
+    "Which foods should I eat for heart health?",
+    "What is a good protein snack for muscle gain?",
+    "What should I eat on a 1500 calorie diet?",
+    "Which meals help with blood sugar?",
+]
+
+
+def roster(rows: int, rng: random.Random) -> Dict[str, list]:
+    return {
+        "gender": [rng.choice(["male", "female"]) for _ in range(rows)],
+        "weight": [round(rng.uniform(40, 120), 1) for _ in range(rows)],
+        "height": [round(rng.uniform(150, 200), 1) for _ in range(rows)],
+        "age": [rng.randint(18, 80) for _ in range(rows)],
+        "activity_level": [rng.choice(["sedentary", "light", "moderate", "active", "very active"]) for _ in range(rows)],
+    }
+
+
+def worker_memory(pid: int) -> Dict[str, float]:
+    """Summed RSS and PSS of a launcher's worker processes, from /proc (Linux only)."""
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0}
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            # One worker is served from the launcher itself.
+            children = [int(child) for child in f.read().split()] or [pid]
+        for child in children:
+            with open(f"/proc/{child}/smaps_rollup") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("Rss", "Pss"):
+                        totals[key.lower() + "_mb"] += int(value.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {key: round(value, 1) for key, value in totals.items()}
+
+
+def run(workers: int, args, env: Dict[str, str], work_dir: str) -> Dict[str, float]:
+    service = Service("chat", env, work_dir, workers=workers)
+    try:
+        service.wait("/health/ready")
+        rng = random.Random(args.seed)
+        rosters = [roster(args.rows, rng) for _ in range(8)]
+        concurrency = args.concurrency or 4 * workers
+
+        def one(i: int) -> float:
+            started = time.perf_counter()
+            if i % 2:
+                status = request("POST", service.url + "/calories/batch", rosters[i % len(rosters)])[0]
+            else:
+                status = request("POST", service.url + "/generateanswer",
+                                 {"input_text": QUESTIONS[i % len(QUESTIONS)], "thread_id": uuid.uuid4().hex})[0]
+            if status != 200:
+                raise RuntimeError(f"HTTP {status}")
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(min(args.requests, 4 * concurrency))))  # warm every worker
+            started = time.perf_counter()
+            latencies: List[float] = list(pool.map(one, range(args.requests)))
+            wall = time.perf_counter() - started
+        return {
+            "workers": workers,
+            "throughput_rps": round(args.requests / wall, 1),
+            "p50_ms": round(1000 * percentile(latencies, 50), 1),
+            "p95_ms": round(1000 * percentile(latencies, 95), 1),
+            **worker_memory(service.process.pid),
+        }
+    finally:
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=0, help="clients (default 4 per worker)")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per calorie roster")
+    parser.add_argument("--kb-pages", type=int, default=20, help="generated knowledge base pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-workers-")
+    env = {
+        **os.environ,
+        "DB_URI": f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+        # Shared by every step, so only the first one builds the indexes.
+        "INDEX_STORE_DIR": os.path.join(work_dir, "index"),
+        "FAKE_KB_PAGES": str(args.kb_pages),
+        "FAKE_LLM_MS": "0",
+        "FAKE_EMBED_MS": "0",
+        "FAKE_SEARCH_MS": "0",
+        "SEMANTIC_CACHE_THRESHOLD": "0",
+        "RESPONSE_CACHE_SIZE": "0",
+        "ADMISSION_ENABLED": "false",
+        # Multi-worker runs need the shared checkpointer; use it for one worker too.
+        "CHECKPOINTER": "sql",
+        "LOG_LEVEL": "warning",
+    }
+    print(f"{os.cpu_count()} cores")
+    results = []
+    for workers in [int(n) for n in args.workers.split(",")]:
+        result = run(workers, args, env, work_dir)
+        result["speedup"] = round(result["throughput_rps"] / results[0]["throughput_rps"], 2) if results else 1.0
+        results.append(result)
+        print(f"{workers:>2} workers  {result['throughput_rps']:>7.1f} req/s  x{result['speedup']:<5}  "
+              f"p50 {result['p50_ms']:>7.1f}  p95 {result['p95_ms']:>7.1f} ms  "
+              f"RSS {result.get('rss_mb', '?')} MB  PSS {result.get('pss_mb', '?')} MB")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Ingest the knowledge base sources and build the on-disk FAISS index store ahead of deploy.
+
+Usage:
+    poetry run python build_index.py                    # fetch changed sources, re-embed only those
+    poetry run python build_index.py --offline          # use the saved pages in knowledge/ only
+    poetry run python build_index.py --save-snapshots   # also save fetched pages for offline runs
+    poetry run python build_index.py --check            # report which sources and merged index are stale
+"""
+import argparse
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from rag.ingest import load_manifest
+from rag.sources import KNOWLEDGE_MANIFEST, NUTRITIONISTS, get_index_store, get_ingestor, knowledge_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAISS index store.")
+    parser.add_argument("--check", action="store_true", help="only report sources without a usable index")
+    parser.add_argument("--offline", action="store_true", help="read local snapshots instead of fetching URLs")
+    parser.add_argument("--save-snapshots", action="store_true", help="write fetched pages to their manifest path")
+    args = parser.parse_args()
+
+    store = get_index_store()
+
+    if args.check:
+        sources = knowledge_base(args.offline)
+        stale = [source.name for source in [NUTRITIONISTS] + sources if not store.is_current(source)]
+        if not store.is_merged_current(sources):
+            stale.append(f"merged knowledge base ({store.ann.kind})")
+        for name in stale:
+            print(f"stale: {name}")
+        raise SystemExit(1 if stale else 0)
+
+    start = time.perf_counter()
+    results = get_ingestor(args.offline, args.save_snapshots).ingest(load_manifest(KNOWLEDGE_MANIFEST))
+    for result in results:
+        detail = result.error if result.status == "failed" else f"{result.chunks} chunks"
+        print(f"{result.name}: {result.status} ({detail})")
+    print(f"ingested in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    store.load_or_build(NUTRITIONISTS, refresh=True)
+    print(f"{NUTRITIONISTS.name}: ready in {time.perf_counter() - start:.2f}s")
+    # Builds each source's index, then the merged one the chat service loads.
+    start = time.perf_counter()
+    sources = knowledge_base(args.offline)
+    merged = store.load_merged(sources, refresh=True)
+    print(f"knowledge base ({len(sources)} sources, {store.ann.kind}, {merged.index.ntotal} vectors): "
+          f"ready in {time.perf_counter() - start:.2f}s")
+    print(f"embedding cache: {store.embedding.hits} hits, {store.embedding.misses} chunks embedded")
+    if any(result.status == "failed" for result in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import BaseMessage, HumanMessage
+
+# Tools that change state must always run; they are never cached.
+NEVER_CACHE = {"book_appointment", "delete_appointment"}
+# Additional tools can be opted out with CACHE_DISABLED_TOOLS=name1,name2
+DISABLED_TOOLS = {name.strip() for name in os.getenv("CACHE_DISABLED_TOOLS", "").split(",") if name.strip()}
+
+
+def tool_cache_enabled(name: str) -> bool:
+    return name not in NEVER_CACHE and name not in DISABLED_TOOLS
+
+
+def normalize(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+class ResponseCache:
+    """LRU/TTL cache keyed on normalized text, with optional semantic lookup.
+
+    Exact matches are looked up by normalized key. When an embedding
+    provider is configured, semantic lookups embed the query and search a
+    small FAISS inner-product index of the cached keys; a cached value is
+    reused if the cosine similarity reaches ``similarity_threshold``.
+
+    Each ``scope`` (e.g. a thread ID) has its own semantic index, so a
+    near-duplicate only matches entries stored in the same scope: "I weigh
+    80 kg" must not be answered from another user's "I weigh 85 kg".
+    Exact matches are shared, since the same text gets the same answer.
+
+    Args:
+        name: Name reported in the stats.
+        max_entries: LRU capacity.
+        ttl_seconds: Lifetime of an entry.
+        embedding_provider: Callable returning the ``Embeddings`` to use for
+            semantic lookups, or None to only serve exact matches.
+        similarity_threshold: Minimum cosine similarity for a semantic hit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        embedding_provider: Optional[Callable[[], Embeddings]] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedding_provider = embedding_provider
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # key -> (stored at, value, (scope, vector id) or None)
+        self._entries: "OrderedDict[str, Tuple[float, Any, Optional[Tuple[str, int]]]]" = OrderedDict()
+        self._keys_by_id: Dict[int, str] = {}
+        self._next_id = 0
+        self._indexes: Dict[str, faiss.IndexIDMap2] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.embedding_provider is not None and self.similarity_threshold > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "semantic_scopes": len(self._indexes),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _drop(self, key: str) -> None:
+        _, _, vector_ref = self._entries.pop(key)
+        if vector_ref is not None:
+            scope, vector_id = vector_ref
+            index = self._indexes[scope]
+            index.remove_ids(np.array([vector_id], dtype="int64"))
+            if index.ntotal == 0:
+                del self._indexes[scope]
+            del self._keys_by_id[vector_id]
+
+    def _lookup_exact(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if time.monotonic() - entry[0] > self.ttl_seconds:
+            self._drop(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def _lookup_vector(self, vector: np.ndarray, scope: str) -> Tuple[bool, Any]:
+        index = self._indexes.get(scope)
+        if index is None:
+            return False, None
+        scores, ids = index.search(vector, 1)
+        if ids[0][0] < 0 or scores[0][0] < self.similarity_threshold:
+            return False, None
+        return self._lookup_exact(self._keys_by_id[int(ids[0][0])])
+
+    def _store(self, key: str, value: Any, vector: Optional[np.ndarray], scope: str) -> None:
+        if key in self._entries:
+            self._drop(key)
+        vector_ref = None
+        if vector is not None:
+            if scope not in self._indexes:
+                self._indexes[scope] = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            vector_id = self._next_id
+            self._next_id += 1
+            self._indexes[scope].add_with_ids(vector, np.array([vector_id], dtype="int64"))
+            self._keys_by_id[vector_id] = key
+            vector_ref = (scope, vector_id)
+        self._entries[key] = (time.monotonic(), value, vector_ref)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _record(self, found: bool, semantic: bool = False) -> None:
+        with self._lock:
+            if found:
+                self.hits += 1
+                self.semantic_hits += int(semantic)
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _as_vector(embedded: Sequence[float]) -> np.ndarray:
+        vector = np.asarray([embedded], dtype="float32")
+        faiss.normalize_L2(vector)
+        return vector
+
+    def get(self, text: str, semantic: bool = True, scope: str = "") -> Tuple[bool, Any, Optional[List[float]]]:
+        """Look up a value.
+
+        Args:
+            text: The query; normalized into the key.
+            semantic: Fall back to a semantic lookup on an exact miss.
+            scope: Only entries put with the same scope match semantically.
+
+        Returns:
+            ``(found, value, vector)``. ``vector`` is the query embedding when
+            a semantic lookup was made, so ``put`` (and, on a miss, the search
+            itself) can reuse it instead of embedding the query again.
+        """
+        key = normalize(text)
+        with self._lock:
+            found, value = self._lookup_exact(key)
+        if found or not (semantic and self.semantic_enabled):
+            self._record(found)
+            return found, value, None
+        try:
+            embedded = self.embedding_provider().embed_query(key)
+        except Exception as e:
+            # The cache must never fail a request; treat it as a miss.
+            print(f"Semantic lookup failed for {self.name} cache:", e)
+            self._record(False)
+            return False, None, None
+        with self._lock:
+            found, value = self._lookup_vector(self._as_vector(embedded), scope)
+        self._record(found, semantic=True)
+        return found, value, embedded
+
+    async def aget(self, text: str, semantic: bool = True, scope: str = "") -> Tuple[bool, Any, Optional[List[float]]]:
+        """Async variant of ``get`` that awaits the query embedding."""
+        key = normalize(text)
+        with self._lock:
+            found, value = self._lookup_exact(key)
+        if found or not (semantic and self.semantic_enabled):
+            self._record(found)
+            return found, value, None
+        try:
+            embedded = await self.embedding_provider().aembed_query(key)
+        except Exception as e:
+            print(f"Semantic lookup failed for {self.name} cache:", e)
+            self._record(False)
+            return False, None, None
+        with self._lock:
+            found, value = self._lookup_vector(self._as_vector(embedded), scope)
+        self._record(found, semantic=True)
+        return found, value, embedded
+
+    def put(self, text: str, value: Any, vector: Optional[Sequence[float]] = None, scope: str = "") -> None:
+        """Store a value; ``vector`` (from ``get``) makes it reachable semantically within ``scope``."""
+        vector = None if vector is None else self._as_vector(vector)
+        with self._lock:
+            self._store(normalize(text), value, vector, scope)
+
+
+def messages_key(messages: Sequence[BaseMessage]) -> str:
+    """Serialize a message window into a cache key."""
+    return json.dumps(
+        [
+            [message.type, message.content, getattr(message, "tool_calls", None) or None]
+            for message in messages
+        ],
+        default=str,
+    )
+
+
+def is_fresh_question(messages: Sequence[BaseMessage]) -> bool:
+    """Semantic matching is only safe for a single question without history."""
+    return len(messages) == 1 and isinstance(messages[0], HumanMessage)
+
+
+def cached_tool(
+    cache: ResponseCache,
+    func: Callable,
+    name: Optional[str] = None,
+    skip: Callable[[Any], bool] = lambda result: False,
+) -> Callable:
+    """Wrap a tool function (sync or async) so its results are cached.
+
+    The wrapper keeps the function's signature and docstring so the tool
+    schema is unchanged. Tools in NEVER_CACHE or CACHE_DISABLED_TOOLS
+    (matched on ``name``, defaulting to the function name) are returned
+    as-is. Results for which ``skip`` returns True (e.g. error
+    messages) are not stored.
+    """
+    if not tool_cache_enabled(name or func.__name__):
+        return func
+
+    def key_for(args: tuple, kwargs: dict) -> Tuple[str, bool]:
+        values = list(args) + list(kwargs.values())
+        # A single free-text argument may be matched semantically.
+        if len(values) == 1 and isinstance(values[0], str):
+            return values[0], True
+        return json.dumps([args, kwargs], sort_keys=True, default=str), False
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key, semantic = key_for(args, kwargs)
+            found, value, vector = await cache.aget(key, semantic=semantic)
+            if found:
+                return value
+            result = await func(*args, **kwargs)
+            if not skip(result):
+                cache.put(key, result, vector)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key, semantic = key_for(args, kwargs)
+        found, value, vector = cache.get(key, semantic=semantic)
+        if found:
+            return value
+        result = func(*args, **kwargs)
+        if not skip(result):
+            cache.put(key, result, vector)
+        return result
+    return wrapper
+
+
+def cache_from_env(name: str, embedding_provider: Optional[Callable[[], Embeddings]] = None) -> ResponseCache:
+    """Build a cache configured by the RESPONSE_CACHE_* env variables."""
+    return ResponseCache(
+        name,
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+        embedding_provider=embedding_provider,
+        similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    )
+
+
+def model_cache_key(messages: Sequence[BaseMessage]) -> Tuple[str, bool]:
+    """Cache key for a model call and whether it may be matched semantically.
+
+    A fresh question is keyed on its text so near-duplicates can share an
+    answer; anything with history is keyed on the exact message window.
+    """
+    if is_fresh_question(messages) and isinstance(messages[0].content, str):
+        return messages[0].content, True
+    return messages_key(messages), False
+
+
+def cache_model_response(
+    cache: ResponseCache,
+    key: str,
+    message: BaseMessage,
+    vector: Optional[List[float]],
+    scope: str = "",
+) -> None:
+    """Store a model response under a key from ``model_cache_key``.
+
+    Responses that call a tool are bound to the exact request: "cancel
+    appointment 41" must not replay ``delete_appointment(42)``. They are
+    stored for exact matches only, and not at all when a call names a tool
+    in NEVER_CACHE or CACHE_DISABLED_TOOLS. Plain answers can be matched
+    semantically, but only by lookups in the same ``scope``.
+    """
+    tool_calls = getattr(message, "tool_calls", None) or []
+    if not all(tool_cache_enabled(call["name"]) for call in tool_calls):
+        return
+    cache.put(key, message, None if tool_calls else vector, scope=scope)
+
+
+def cached_message(message: BaseMessage) -> BaseMessage:
+    """Copy a cached message without its ID so the graph assigns a new one."""
+    return message.model_copy(update={"id": None})
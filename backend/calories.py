@@ -0,0 +1,314 @@
+import bisect
+import itertools
+import math
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Activity multipliers
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9
+}
+
+# Recommended calorie ranges by (gender, activity level), as
+# (min age, max age, min calories, max calories). Daily calories are clamped
+# into the range of the matching age band; other combinations are not clamped.
+CALORIE_CLAMPS = {
+    ("female", "lightly"): [(2, 6, 1000, 1400), (7, 18, 1200, 1800), (19, 60, 1600, 2000), (61, math.inf, 1600, math.inf)],
+    ("female", "active"): [(2, 6, 1000, 1600), (7, 18, 1600, 2400), (19, 60, 1800, 2400), (61, math.inf, 1800, 2000)],
+    ("male", "lightly"): [(2, 6, 1000, 1400), (7, 18, 1400, 2400), (19, 60, 2200, 2600), (61, math.inf, 2000, math.inf)],
+    ("male", "active"): [(2, 6, 1000, 1800), (7, 18, 1600, 3200), (19, 60, 2400, 3000), (61, math.inf, 2200, 2600)],
+}
+
+WEIGHT_GOALS = [
+    "You should increase your calorie intake to gain weight.",
+    "You should decrease your calorie intake to lose weight.",
+    "Your calorie intake is appropriate for maintaining your current weight.",
+]
+
+# Diet plans, selected by the first threshold the daily calories fall under
+DIET_PLANS = {
+    "1500": {
+        "goal": "Weight Loss",
+        "plan": [
+            "Breakfast: Greek yogurt with berries and chia seeds or oatmeal with sliced banana",
+            "Morning Snack: Apple with almond butter or a handful of mixed nuts",
+            "Lunch: Grilled chicken salad with greens and vinaigrette or quinoa salad with chickpeas and cucumber",
+            "Afternoon Snack: Cottage cheese with cucumber or carrot sticks with hummus",
+            "Dinner: Baked salmon, asparagus, and quinoa or stir-fried tofu with broccoli and brown rice",
+            "Evening Snack: Almonds or a small piece of dark chocolate"
+        ]
+    },
+    "1800": {
+        "goal": "Weight Maintenance",
+        "plan": [
+            "Breakfast: Scrambled eggs with spinach, whole-grain toast or smoothie with spinach and protein powder",
+            "Morning Snack: Orange and walnuts or Greek yogurt with honey",
+            "Lunch: Turkey wrap with hummus and veggies or lentil soup with whole-grain bread",
+            "Afternoon Snack: Banana with peanut butter or rice cakes with avocado",
+            "Dinner: Grilled chicken, sweet potato, and broccoli or baked tilapia with quinoa and green beans",
+            "Evening Snack: Cottage cheese with berries or air-popped popcorn"
+        ]
+    },
+    "2000": {
+        "goal": "Moderate Weight Gain",
+        "plan": [
+            "Breakfast: Overnight oats with banana and peanut butter or avocado toast with eggs",
+            "Morning Snack: Smoothie with protein powder or a protein bar",
+            "Lunch: Brown rice bowl with black beans and salsa or chicken stir-fry with vegetables",
+            "Afternoon Snack: Toast with cottage cheese and tomatoes or fruit salad",
+            "Dinner: Steak, mashed potatoes, and green beans or chicken curry with brown rice",
+            "Evening Snack: Greek yogurt with honey and pumpkin seeds or protein shake"
+        ]
+    },
+    "2200": {
+        "goal": "Active Weight Maintenance/Gain",
+        "plan": [
+            "Breakfast: Omelet with veggies and whole-grain toast or smoothie bowl with fruits and granola",
+            "Morning Snack: Greek yogurt with granola and blueberries or nut butter on whole-grain bread",
+            "Lunch: Tuna wrap with veggies or quinoa salad with chickpeas and feta",
+            "Afternoon Snack: Apple and almonds or veggie sticks with hummus",
+            "Dinner: Roasted chicken, brown rice, and carrots or fish tacos with cabbage slaw",
+            "Evening Snack: Dark chocolate with walnuts or a handful of dried fruit"
+        ]
+    },
+    "2500": {
+        "goal": "High-Calorie for Weight Gain",
+        "plan": [
+            "Breakfast: Smoothie bowl with peanut butter and granola or pancakes with maple syrup",
+            "Morning Snack: Crackers with cheese and apple or energy bites with oats and honey",
+            "Lunch: Quinoa bowl with chickpeas and roasted veggies or burrito with beans and cheese",
+            "Afternoon Snack: Protein bar or mixed nuts and dried fruit or yogurt with granola",
+            "Dinner: Pasta with ground turkey and salad or lamb kebabs with rice and grilled vegetables",
+            "Evening Snack: Cottage cheese with honey and mango or fruit and nut mix"
+        ]
+    }
+}
+
+PLAN_THRESHOLD_LIST = [1500, 1800, 2000, 2200]
+PLAN_THRESHOLDS = np.array(PLAN_THRESHOLD_LIST)
+PLAN_KEYS = ["1500", "1800", "2000", "2200", "2500"]
+
+INVALID_SEX = "Invalid sex. Please use 'male' or 'female'."
+INVALID_ACTIVITY = "Invalid activity level. Choose from 'sedentary', 'light', 'moderate', 'active', or 'very_active'."
+ERRORS = [INVALID_SEX, INVALID_ACTIVITY]
+
+
+def _clamp_range(gender: str, activity_level: str, age: float):
+    for min_age, max_age, low, high in CALORIE_CLAMPS.get((gender, activity_level), ()):
+        if min_age <= age <= max_age:
+            return low, high
+    return None
+
+
+def calculate_daily_calories(gender: str, weight: float, height: float, age: float, activity_level: str) -> dict:
+    """Compute BMR, daily calories and a diet plan for one person.
+
+    Raises:
+        ValueError: If the gender or activity level is not recognised.
+    """
+    # Basal Metabolic Rate (BMR) calculation
+    if gender.lower() == "male":
+        bmr = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
+    elif gender.lower() == "female":
+        bmr = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
+    else:
+        raise ValueError(INVALID_SEX)
+
+    if activity_level not in ACTIVITY_MULTIPLIERS:
+        raise ValueError(INVALID_ACTIVITY)
+
+    # Calculate daily caloric needs
+    daily_calories = bmr * ACTIVITY_MULTIPLIERS[activity_level]
+
+    base_calories = daily_calories
+    clamp = _clamp_range(gender, activity_level, age)
+    if clamp:
+        base_calories = min(max(clamp[0], daily_calories), clamp[1])
+
+    # Determine if the user needs to gain, lose, or maintain weight
+    if daily_calories < base_calories:
+        weight_goal = WEIGHT_GOALS[0]
+    elif daily_calories > base_calories:
+        weight_goal = WEIGHT_GOALS[1]
+    else:
+        weight_goal = WEIGHT_GOALS[2]
+
+    plan_key = PLAN_KEYS[bisect.bisect_left(PLAN_THRESHOLD_LIST, daily_calories)]
+
+    return {
+        "bmr": round(bmr, 2),
+        "daily_calories": round(daily_calories, 2),
+        "maintenance_plan": {
+            "maintain": round(daily_calories),
+            "gain_weight": round(daily_calories + 500),
+            "lose_weight": round(daily_calories - 500)
+        },
+        "weight_goal": weight_goal,
+        "selected_diet_plan": DIET_PLANS[plan_key]
+    }
+
+
+# Lookup tables for the vectorized path, built once from the dicts above.
+_LEVELS = sorted({level for _, level in CALORIE_CLAMPS} | set(ACTIVITY_MULTIPLIERS))
+_GENDERS = ["male", "female"]
+_MULTIPLIER_TABLE = np.array([ACTIVITY_MULTIPLIERS.get(level, np.nan) for level in _LEVELS])
+_BANDS = 4
+_CLAMP_LOW = np.full((len(_GENDERS) + 1, len(_LEVELS), _BANDS + 1), -np.inf)
+_CLAMP_HIGH = np.full((len(_GENDERS) + 1, len(_LEVELS), _BANDS + 1), np.inf)
+_BAND_EDGES = [(2, 6), (7, 18), (19, 60), (61, math.inf)]
+for (_gender, _level), _ranges in CALORIE_CLAMPS.items():
+    for _band, (_min_age, _max_age, _low, _high) in enumerate(_ranges):
+        assert (_min_age, _max_age) == _BAND_EDGES[_band]
+        _CLAMP_LOW[_GENDERS.index(_gender), _LEVELS.index(_level), _band] = _low
+        _CLAMP_HIGH[_GENDERS.index(_gender), _LEVELS.index(_level), _band] = _high
+
+
+def _codes(values: Sequence[str], vocabulary: List[str]) -> np.ndarray:
+    """Map a string column to indexes in ``vocabulary`` (len(vocabulary) if unknown).
+
+    Integer arrays are taken as precomputed codes. Strings are looked up in
+    a dict straight from the list; converting the column to a NumPy string
+    array first costs more than the lookups.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iu":
+        return values.astype(np.intp, copy=False)
+    index = {value: position for position, value in enumerate(vocabulary)}
+    return np.fromiter(map(index.get, values, itertools.repeat(len(vocabulary))), dtype=np.intp, count=len(values))
+
+
+def _fold_case(codes: np.ndarray, values: Sequence[str], vocabulary: List[str]) -> np.ndarray:
+    """``codes`` with the unknown rows matched again ignoring case, each distinct value once."""
+    missing = len(vocabulary)
+    rows = np.flatnonzero(codes == missing).tolist()
+    if not rows:
+        return codes
+    index = {value: position for position, value in enumerate(vocabulary)}
+    folded, codes = {}, codes.copy()
+    for row in rows:
+        value = values[row]
+        if value not in folded:
+            folded[value] = index.get(str(value).lower(), missing)
+        codes[row] = folded[value]
+    return codes
+
+
+def calculate_daily_calories_batch(
+    gender: Sequence[str],
+    weight: Sequence[float],
+    height: Sequence[float],
+    age: Sequence[float],
+    activity_level: Sequence[str],
+) -> Dict[str, np.ndarray]:
+    """Vectorized ``calculate_daily_calories`` over columns of equal length.
+
+    ``gender`` and ``activity_level`` may also be integer arrays of indexes
+    into ``_GENDERS`` and ``_LEVELS``, which skips decoding the strings.
+
+    Returns:
+        A dict of NumPy columns: ``bmr``, ``daily_calories``, ``maintain``,
+        ``gain_weight``, ``lose_weight``, and the integer codes ``goal``
+        (index into WEIGHT_GOALS), ``plan`` (index into PLAN_KEYS) and
+        ``error`` (-1 for valid rows, else an index into ERRORS, i.e. the
+        message the single-call function would raise). Use
+        ``batch_to_records`` or ``batch_to_columns`` to decode them.
+    """
+    weight = np.asarray(weight, dtype=float)
+    height = np.asarray(height, dtype=float)
+    age = np.asarray(age, dtype=float)
+    if not (len(gender) == len(weight) == len(height) == len(age) == len(activity_level)):
+        raise ValueError("All columns must have the same length.")
+
+    # The calorie clamps match the gender exactly; BMR ignores case.
+    clamp_gender = _codes(gender, _GENDERS)
+    sex = _fold_case(clamp_gender, gender, _GENDERS)
+    male = sex == 0
+    bmr = np.where(
+        male,
+        88.362 + 13.397 * weight + 4.799 * height - 5.677 * age,
+        447.593 + 9.247 * weight + 3.098 * height - 4.330 * age,
+    )
+
+    level = _codes(activity_level, _LEVELS)
+    multiplier = np.append(_MULTIPLIER_TABLE, np.nan)[level]
+    daily_calories = bmr * multiplier
+
+    band = np.select(
+        [(age >= low) & (age <= high) for low, high in _BAND_EDGES],
+        np.arange(_BANDS),
+        default=_BANDS,
+    )
+    clamp_level = np.minimum(level, len(_LEVELS) - 1)
+    low = _CLAMP_LOW[clamp_gender, clamp_level, band]
+    high = _CLAMP_HIGH[clamp_gender, clamp_level, band]
+    base_calories = np.minimum(np.maximum(low, daily_calories), high)
+
+    goal = np.where(daily_calories < base_calories, 0, np.where(daily_calories > base_calories, 1, 2))
+    plan = np.searchsorted(PLAN_THRESHOLDS, daily_calories, side="left")
+
+    error = np.where(sex == len(_GENDERS), 0, np.where(np.isnan(multiplier), 1, -1))
+
+    return {
+        "bmr": np.round(bmr, 2),
+        "daily_calories": np.round(daily_calories, 2),
+        "maintain": np.rint(daily_calories),
+        "gain_weight": np.rint(daily_calories + 500),
+        "lose_weight": np.rint(daily_calories - 500),
+        "goal": goal,
+        "plan": plan,
+        "error": error,
+        # Unrounded values, used by batch_to_records to round like the scalar path.
+        "_bmr": bmr,
+        "_daily_calories": daily_calories,
+    }
+
+
+def batch_to_records(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Turn batch columns into one dict per row, shaped like the single-call tool."""
+    records = []
+    bmrs, calories = columns["_bmr"].tolist(), columns["_daily_calories"].tolist()
+    goals, plans, errors = columns["goal"].tolist(), columns["plan"].tolist(), columns["error"].tolist()
+    for bmr, daily_calories, goal, plan, error in zip(bmrs, calories, goals, plans, errors):
+        if error >= 0:
+            records.append({"error": ERRORS[error]})
+            continue
+        records.append({
+            "bmr": round(bmr, 2),
+            "daily_calories": round(daily_calories, 2),
+            "maintenance_plan": {
+                "maintain": round(daily_calories),
+                "gain_weight": round(daily_calories + 500),
+                "lose_weight": round(daily_calories - 500),
+            },
+            "weight_goal": WEIGHT_GOALS[goal],
+            "selected_diet_plan": DIET_PLANS[PLAN_KEYS[plan]],
+        })
+    return records
+
+
+def _nullable(values: np.ndarray, valid: np.ndarray):
+    """``values`` with None for invalid rows: the array itself when every row is valid."""
+    return values if valid.all() else np.where(valid, values.astype(object), None).tolist()
+
+
+def batch_to_columns(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Columns for ``ORJSONResponse``, which writes NumPy arrays without building Python lists.
+
+    Float columns carry NaN for invalid rows (written as null). Weight goals
+    are indexes into ``weight_goals`` and diet plans keys into ``diet_plans``,
+    so each row costs a few bytes instead of a sentence.
+    """
+    valid = columns["error"] < 0
+    result = {name: np.where(valid, columns[name], np.nan) for name in ("bmr", "daily_calories")}
+    for name in ("maintain", "gain_weight", "lose_weight"):
+        result[name] = _nullable(np.where(valid, columns[name], 0).astype(np.int64), valid)
+    result["weight_goal"] = _nullable(columns["goal"].astype(np.int64), valid)
+    result["plan"] = np.where(valid, np.array(PLAN_KEYS, dtype=object)[columns["plan"]], None).tolist()
+    result["error"] = [ERRORS[error] if error >= 0 else None for error in columns["error"].tolist()]
+    result["weight_goals"] = WEIGHT_GOALS
+    result["diet_plans"] = DIET_PLANS
+    return result
@@ -0,0 +1,452 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from sqlalchemy import Column, LargeBinary, delete, func
+from sqlmodel import Field, Session, SQLModel, select
+
+from executor import run_blocking
+from shared.db import create_db_engine
+
+
+class BoundedMemorySaver(MemorySaver):
+    """In-process checkpointer with LRU/TTL eviction and a memory cap.
+
+    ``MemorySaver`` keeps every checkpoint of every thread for the life of
+    the process. This saver keeps only the last ``keep_last`` checkpoints per
+    thread, forgets threads idle for longer than ``ttl_seconds``, and evicts
+    the least recently used threads once ``max_threads`` or ``max_bytes``
+    (measured on the serialized payloads) is exceeded.
+
+    Written against langgraph-checkpoint 2.0.x, where ``storage`` holds each
+    checkpoint with its channel values inline and ``writes`` the pending
+    writes per checkpoint.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        keep_last: int = 3,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.keep_last = keep_last
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._thread_bytes: Dict[str, int] = {}
+        # thread -> its keys in ``writes``, so a put doesn't scan every thread's.
+        self._write_keys: Dict[str, Set[Tuple[str, str, str]]] = {}
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._thread_bytes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threads": len(self._last_used),
+            "bytes": self.total_bytes,
+            "evictions": self.evictions,
+        }
+
+    def _touch(self, thread_id: str) -> None:
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _track_writes(self, config: Optional[RunnableConfig]) -> None:
+        # ``writes`` is a defaultdict, so reads create entries as well as put_writes.
+        if config and config["configurable"].get("checkpoint_id"):
+            configurable = config["configurable"]
+            key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+            if key in self.writes:
+                self._write_keys.setdefault(key[0], set()).add(key)
+
+    def _track_tuple(self, checkpoint: CheckpointTuple) -> None:
+        self._track_writes(checkpoint.config)
+        self._track_writes(checkpoint.parent_config)
+
+    def _drop_thread(self, thread_id: str) -> None:
+        self.storage.pop(thread_id, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        self._last_used.pop(thread_id, None)
+        self._thread_bytes.pop(thread_id, None)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop_thread(thread_id)
+
+    def _prune_thread(self, thread_id: str) -> None:
+        """Keep the newest checkpoints of a thread and the writes they still need."""
+        for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+            # Checkpoint ids are uuid6, so they sort by creation time.
+            for checkpoint_id in sorted(checkpoints)[:-self.keep_last]:
+                del checkpoints[checkpoint_id]
+            # get_tuple reads pending sends from the parent's writes.
+            needed = set(checkpoints) | {parent for _, _, parent in checkpoints.values() if parent}
+            keys = self._write_keys.get(thread_id, set())
+            for key in [key for key in keys if key[1] == checkpoint_ns and key[2] not in needed]:
+                keys.discard(key)
+                self.writes.pop(key, None)
+
+    def _measure_thread(self, thread_id: str) -> None:
+        size = 0
+        for checkpoints in self.storage.get(thread_id, {}).values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                size += len(checkpoint[1]) + len(metadata[1])
+        for key in self._write_keys.get(thread_id, ()):
+            size += sum(len(write[2][1]) for write in self.writes.get(key, {}).values())
+        self._thread_bytes[thread_id] = size
+
+    def _evict(self, keep: str) -> None:
+        now = time.monotonic()
+        while self._last_used:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            expired = now - last_used > self.ttl_seconds
+            over_cap = len(self._last_used) > self.max_threads or self.total_bytes > self.max_bytes
+            if thread_id == keep or not (expired or over_cap):
+                break
+            self._drop_thread(thread_id)
+            self.evictions += 1
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            result = super().get_tuple(config)
+            if result is None:
+                # Reading an unknown thread creates an empty entry; don't keep it.
+                self.storage.pop(thread_id, None)
+            else:
+                self._track_tuple(result)
+                self._touch(thread_id)
+            return result
+
+    def list(self, config: Optional[RunnableConfig], **kwargs: Any) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            checkpoints = list(super().list(config, **kwargs))
+            for checkpoint in checkpoints:
+                self._track_tuple(checkpoint)
+            return iter(checkpoints)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._prune_thread(thread_id)
+            self._measure_thread(thread_id)
+            self._touch(thread_id)
+            self._evict(keep=thread_id)
+            return result
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        with self._lock:
+            # task_path is accepted for newer langgraph; 2.0.x does not store it.
+            super().put_writes(config, writes, task_id)
+            self._track_writes(config)
+            self._touch(config["configurable"]["thread_id"])
+
+
+# Tables for the durable checkpointer
+class ConversationCheckpoint(SQLModel, table=True):
+    thread_id: str = Field(primary_key=True)
+    checkpoint_ns: str = Field(default="", primary_key=True)
+    checkpoint_id: str = Field(primary_key=True)
+    parent_checkpoint_id: Optional[str] = None
+    type: str
+    checkpoint: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    metadata_type: str
+    checkpoint_metadata: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    updated_at: float = Field(default_factory=time.time, index=True)
+
+
+class ConversationWrite(SQLModel, table=True):
+    thread_id: str = Field(primary_key=True)
+    checkpoint_ns: str = Field(default="", primary_key=True)
+    checkpoint_id: str = Field(primary_key=True)
+    task_id: str = Field(primary_key=True)
+    idx: int = Field(primary_key=True)
+    channel: str
+    type: str
+    value: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    task_path: str = ""
+
+
+class SQLCheckpointSaver(BaseCheckpointSaver):
+    """Durable checkpointer storing conversation threads in a SQL database.
+
+    Threads survive restarts and are visible to every worker that points at
+    the same database. Only the last ``keep_last`` checkpoints of a thread
+    are kept, and threads idle for longer than ``ttl_seconds`` are removed by
+    ``prune_expired`` (run at most once a minute from ``put``).
+    """
+
+    def __init__(self, engine, keep_last: int = 3, ttl_seconds: float = 7 * 24 * 3600, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.engine = engine
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self._last_prune = 0.0
+        self._is_setup = False
+
+    def setup(self) -> None:
+        """Create the checkpoint tables on first use rather than at import."""
+        if not self._is_setup:
+            SQLModel.metadata.create_all(
+                self.engine, tables=[ConversationCheckpoint.__table__, ConversationWrite.__table__]
+            )
+            self._is_setup = True
+
+    def _to_tuple(self, session: Session, row: ConversationCheckpoint) -> CheckpointTuple:
+        writes = session.exec(
+            select(ConversationWrite)
+            .where(ConversationWrite.thread_id == row.thread_id)
+            .where(ConversationWrite.checkpoint_ns == row.checkpoint_ns)
+            .where(ConversationWrite.checkpoint_id == row.checkpoint_id)
+            .order_by(ConversationWrite.task_id, ConversationWrite.idx)
+        ).all()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": row.thread_id,
+                "checkpoint_ns": row.checkpoint_ns,
+                "checkpoint_id": row.checkpoint_id,
+            }},
+            checkpoint=self.serde.loads_typed((row.type, row.checkpoint)),
+            metadata=self.serde.loads_typed((row.metadata_type, row.checkpoint_metadata)),
+            parent_config=(
+                {"configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.parent_checkpoint_id,
+                }}
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (write.task_id, write.channel, self.serde.loads_typed((write.type, write.value)))
+                for write in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self.setup()
+        configurable = config["configurable"]
+        statement = (
+            select(ConversationCheckpoint)
+            .where(ConversationCheckpoint.thread_id == configurable["thread_id"])
+            .where(ConversationCheckpoint.checkpoint_ns == configurable.get("checkpoint_ns", ""))
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            statement = statement.where(ConversationCheckpoint.checkpoint_id == checkpoint_id)
+        else:
+            statement = statement.order_by(ConversationCheckpoint.checkpoint_id.desc())
+        with Session(self.engine) as session:
+            row = session.exec(statement.limit(1)).first()
+            return self._to_tuple(session, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.setup()
+        statement = select(ConversationCheckpoint).order_by(ConversationCheckpoint.checkpoint_id.desc())
+        if config:
+            statement = statement.where(ConversationCheckpoint.thread_id == config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                statement = statement.where(
+                    ConversationCheckpoint.checkpoint_ns == config["configurable"]["checkpoint_ns"]
+                )
+        if before and (before_id := get_checkpoint_id(before)):
+            statement = statement.where(ConversationCheckpoint.checkpoint_id < before_id)
+        with Session(self.engine) as session:
+            results = []
+            for row in session.exec(statement):
+                item = self._to_tuple(session, row)
+                if filter and not all(item.metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+        return iter(results)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        self.setup()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        with Session(self.engine) as session:
+            session.merge(ConversationCheckpoint(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+                type=type_,
+                checkpoint=serialized,
+                metadata_type=metadata_type,
+                checkpoint_metadata=serialized_metadata,
+            ))
+            self._trim(session, thread_id, checkpoint_ns)
+            session.commit()
+        if time.time() - self._last_prune > 60:
+            self.prune_expired()
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def _trim(self, session: Session, thread_id: str, checkpoint_ns: str) -> None:
+        """Delete everything but the newest ``keep_last`` checkpoints."""
+        stale = session.exec(
+            select(ConversationCheckpoint.checkpoint_id)
+            .where(ConversationCheckpoint.thread_id == thread_id)
+            .where(ConversationCheckpoint.checkpoint_ns == checkpoint_ns)
+            .order_by(ConversationCheckpoint.checkpoint_id.desc())
+            .offset(self.keep_last)
+        ).all()
+        if not stale:
+            return
+        for model in (ConversationCheckpoint, ConversationWrite):
+            session.exec(
+                delete(model)
+                .where(model.thread_id == thread_id)
+                .where(model.checkpoint_ns == checkpoint_ns)
+                .where(model.checkpoint_id.in_(stale))
+            )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.setup()
+        configurable = config["configurable"]
+        with Session(self.engine) as session:
+            for idx, (channel, value) in enumerate(writes):
+                type_, serialized = self.serde.dumps_typed(value)
+                session.merge(ConversationWrite(
+                    thread_id=configurable["thread_id"],
+                    checkpoint_ns=configurable.get("checkpoint_ns", ""),
+                    checkpoint_id=configurable["checkpoint_id"],
+                    task_id=task_id,
+                    idx=WRITES_IDX_MAP.get(channel, idx),
+                    channel=channel,
+                    type=type_,
+                    value=serialized,
+                    task_path=task_path,
+                ))
+            session.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.setup()
+        with Session(self.engine) as session:
+            for model in (ConversationCheckpoint, ConversationWrite):
+                session.exec(delete(model).where(model.thread_id == thread_id))
+            session.commit()
+
+    def prune_expired(self) -> int:
+        """Delete threads whose newest checkpoint is older than the TTL."""
+        self.setup()
+        self._last_prune = time.time()
+        cutoff = self._last_prune - self.ttl_seconds
+        with Session(self.engine) as session:
+            expired = session.exec(
+                select(ConversationCheckpoint.thread_id)
+                .group_by(ConversationCheckpoint.thread_id)
+                .having(func.max(ConversationCheckpoint.updated_at) < cutoff)
+            ).all()
+            for model in (ConversationCheckpoint, ConversationWrite):
+                if expired:
+                    session.exec(delete(model).where(model.thread_id.in_(expired)))
+            session.commit()
+        return len(expired)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await run_blocking(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs: Any) -> AsyncIterator[CheckpointTuple]:
+        for item in await run_blocking(lambda: list(self.list(config, **kwargs))):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_blocking(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await run_blocking(self.put_writes, config, writes, task_id, task_path)
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """Build the checkpointer selected by the CHECKPOINTER env variable.
+
+    ``memory`` (default) keeps threads in process with eviction; ``sql``
+    stores them in CHECKPOINT_DB_URI (falling back to DB_URI).
+    """
+    if os.getenv("CHECKPOINTER", "memory") == "sql":
+        engine = create_db_engine(
+            "checkpoints", os.getenv("CHECKPOINT_DB_URI") or os.getenv("DB_URI")
+        )
+        return SQLCheckpointSaver(
+            engine,
+            keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "3")),
+            ttl_seconds=float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600))),
+        )
+    return BoundedMemorySaver(
+        max_threads=int(os.getenv("CHECKPOINT_MAX_THREADS", "1000")),
+        max_bytes=int(os.getenv("CHECKPOINT_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl_seconds=float(os.getenv("CHECKPOINT_TTL_SECONDS", "3600")),
+        keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "3")),
+    )
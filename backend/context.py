@@ -0,0 +1,280 @@
+"""Token-budgeted conversation context for the assistant node.
+
+Instead of a fixed window of the last N messages, each model call gets the
+system prompt, a running summary of earlier turns and as many recent turns
+as fit the token budget. Settings come from the environment:
+
+    CONTEXT_MAX_TOKENS          prompt budget incl. the system prompt (default 6000)
+    CONTEXT_TARGET_RATIO        after compaction the prompt is cut to this share of the budget (default 0.6)
+    CONTEXT_TOOL_CHARS          cap on a tool result of the current turn (default 4000)
+    CONTEXT_OLD_TOOL_CHARS      cap on tool results of earlier turns (default 600)
+    CONTEXT_SUMMARY_TOKENS      cap on the running summary (default 400)
+    CONTEXT_SUMMARIZE           summarize dropped turns with the model (default true);
+                                false keeps short extractive notes instead
+
+History is only cut at turn boundaries (a human message and everything that
+follows it), so an AI tool call is never separated from its tool results.
+Dropped turns are folded into the summary and removed from the thread, so
+each turn is summarized once and the checkpoint stops growing.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.constants import TAG_NOSTREAM
+
+# A token is ~4 characters of English text for Gemini and GPT tokenizers;
+# counting locally avoids a count_tokens round trip per turn.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a diet and nutrition assistant.
+Update the summary with the new messages. Keep every fact that later turns may need: the user's age, weight,
+height, pronouns, activity level and goals, calculated calorie figures, the diet plan chosen, nutritionists,
+dates and times discussed, and appointment IDs booked or cancelled. Drop greetings and tool output details
+that were not used. Answer with the summary only, in at most {words} words."""
+
+
+def message_text(message: BaseMessage) -> str:
+    """Text of a message, including any tool call arguments."""
+    content = message.content
+    if isinstance(content, list):
+        content = " ".join(part if isinstance(part, str) else str(part.get("text", "")) for part in content)
+    calls = getattr(message, "tool_calls", None)
+    if calls:
+        content += json.dumps([[call["name"], call["args"]] for call in calls], default=str)
+    return content
+
+
+def count_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(len(message_text(message)) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def _shrink(value: Any, string_chars: int, list_items: int) -> Any:
+    if isinstance(value, dict):
+        return {key: _shrink(item, string_chars, list_items) for key, item in value.items()}
+    if isinstance(value, list):
+        kept = [_shrink(item, string_chars, list_items) for item in value[:list_items]]
+        if len(value) > list_items:
+            kept.append(f"... {len(value) - list_items} more")
+        return kept
+    if isinstance(value, str) and len(value) > string_chars:
+        return value[:string_chars] + "..."
+    return value
+
+
+def compress_payload(content: str, max_chars: int) -> str:
+    """Shorten a tool result to about ``max_chars``.
+
+    JSON results keep their keys and numbers while long strings and lists
+    are clipped; anything else keeps its head and notes what was cut.
+    """
+    if len(content) <= max_chars:
+        return content
+    try:
+        compact = json.dumps(_shrink(json.loads(content), max(40, max_chars // 8), 2), separators=(",", ":"))
+        if len(compact) <= max_chars:
+            return compact
+        content = compact
+    except (TypeError, ValueError):
+        pass
+    return content[:max_chars] + f" ... [{len(content) - max_chars} characters truncated]"
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[Tuple[int, int]]:
+    """(start, end) of each turn; a turn starts at a human message."""
+    starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(messages)]) if start < end]
+
+
+@dataclass
+class ContextWindow:
+    messages: List[BaseMessage]
+    summary: str = ""
+    dropped: List[BaseMessage] = field(default_factory=list)
+    tokens: int = 0
+
+    def prompt(self, system: SystemMessage) -> List[BaseMessage]:
+        """The messages to send: one system message carrying the summary, then the kept turns."""
+        if self.summary:
+            system = SystemMessage(content=f"{system.content}\n\n### Summary of the earlier conversation\n{self.summary}")
+        return [system] + self.messages
+
+    def cache_window(self) -> List[BaseMessage]:
+        """What identifies this call for the model cache (the system prompt is constant)."""
+        return ([SystemMessage(content=self.summary)] if self.summary else []) + self.messages
+
+    def update(self) -> Dict[str, Any]:
+        """State update that removes the dropped messages and stores the summary."""
+        if not self.dropped:
+            return {"messages": []}
+        return {"summary": self.summary, "messages": [RemoveMessage(id=message.id) for message in self.dropped]}
+
+
+class ContextManager:
+    """Builds a bounded prompt from a thread's messages and summary.
+
+    Args:
+        max_tokens: Budget for the whole prompt, system prompt included.
+        target_ratio: When over budget, older turns are dropped until the
+            prompt fits this share of the budget, so compaction (and the
+            summary call) happens every few turns rather than on each one.
+        tool_chars: Cap on tool results of the turn being answered.
+        old_tool_chars: Cap on tool results of earlier turns.
+        summary_tokens: Cap on the running summary.
+        summarizer: Callable returning the chat model that writes summaries,
+            or None to keep extractive notes of the dropped turns.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        target_ratio: float = 0.6,
+        tool_chars: int = 4000,
+        old_tool_chars: int = 600,
+        summary_tokens: int = 400,
+        summarizer: Optional[Callable[[], BaseChatModel]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.target_ratio = target_ratio
+        self.tool_chars = tool_chars
+        self.old_tool_chars = old_tool_chars
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.calls = 0
+        self.compactions = 0
+        self.summary_failures = 0
+        self.dropped_messages = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, summarizer: Optional[Callable[[], BaseChatModel]] = None) -> "ContextManager":
+        summarize = os.getenv("CONTEXT_SUMMARIZE", "true").lower() in ("1", "true", "yes")
+        return cls(
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "6000")),
+            target_ratio=float(os.getenv("CONTEXT_TARGET_RATIO", "0.6")),
+            tool_chars=int(os.getenv("CONTEXT_TOOL_CHARS", "4000")),
+            old_tool_chars=int(os.getenv("CONTEXT_OLD_TOOL_CHARS", "600")),
+            summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400")),
+            summarizer=summarizer if summarize else None,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "compactions": self.compactions,
+            "summary_failures": self.summary_failures,
+            "dropped_messages": self.dropped_messages,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.calls) if self.calls else 0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+        }
+
+    def compress(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Copies of ``messages`` with tool results capped; earlier turns get the tighter cap."""
+        last_human = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=0)
+        compressed = []
+        for i, message in enumerate(messages):
+            if isinstance(message, ToolMessage) and isinstance(message.content, str):
+                limit = self.tool_chars if i >= last_human else self.old_tool_chars
+                content = compress_payload(message.content, limit)
+                if content is not message.content:
+                    message = message.model_copy(update={"content": content})
+            compressed.append(message)
+        return compressed
+
+    def plan(self, system: SystemMessage, messages: Sequence[BaseMessage], summary: str = "") -> ContextWindow:
+        """Pick the turns that fit the budget; ``dropped`` are the ones to summarize."""
+        compressed = self.compress(messages)
+        fixed = count_tokens([system]) + (len(summary) // CHARS_PER_TOKEN if summary else 0)
+        turns = split_turns(compressed)
+        sizes = [count_tokens(compressed[start:end]) for start, end in turns]
+        if fixed + sum(sizes) <= self.max_tokens:
+            return ContextWindow(compressed, summary, [], fixed + sum(sizes))
+
+        # Leave room for the summary to grow by what is dropped now.
+        budget = self.max_tokens * self.target_ratio - count_tokens([system]) - self.summary_tokens
+        keep_from = len(turns) - 1  # The turn being answered is always kept.
+        used = sizes[-1]
+        while keep_from > 0 and used + sizes[keep_from - 1] <= budget:
+            keep_from -= 1
+            used += sizes[keep_from]
+        cut = turns[keep_from][0]
+        return ContextWindow(compressed[cut:], summary, list(messages[:cut]), fixed + used)
+
+    def _transcript(self, messages: Sequence[BaseMessage], limit: int) -> List[str]:
+        lines = []
+        for message in self.compress(messages):
+            if isinstance(message, ToolMessage):
+                lines.append(f"tool {message.name or ''}: {compress_payload(message_text(message), limit)}")
+            elif isinstance(message, (HumanMessage, AIMessage)):
+                role = "user" if isinstance(message, HumanMessage) else "assistant"
+                lines.append(f"{role}: {compress_payload(message_text(message), limit * 2)}")
+        return lines
+
+    def _notes(self, summary: str, dropped: Sequence[BaseMessage]) -> str:
+        """Extractive summary: previous notes plus clipped lines, newest kept."""
+        notes = "\n".join(filter(None, [summary] + self._transcript(dropped, 120)))
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        return notes if len(notes) <= limit else "..." + notes[-limit:]
+
+    def _summary_prompt(self, summary: str, dropped: Sequence[BaseMessage]) -> List[BaseMessage]:
+        new = "\n".join(self._transcript(dropped, self.old_tool_chars))
+        return [
+            SystemMessage(content=SUMMARY_PROMPT.format(words=int(self.summary_tokens * 0.75))),
+            HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{new}"),
+        ]
+
+    def _finish(self, window: ContextWindow, summary: str) -> ContextWindow:
+        if window.dropped:
+            limit = self.summary_tokens * CHARS_PER_TOKEN
+            window.summary = summary if len(summary) <= limit else summary[:limit] + "..."
+            window.tokens += len(window.summary) // CHARS_PER_TOKEN
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += window.tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, window.tokens)
+            if window.dropped:
+                self.compactions += 1
+                self.dropped_messages += len(window.dropped)
+        return window
+
+    def _failed(self, error: Exception) -> None:
+        print(f"Summarizing the conversation failed, keeping notes instead: {error}")
+        with self._lock:
+            self.summary_failures += 1
+
+    def compact(self, system: SystemMessage, messages: Sequence[BaseMessage], summary: str = "") -> ContextWindow:
+        window = self.plan(system, messages, summary)
+        if not window.dropped:
+            return self._finish(window, summary)
+        if self.summarizer is None:
+            return self._finish(window, self._notes(summary, window.dropped))
+        try:
+            # Tagged so the summary is not streamed to the user as part of the answer.
+            result = self.summarizer().invoke(self._summary_prompt(summary, window.dropped), config={"tags": [TAG_NOSTREAM]})
+            return self._finish(window, message_text(result).strip())
+        except Exception as e:
+            self._failed(e)
+            return self._finish(window, self._notes(summary, window.dropped))
+
+    async def acompact(self, system: SystemMessage, messages: Sequence[BaseMessage], summary: str = "") -> ContextWindow:
+        window = self.plan(system, messages, summary)
+        if not window.dropped:
+            return self._finish(window, summary)
+        if self.summarizer is None:
+            return self._finish(window, self._notes(summary, window.dropped))
+        try:
+            model = self.summarizer()
+            result = await model.ainvoke(self._summary_prompt(summary, window.dropped), config={"tags": [TAG_NOSTREAM]})
+            return self._finish(window, message_text(result).strip())
+        except Exception as e:
+            self._failed(e)
+            return self._finish(window, self._notes(summary, window.dropped))
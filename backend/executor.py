@@ -0,0 +1,53 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain_core.tools import StructuredTool
+
+# Blocking work (sync tools, SQL sessions, index loading) runs here instead of
+# on the event loop. The pool is bounded so a burst of slow tool calls cannot
+# spawn an unbounded number of threads.
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "8"))
+blocking_pool = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="tool")
+# Tool calls get their own pool. A call that times out is abandoned, not
+# killed, and keeps its thread until it returns; here it can only hold up
+# other tool calls, never the SQL sessions and index loads above.
+TOOL_CALL_THREADS = int(os.getenv("TOOL_CALL_THREADS", str(TOOL_THREADS)))
+tool_call_pool = ThreadPoolExecutor(max_workers=TOOL_CALL_THREADS, thread_name_prefix="tool-call")
+
+
+async def run_blocking(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the bounded pool and await its result.
+
+    The caller's context variables (e.g. the request trace) are carried over.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_pool, functools.partial(context.run, func, *args, **kwargs))
+
+
+def submit_tool_call(func: Callable, *args: Any, **kwargs: Any) -> Future:
+    """Start a blocking tool call on the tool pool, carrying over the caller's context variables."""
+    context = contextvars.copy_context()
+    return tool_call_pool.submit(context.run, func, *args, **kwargs)
+
+
+async def run_tool_call(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Like ``run_blocking``, but on the tool pool; for work a tool timeout may abandon."""
+    return await asyncio.wrap_future(submit_tool_call(func, *args, **kwargs))
+
+
+def as_async_tool(func: Callable, coroutine: Optional[Callable[..., Awaitable]] = None) -> StructuredTool:
+    """Wrap a function as a tool that can be awaited from the graph.
+
+    The tool's name, description and argument schema come from ``func``.
+    When no native ``coroutine`` is given, the async path runs ``func`` on
+    the tool pool.
+    """
+    if coroutine is None:
+        async def coroutine(**kwargs: Any) -> Any:
+            return await run_tool_call(func, **kwargs)
+    return StructuredTool.from_function(func=func, coroutine=coroutine)
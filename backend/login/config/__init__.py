@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The login service runs from backend/login (uvicorn main:app, python -m
+# config.migrations) and shares backend/shared with the chat service.
+# Every entry point imports this package first, so the backend directory is
+# made importable here and nowhere else. Appended, so login's own modules
+# (main, models, ...) win over the chat service's.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
@@ -1,9 +1,12 @@
-from sqlmodel import SQLModel, create_engine
-import os
+# The pooled engine factory is shared with the chat service in backend/shared
+# (made importable by config/__init__.py).
+from shared.db import create_db_engine
 
 
-connection_string= os.getenv('DB_URI')
-engine = create_engine(connection_string)
+engine = create_db_engine("users")
 
+# Brings the schema up to date; see config/migrations.py
 def create_tables():
-    SQLModel.metadata.create_all(engine)
+    from config.migrations import migrate
+
+    migrate(engine)
@@ -0,0 +1,160 @@
+"""Versioned schema migrations for the login database.
+
+Each migration runs once, in order, inside a transaction, and is recorded in
+the ``schema_migrations`` table. Migrations are written to be safe on
+databases created by the old ``create_all`` call: they inspect the live
+schema and only add what is missing.
+
+    python -m config.migrations                 # apply pending migrations
+    python -m config.migrations --status        # list applied and pending ones
+    python -m config.migrations --requeue-dead  # give dead-lettered emails a fresh set of attempts
+
+On a large Postgres table, build the unique indexes of 0002 beforehand with
+``CREATE UNIQUE INDEX CONCURRENTLY`` to avoid locking writes; the migration
+then finds them and skips the step.
+"""
+import argparse
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection
+
+from models.outbox import EmailOutbox
+
+MIGRATIONS_TABLE = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _add_column(connection: Connection, table: str, column: Column) -> bool:
+    existing = {info["name"] for info in inspect(connection).get_columns(table)}
+    if column.name in existing:
+        return False
+    preparer = connection.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=connection.dialect)
+    default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+    connection.execute(text(
+        f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {preparer.quote(column.name)} {column_type}{default}"
+    ))
+    return True
+
+
+def _create_index(connection: Connection, table: str, name: str, columns: List[str], unique: bool = False) -> None:
+    existing = {info["name"] for info in inspect(connection).get_indexes(table)}
+    if name in existing:
+        return
+    preparer = connection.dialect.identifier_preparer
+    connection.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {preparer.quote(name)} ON {preparer.quote(table)} "
+        f"({', '.join(preparer.quote(column) for column in columns)})"
+    ))
+
+
+def _create_unique_index(connection: Connection, table: str, name: str, column: str) -> None:
+    _create_index(connection, table, name, [column], unique=True)
+
+
+def m0001_user_table(connection: Connection) -> None:
+    # Only the columns of the original model; later migrations add the rest.
+    if not inspect(connection).has_table("user"):
+        Table(
+            "user",
+            MetaData(),
+            Column("id", Integer, primary_key=True),
+            Column("First_Name", String, nullable=False),
+            Column("Last_Name", String, nullable=False),
+            Column("email", String, nullable=False),
+            Column("password", String, nullable=False),
+        ).create(connection)
+
+
+def m0002_user_activation(connection: Connection) -> None:
+    if _add_column(connection, "user", Column("is_active", Boolean, server_default=text("false"))):
+        # Accounts created before confirmation emails existed have no token
+        # to confirm with; keep them able to log in.
+        connection.execute(text('UPDATE "user" SET is_active = true'))
+    _add_column(connection, "user", Column("confirmation_token", String))
+    _add_column(connection, "user", Column("confirmation_expires_at", DateTime))
+
+    duplicates = connection.execute(text(
+        'SELECT email, COUNT(*) FROM "user" GROUP BY email HAVING COUNT(*) > 1'
+    )).fetchall()
+    if duplicates:
+        raise RuntimeError(
+            f"Cannot add a unique index on user.email; {len(duplicates)} emails are registered more than once, "
+            f"e.g. {duplicates[0][0]}. Resolve them and rerun the migration."
+        )
+    _create_unique_index(connection, "user", "ix_user_email", "email")
+    _create_unique_index(connection, "user", "ix_user_confirmation_token", "confirmation_token")
+
+
+def m0003_email_outbox(connection: Connection) -> None:
+    EmailOutbox.__table__.create(connection, checkfirst=True)
+
+
+def m0004_email_outbox_indexes(connection: Connection) -> None:
+    # Counting messages per status and purging old sent ones (see mailer.py).
+    # 0003 may already have created this on a fresh database.
+    _create_index(connection, "emailoutbox", "ix_emailoutbox_status_sent_at", ["status", "sent_at"])
+
+
+MIGRATIONS: List[Tuple[str, str, Callable[[Connection], None]]] = [
+    ("0001", "user table", m0001_user_table),
+    ("0002", "user activation columns and unique indexes", m0002_user_activation),
+    ("0003", "email outbox", m0003_email_outbox),
+    ("0004", "email outbox status indexes", m0004_email_outbox_indexes),
+]
+
+
+def applied_versions(connection: Connection) -> set:
+    MIGRATIONS_TABLE.create(connection, checkfirst=True)
+    return {row.version for row in connection.execute(MIGRATIONS_TABLE.select())}
+
+
+def migrate(engine) -> List[str]:
+    """Apply pending migrations; returns the versions that ran."""
+    ran = []
+    for version, name, upgrade in MIGRATIONS:
+        with engine.begin() as connection:
+            if version in applied_versions(connection):
+                continue
+            upgrade(connection)
+            connection.execute(MIGRATIONS_TABLE.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        print(f"Applied migration {version}: {name}")
+        ran.append(version)
+    return ran
+
+
+def main():
+    from config.db import engine
+
+    parser = argparse.ArgumentParser(description="Apply login database migrations.")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying them")
+    parser.add_argument("--requeue-dead", action="store_true", help="retry dead-lettered emails from scratch")
+    args = parser.parse_args()
+
+    if args.requeue_dead:
+        from mailer import requeue_dead
+
+        print(f"Requeued {requeue_dead(engine)} dead-lettered emails.")
+        return
+
+    if args.status:
+        with engine.begin() as connection:
+            applied = applied_versions(connection)
+        for version, name, _ in MIGRATIONS:
+            print(f"{'applied' if version in applied else 'pending'}  {version} {name}")
+        return
+    if not migrate(engine):
+        print("Database is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""Outbound email: a durable outbox drained over pooled SMTP connections.
+
+Requests only insert an ``EmailOutbox`` row (in the same transaction as the
+user they belong to) and wake the worker. The worker claims due rows in
+batches, sends them over a small pool of persistent SMTP connections,
+retries transient failures with exponential backoff and marks messages
+``dead`` after a permanent failure or too many attempts.
+
+Settings come from the environment:
+
+    SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD   server and credentials
+    SMTP_STARTTLS            upgrade with STARTTLS (default true)
+    SMTP_FROM                sender address (default SMTP_USER)
+    SMTP_TIMEOUT             socket timeout in seconds (default 30)
+    MAIL_POOL_SIZE           SMTP connections kept open (default 2)
+    MAIL_BATCH_SIZE          messages claimed per round (default 20)
+    MAIL_MAX_PER_MINUTE      send rate limit, 0 for none (default 0)
+    MAIL_MAX_ATTEMPTS        attempts before dead-lettering (default 6)
+    MAIL_RETRY_BASE_SECONDS  first retry delay, doubled per attempt (default 30)
+    MAIL_RETRY_MAX_SECONDS   longest retry delay (default 3600)
+    MAIL_POLL_SECONDS        idle poll interval (default 5)
+    MAIL_LEASE_SECONDS       claim lease before a stuck send is retried (default 300)
+    MAIL_SENT_RETENTION_DAYS days sent messages are kept, 0 to keep them (default 7)
+
+Dead-lettered messages stay until they are requeued with
+``python -m config.migrations --requeue-dead``.
+
+A local stand-in server works with SMTP_STARTTLS=false and no SMTP_USER,
+e.g. ``python -m aiosmtpd -n -l 127.0.0.1:8025``.
+"""
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from smtplib import (
+    SMTP,
+    SMTPException,
+    SMTPRecipientsRefused,
+    SMTPResponseException,
+    SMTPServerDisconnected,
+)
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+
+from models.outbox import EmailOutbox
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class SMTPSettings:
+    server: Optional[str]
+    port: int
+    user: Optional[str]
+    password: Optional[str]
+    starttls: bool
+    sender: Optional[str]
+    timeout: float
+
+    @classmethod
+    def from_env(cls) -> "SMTPSettings":
+        return cls(
+            server=os.getenv("SMTP_SERVER"),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            user=os.getenv("SMTP_USER"),
+            password=os.getenv("SMTP_PASSWORD"),
+            starttls=_env_bool("SMTP_STARTTLS", True),
+            sender=os.getenv("SMTP_FROM") or os.getenv("SMTP_USER"),
+            timeout=float(os.getenv("SMTP_TIMEOUT", "30")),
+        )
+
+
+class SMTPConnectionPool:
+    """Keeps up to ``size`` authenticated SMTP connections open for reuse.
+
+    A connection idle for longer than ``check_after`` seconds is probed with
+    NOOP before reuse; connections that drop are discarded and replaced.
+    """
+
+    def __init__(self, settings: SMTPSettings, size: int = 2, check_after: float = 30.0):
+        self.settings = settings
+        self.size = size
+        self.check_after = check_after
+        self._idle: "queue.LifoQueue" = queue.LifoQueue(maxsize=size)
+        self.opened = 0
+
+    def _connect(self) -> SMTP:
+        settings = self.settings
+        connection = SMTP(settings.server, settings.port, timeout=settings.timeout)
+        if settings.starttls:
+            connection.starttls()
+        if settings.user:
+            connection.login(settings.user, settings.password)
+        self.opened += 1
+        return connection
+
+    def _checkout(self) -> SMTP:
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.check_after:
+                return connection
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (SMTPException, OSError):
+                pass
+            self._discard(connection)
+
+    @staticmethod
+    def _discard(connection: SMTP) -> None:
+        try:
+            connection.quit()
+        except (SMTPException, OSError):
+            connection.close()
+
+    @contextmanager
+    def connection(self):
+        connection = self._checkout()
+        try:
+            yield connection
+        except Exception as e:
+            # A refused message leaves the session usable; a dropped one does not.
+            if isinstance(e, SMTPServerDisconnected) or not isinstance(e, SMTPException):
+                self._discard(connection)
+                raise
+            self._release(connection)
+            raise
+        self._release(connection)
+
+    def _release(self, connection: SMTP) -> None:
+        try:
+            self._idle.put_nowait((connection, time.monotonic()))
+        except queue.Full:
+            self._discard(connection)
+
+    def close(self) -> None:
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
+
+
+class RateLimiter:
+    """Spaces sends evenly to stay under a per-minute provider limit."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def is_permanent(error: Exception) -> bool:
+    """5xx replies and refused recipients will not succeed on retry."""
+    if isinstance(error, SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def enqueue_email(session: Session, recipient: str, subject: str, body: str) -> EmailOutbox:
+    """Add a message to the outbox; it is sent once the caller commits."""
+    message = EmailOutbox(recipient=recipient, subject=subject, body=body)
+    session.add(message)
+    return message
+
+
+class OutboxWorker:
+    """Background thread that drains the email outbox."""
+
+    def __init__(
+        self,
+        engine,
+        pool: SMTPConnectionPool,
+        batch_size: int = 20,
+        max_attempts: int = 6,
+        retry_base: float = 30.0,
+        retry_max: float = 3600.0,
+        poll_seconds: float = 5.0,
+        lease_seconds: float = 300.0,
+        max_per_minute: int = 0,
+        sent_retention_days: float = 7.0,
+    ):
+        self.engine = engine
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.rate_limiter = RateLimiter(max_per_minute)
+        self.sent_retention_days = sent_retention_days
+        self._purged_at: Optional[float] = None
+        self._senders = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="smtp")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, engine) -> "OutboxWorker":
+        return cls(
+            engine,
+            SMTPConnectionPool(SMTPSettings.from_env(), size=int(os.getenv("MAIL_POOL_SIZE", "2"))),
+            batch_size=int(os.getenv("MAIL_BATCH_SIZE", "20")),
+            max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", "6")),
+            retry_base=float(os.getenv("MAIL_RETRY_BASE_SECONDS", "30")),
+            retry_max=float(os.getenv("MAIL_RETRY_MAX_SECONDS", "3600")),
+            poll_seconds=float(os.getenv("MAIL_POLL_SECONDS", "5")),
+            lease_seconds=float(os.getenv("MAIL_LEASE_SECONDS", "300")),
+            max_per_minute=int(os.getenv("MAIL_MAX_PER_MINUTE", "0")),
+            sent_retention_days=float(os.getenv("MAIL_SENT_RETENTION_DAYS", "7")),
+        )
+
+    def start(self) -> None:
+        if not self.pool.settings.server:
+            print("SMTP_SERVER is not set; confirmation emails will wait in the outbox.")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._senders.shutdown(wait=False)
+        self.pool.close()
+
+    def notify(self) -> None:
+        """Wake the worker after new messages are committed."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+                self._purge_if_due()
+            except Exception as e:
+                print(f"Email outbox round failed: {e}")
+                processed = 0
+            # A full batch means more may be waiting; otherwise sleep until woken.
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def _purge_if_due(self) -> None:
+        """Purge old sent messages, at most once an hour."""
+        if self.sent_retention_days <= 0:
+            return
+        if self._purged_at is not None and time.monotonic() - self._purged_at < 3600:
+            return
+        self._purged_at = time.monotonic()
+        purged = purge_sent(self.engine, timedelta(days=self.sent_retention_days))
+        if purged:
+            print(f"Purged {purged} sent emails older than {self.sent_retention_days:g} days from the outbox.")
+
+    def _claim(self) -> List[EmailOutbox]:
+        """Lease due messages; the conditional update keeps concurrent workers apart."""
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.lease_seconds)
+        claimed = []
+        with Session(self.engine, expire_on_commit=False) as session:
+            # "sending" rows whose lease ran out belong to a worker that died mid-send.
+            due = session.exec(
+                select(EmailOutbox)
+                .where(EmailOutbox.status.in_(("pending", "sending")), EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(self.batch_size)
+            ).all()
+            for message in due:
+                result = session.execute(
+                    update(EmailOutbox)
+                    .where(
+                        EmailOutbox.id == message.id,
+                        EmailOutbox.status == message.status,
+                        EmailOutbox.next_attempt_at == message.next_attempt_at,
+                    )
+                    .values(status="sending", next_attempt_at=lease_until)
+                )
+                if result.rowcount == 1:
+                    claimed.append(message)
+            session.commit()
+        return claimed
+
+    def _build(self, message: EmailOutbox) -> MIMEMultipart:
+        mime = MIMEMultipart()
+        mime["From"] = self.pool.settings.sender
+        mime["To"] = message.recipient
+        mime["Subject"] = message.subject
+        mime.attach(MIMEText(message.body, "plain"))
+        return mime
+
+    def _deliver(self, message: EmailOutbox) -> Optional[Exception]:
+        self.rate_limiter.wait()
+        try:
+            with self.pool.connection() as connection:
+                connection.send_message(self._build(message))
+        except Exception as e:
+            return e
+        return None
+
+    def _record(self, message: EmailOutbox, error: Optional[Exception]) -> None:
+        attempts = message.attempts + 1
+        values: Dict = {"attempts": attempts}
+        if error is None:
+            values.update(status="sent", sent_at=datetime.utcnow(), last_error=None)
+        elif is_permanent(error) or attempts >= self.max_attempts:
+            values.update(status="dead", last_error=str(error)[:1000])
+            print(f"Email {message.id} to {message.recipient} dead-lettered: {error}")
+        else:
+            delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(1.0, 1.25)
+            values.update(
+                status="pending",
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+                last_error=str(error)[:1000],
+            )
+        with Session(self.engine) as session:
+            session.execute(update(EmailOutbox).where(EmailOutbox.id == message.id).values(**values))
+            session.commit()
+
+    def run_once(self) -> int:
+        """Send one batch of due messages; returns how many were attempted."""
+        batch = self._claim()
+        for message, error in zip(batch, self._senders.map(self._deliver, batch)):
+            self._record(message, error)
+        return len(batch)
+
+
+def outbox_stats(engine) -> Dict[str, int]:
+    """Messages per status; served from the status indexes."""
+    with Session(engine) as session:
+        rows = session.exec(select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)).all()
+    return {status: count for status, count in rows}
+
+
+def requeue_dead(engine) -> int:
+    """Give dead-lettered messages a fresh set of attempts."""
+    with Session(engine) as session:
+        result = session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.status == "dead")
+            .values(status="pending", attempts=0, next_attempt_at=datetime.utcnow())
+        )
+        session.commit()
+        return result.rowcount
+
+
+def purge_sent(engine, older_than: timedelta) -> int:
+    """Delete messages sent more than ``older_than`` ago; returns how many."""
+    with Session(engine) as session:
+        result = session.execute(
+            delete(EmailOutbox)
+            .where(EmailOutbox.status == "sent", EmailOutbox.sent_at < datetime.utcnow() - older_than)
+        )
+        session.commit()
+        return result.rowcount
@@ -1,23 +1,40 @@
-from fastapi import FastAPI, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, HTTPException, status
+from contextlib import asynccontextmanager
 from sqlmodel import Session, select
-import bcrypt
+from sqlalchemy import insert as sa_insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 import uvicorn
 from dotenv import load_dotenv
-from smtplib import SMTP, SMTPException
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from fastapi.middleware.cors import CORSMiddleware
+from datetime import datetime, timedelta
+from typing import Optional
 import os
 import secrets
 
 # Load environment variables
 load_dotenv()
 
+# config comes first: it puts backend/ on the path for shared.
 from config.db import create_tables, engine
-from models.signup import User, UserRegistration
+from shared.db import pool_stats
+from shared.telemetry import install as install_telemetry, span
+from models.signup import User, UserLogin, UserRegistration
+from mailer import OutboxWorker, enqueue_email, outbox_stats
+from security import DUMMY_HASH, hash_password_async, needs_rehash, verify_password_async
+
+mail_worker = OutboxWorker.from_env(engine)
+
+# Drain the email outbox in the background while the app is up
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mail_worker.start()
+    yield
+    mail_worker.stop()
 
 # FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow requests from the frontend (Next.js)
 app.add_middleware(
@@ -27,12 +44,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Function to hash passwords
-def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_password.decode('utf-8')
+# Request IDs, traces, Server-Timing, /metrics and JSON logs (LOG_FORMAT=json)
+install_telemetry(app, "login")
 
 # Function to validate the password
 def validate_password(password: str) -> bool:
@@ -46,16 +59,10 @@ def validate_password(password: str) -> bool:
 
     return has_uppercase and has_digit and has_special
 
-# Function to send a confirmation email
-def send_confirmation_email(email: str, first_name: str, token: str):
-    try:
-        smtp_server = os.getenv("SMTP_SERVER")
-        smtp_port = int(os.getenv("SMTP_PORT"))
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_password = os.getenv("SMTP_PASSWORD")
-
-        subject = "Email Confirmation for Your Registration"
-        body = f"""
+# Confirmation email for a new registration; delivered by the outbox worker
+def confirmation_email(first_name: str, token: str) -> tuple:
+    subject = "Email Confirmation for Your Registration"
+    body = f"""
         Hi {first_name},
         
         Thank you for registering on our platform. Please click the link below to confirm your email address:
@@ -65,88 +72,123 @@ def send_confirmation_email(email: str, first_name: str, token: str):
         Best regards,
         The Team
         """
+    return subject, body
+
+CONFIRMATION_TOKEN_TTL = timedelta(hours=float(os.getenv("CONFIRMATION_TOKEN_TTL_HOURS", "48")))
+
+# Insert a user unless the email is taken, in one statement; returns the new id or None
+def insert_user_if_new(session: Session, values: dict) -> Optional[int]:
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = (
+            insert(User)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["email"])
+            .returning(User.id)
+        )
+        return session.execute(statement).scalar_one_or_none()
+    # Other databases: rely on the unique index and catch the violation.
+    try:
+        with session.begin_nested():
+            return session.execute(sa_insert(User).values(**values)).inserted_primary_key[0]
+    except IntegrityError:
+        return None
 
-        msg = MIMEMultipart()
-        msg["From"] = smtp_user
-        msg["To"] = email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        with SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
+@app.post("/register/")
+async def register_user(user: UserRegistration):
+    if not validate_password(user.password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Password must be at least 8 characters long, include an uppercase letter, a number, and a special character."
+        )
 
-    except SMTPException as e:
+    if user.password != user.confirm_password:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send email: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Passwords do not match"
         )
 
-# Function to check if the email is already registered
-def is_email_registered(email: str, session: Session) -> bool:
-    statement = select(User).where(User.email == email)
-    result = session.exec(statement).first()
-    return result is not None
+    # Hash on the pool without holding a pooled connection while waiting.
+    with span("crypto", "bcrypt.hash"):
+        hashed_password = await hash_password_async(user.password)
+    confirmation_token = secrets.token_urlsafe(32)
 
-@app.post("/register/")
-async def register_user(user: UserRegistration, background_tasks: BackgroundTasks):
     with Session(engine) as session:
-        if is_email_registered(user.email, session):
+        user_id = insert_user_if_new(session, {
+            "First_Name": user.First_Name,
+            "Last_Name": user.Last_Name,
+            "email": user.email,
+            "password": hashed_password,
+            "is_active": False,  # User will be inactive until email is confirmed
+            "confirmation_token": confirmation_token,
+            "confirmation_expires_at": datetime.utcnow() + CONFIRMATION_TOKEN_TTL,
+        })
+        if user_id is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email is already registered"
             )
+        # Queued in the same transaction, so a user never lacks their email.
+        enqueue_email(session, user.email, *confirmation_email(user.First_Name, confirmation_token))
+        session.commit()
 
-        if not validate_password(user.password):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Password must be at least 8 characters long, include an uppercase letter, a number, and a special character."
-            )
-
-        if user.password != user.confirm_password:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Passwords do not match"
-            )
+    mail_worker.notify()
 
-        hashed_password = hash_password(user.password)
-        confirmation_token = secrets.token_urlsafe(32)
+    return {"message": "Registration successful! Please check your email to confirm your registration."}
 
-        db_user = User(
-            First_Name=user.First_Name,
-            Last_Name=user.Last_Name,
-            email=user.email,
-            password=hashed_password,
-            is_active=False,  # User will be inactive until email is confirmed
-            confirmation_token=confirmation_token
+@app.get("/confirm-email/{token}")
+async def confirm_email(token: str):
+    # One indexed UPDATE; an unknown, used or expired token matches no row.
+    with Session(engine) as session:
+        result = session.execute(
+            update(User)
+            .where(User.confirmation_token == token, User.confirmation_expires_at > datetime.utcnow())
+            .values(is_active=True, confirmation_token=None, confirmation_expires_at=None)
         )
-        session.add(db_user)
         session.commit()
-        session.refresh(db_user)
 
-        background_tasks.add_task(send_confirmation_email, user.email, user.First_Name, confirmation_token)
+    if result.rowcount != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired confirmation token"
+        )
 
-    return {"message": "Registration successful! Please check your email to confirm your registration."}
+    return {"message": "Email confirmed successfully! You can now log in."}
 
-@app.get("/confirm-email/{token}")
-async def confirm_email(token: str):
+@app.post("/login/")
+async def login_user(credentials: UserLogin):
     with Session(engine) as session:
-        statement = select(User).where(User.confirmation_token == token)
-        user = session.exec(statement).first()
+        user = session.exec(select(User).where(User.email == credentials.email)).first()
 
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid or expired confirmation token"
-            )
+    with span("crypto", "bcrypt.verify"):
+        valid = await verify_password_async(credentials.password, user.password if user else DUMMY_HASH)
+    if not user or not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
 
-        user.is_active = True
-        user.confirmation_token = None
-        session.add(user)
-        session.commit()
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Please confirm your email before logging in"
+        )
 
-    return {"message": "Email confirmed successfully! You can now log in."}
+    # Upgrade the stored hash when BCRYPT_ROUNDS has changed.
+    if needs_rehash(user.password):
+        with span("crypto", "bcrypt.hash"):
+            user.password = await hash_password_async(credentials.password)
+        with Session(engine) as session:
+            session.add(user)
+            session.commit()
+
+    return {"message": "Login successful!"}
+
+# Connection pool utilisation for this service
+@app.get("/system-status")
+def check_sys_status():
+    return {"response": "System is online", "database": pool_stats(), "email_outbox": outbox_stats(engine)}
 
 # Start the FastAPI app
 def start():
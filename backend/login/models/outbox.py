@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, Index, Text
+from sqlmodel import Field, SQLModel
+
+
+# Outgoing emails, written in the same transaction as the row that needs them
+class EmailOutbox(SQLModel, table=True):
+    # Both lead with status, so counting rows per status reads an index.
+    __table_args__ = (
+        Index("ix_emailoutbox_status_next_attempt", "status", "next_attempt_at"),
+        Index("ix_emailoutbox_status_sent_at", "status", "sent_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    recipient: str
+    subject: str
+    body: str = Field(sa_column=Column(Text, nullable=False))
+    status: str = "pending"  # pending, sending, sent or dead
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
@@ -1,13 +1,20 @@
+from datetime import datetime
+from typing import Optional
+
 from sqlmodel import SQLModel, Field
 from pydantic import BaseModel, EmailStr
 
 # Define the User model with SQLModel
+# Schema changes go through config/migrations.py, not create_all.
 class User(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     First_Name: str
     Last_Name:str
-    email: EmailStr
+    email: EmailStr = Field(unique=True, index=True)
     password: str
+    is_active: bool = False
+    confirmation_token: Optional[str] = Field(default=None, unique=True, index=True)
+    confirmation_expires_at: Optional[datetime] = None
 
 # Pydantic model for registration
 class UserRegistration(BaseModel):
@@ -15,4 +22,9 @@ class UserRegistration(BaseModel):
     Last_Name:str
     email: EmailStr
     password: str
-    confirm_password: str
\ No newline at end of file
+    confirm_password: str
+
+# Pydantic model for login
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
@@ -1,32 +1,64 @@
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.tools.retriever import create_retriever_tool
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.indexes import VectorstoreIndexCreator
-from langchain_community.document_loaders import TextLoader
+from langchain.indexes.vectorstore import VectorStoreIndexWrapper
 from langchain_core.messages import HumanMessage
-from langgraph.graph import StateGraph, START
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph import MessagesState
-from langgraph.prebuilt import ToolNode
 from langgraph.prebuilt import tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph.state import CompiledStateGraph # type
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from langchain_core.messages import  HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from dotenv import load_dotenv
-from pydantic import BaseModel
-from sqlmodel import SQLModel, Field, create_engine, Session, select
+from pydantic import BaseModel, Field as PydanticField
+from sqlmodel import SQLModel, Session
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import csv
+import datetime
+import io
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import orjson
+import time
+import uuid
+from fastapi import Cookie, FastAPI, HTTPException, Request, Response, status
 import uvicorn
 
 load_dotenv()
 
-app = FastAPI()
+from rag.sources import NUTRITIONISTS, embedding_client, get_index_store, knowledge_base
+from rag.hybrid import HybridSearcher
+from rag.retrievers import LazyRetriever
+from resources import LazyResource, readiness, warm_up
+from executor import as_async_tool, run_blocking
+from checkpointers import get_checkpointer
+from streaming import stream_graph
+from calories import batch_to_columns, batch_to_records, calculate_daily_calories, calculate_daily_calories_batch
+from nutritionist_directory import NutritionistDirectory, embedding_fallback, format_availability, parse_time
+from context import ContextManager
+from tool_runner import GuardedToolNode, route_after_tools
+from router import FastPathRouter, Intent, calorie_reply, parse_calorie_request, parse_cancel_request, route_after_router
+from cache import cache_from_env, cache_model_response, cached_message, cached_tool, model_cache_key, tool_cache_enabled
+from shared.db import create_db_engine, pool_stats
+from shared.telemetry import REGISTRY, install as install_telemetry, span
+from tracing import graph_callbacks, request_tokens
+from admission import AdmissionController, Rejected
+from appointments import Appointment, AppointmentFilter, book, ensure_slot_index, iter_appointments, query_appointments, summarize, to_record
+
+# Expensive resources are built lazily; the lifespan below warms them
+# concurrently in the background so the server can bind its port at once.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = asyncio.create_task(warm_up(RESOURCES))
+    yield
+    warmup.cancel()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,27 +67,53 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request IDs, traces, Server-Timing, /metrics and JSON logs (LOG_FORMAT=json)
+install_telemetry(app, "chat")
 
-llm = ChatGoogleGenerativeAI(
+llm = LazyResource("llm", lambda: ChatGoogleGenerativeAI(
     model="gemini-1.5-flash", 
     google_api_key=os.getenv("GOOGLE_API_KEY")
-)
+))
 
 # Setup the RAG model and FAISS VectorStore
-embedding = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-text_splitter = CharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-
-try:
-    loader = TextLoader("nutritionists.txt")
-    index_creator = VectorstoreIndexCreator(
-        embedding=embedding, 
-        vectorstore_cls=FAISS,
-        text_splitter=text_splitter
-    )
-    index = index_creator.from_loaders([loader])
-except Exception as e:
-    print("Error while loading or indexing the document:", e)
-    index = None  # Set to None if there's an issue
+# Indexes are read from the on-disk store (see build_index.py) and only
+# re-embedded when their source content changes.
+index_store = LazyResource("index_store", get_index_store)
+index = LazyResource(
+    "nutritionist_index",
+    lambda: VectorStoreIndexWrapper(vectorstore=index_store.get().load_or_build(NUTRITIONISTS)),
+)
+
+# Structured nutritionist directory for deterministic availability lookups
+nutritionist_directory = LazyResource(
+    "nutritionist_directory",
+    lambda: NutritionistDirectory.from_file(
+        "nutritionists.txt",
+        semantic_fallback=embedding_fallback(lambda: index_store.get().embedding),
+    ),
+)
+
+
+def find_available_nutritionists(specialization: str = "", date: str = "", time: str = "") -> str:
+    """
+    Find which nutritionists are available, filtered by specialization, date and/or time.
+
+    Args:
+        specialization: The kind of care needed (e.g. 'Weight Management'). Leave empty for any.
+        date: The date to check (YYYY-MM-DD). Leave empty for any date.
+        time: A time of day to check (HH:MM or e.g. '10:00 AM'). Leave empty for any time.
+
+    Returns:
+        One line per matching nutritionist and time slot, or a message if none is available.
+    """
+    try:
+        on = datetime.date.fromisoformat(date) if date else None
+        at = parse_time(time) if time else None
+    except ValueError as e:
+        return f"Invalid date or time: {e}"
+    results = nutritionist_directory.get().find(specialization or None, on, at)
+    return format_availability(results)
+
 
 # Define the RAG query tool for nutritionist data
 def rag_query_tool(user_input: str) -> str:
@@ -68,10 +126,12 @@ def rag_query_tool(user_input: str) -> str:
     Returns:
         A string response with nutritionist details or an error message.
     """
-    if not index:
+    try:
+        nutritionist_index = index.get()
+    except Exception:
         return "Nutritionist data index is not available."
     try:
-        response = index.query(user_input, llm=llm)
+        response = nutritionist_index.query(user_input, llm=llm.get())
 
         if response:
             # Assuming response is structured, return it formatted.
@@ -82,17 +142,36 @@ def rag_query_tool(user_input: str) -> str:
         return f"Error while querying nutritionist data: {e}"
 
 
-# Define the database model for appointments
-class Appointment(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    doctor: str
-    date: str
-    time: str
-    specialization: str
+def is_rag_error(result: str) -> bool:
+    return result.startswith(("Error while", "Nutritionist data index is not available"))
+
+
+async def arag_query_tool(user_input: str) -> str:
+    """Async variant of rag_query_tool used by the graph's async path."""
+    try:
+        nutritionist_index = await run_blocking(index.get)
+    except Exception:
+        return "Nutritionist data index is not available."
+    try:
+        response = await nutritionist_index.aquery(user_input, llm=llm.get())
+
+        if response:
+            return response
+        else:
+            return "No relevant nutritionist information found for your query."
+    except Exception as e:
+        return f"Error while querying nutritionist data: {e}"
+
+
+# Pooled engine; sizing and timeouts come from the DB_* env settings
+engine = create_db_engine("appointments")
 
-# Create a SQLite database
-engine = create_engine(os.getenv('DB_URI'))
-SQLModel.metadata.create_all(engine)
+def init_db():
+    SQLModel.metadata.create_all(engine)
+    ensure_slot_index(engine)
+    return engine
+
+database = LazyResource("database", init_db)
 
 # Correcting the book_appointment function
 def book_appointment(doctor: str, date: str, time: str, specialization: str) -> str:
@@ -105,19 +184,47 @@ def book_appointment(doctor: str, date: str, time: str, specialization: str) ->
         time: The time of the appointment (HH:MM).
     
     Returns:
-        Confirmation message with appointment details.
+        Confirmation message with the appointment ID, or a message saying the
+        slot is already taken so another time can be offered.
     """
     try:
-        # Use correct field names
-        appointment = Appointment(doctor=doctor, date=date, time=time, specialization=specialization)
-        with Session(engine) as session:
-            session.add(appointment)
-            session.commit()
-        return f"Appointment booked successfully with Dr. {doctor} (Specialization: {specialization}) on {date} at {time}."
+        return book(database.get(), doctor, date, time, specialization).message
     except Exception as e:
         return f"Failed to book appointment: {str(e)}"
 
 
+APPOINTMENTS_PAGE_SIZE = int(os.getenv("APPOINTMENTS_PAGE_SIZE", "20"))
+
+def get_appointments(doctor: str = "", date_from: str = "", date_to: str = "", specialization: str = "", cursor: str = "") -> str:
+    """Lists booked appointments, one line each, oldest first.
+
+    Args:
+        doctor: Only appointments with this doctor (name as booked). Optional.
+        date_from: Earliest date to include (YYYY-MM-DD). Optional.
+        date_to: Latest date to include (YYYY-MM-DD). Optional.
+        specialization: Only appointments for this specialization. Optional.
+        cursor: The cursor returned by a previous call, to fetch the next page.
+
+    Returns:
+        One "#id date time doctor (specialization)" line per appointment,
+        followed by a cursor line when more appointments are available.
+    """
+    try:
+        filters = AppointmentFilter.parse(doctor, date_from, date_to, specialization)
+        with Session(database.get()) as session:
+            page, next_cursor = query_appointments(session, filters, APPOINTMENTS_PAGE_SIZE, cursor.strip() or None)
+    except ValueError as e:
+        return f"Could not list appointments: {e}"
+    except Exception as e:
+        return f"Failed to list appointments: {str(e)}"
+    if not page:
+        return "No appointments found."
+    lines = [summarize(appointment) for appointment in page]
+    if next_cursor:
+        lines.append(f"More appointments available; call again with cursor={next_cursor}")
+    return "\n".join(lines)
+
+
 # Function to delete a booked appointment
 def delete_appointment(appointment_id: int) -> str:
     """
@@ -130,7 +237,7 @@ def delete_appointment(appointment_id: int) -> str:
         Confirmation message on successful deletion or an error message.
     """
     try:
-        with Session(engine) as session:
+        with Session(database.get()) as session:
             appointment = session.get(Appointment, appointment_id)
             if not appointment:
                 return f"Appointment with ID {appointment_id} not found."
@@ -144,19 +251,33 @@ def delete_appointment(appointment_id: int) -> str:
 
 search = TavilySearchResults(tavily_api_key=os.getenv("TAVILY_API_KEY"))
 
-loader1 = WebBaseLoader("https://www.healthline.com/nutrition/1500-calorie-diet#foods-to-eat")
-# loader2 = WebBaseLoader("https://www.msdmanuals.com/home")
-# loader3 = WebBaseLoader("https://www.eatingwell.com/category/4305/weight-loss-meal-plans/")
-docs1 = loader1.load()
-# docs2 = loader2.load()
-# docs3 = loader3.load()
-# combined_docs = docs1 + docs2 + docs3
-documents = RecursiveCharacterTextSplitter(
-    chunk_size=1000, chunk_overlap=200
-).split_documents(docs1)
-vector = FAISS.from_documents(documents, GoogleGenerativeAIEmbeddings(model="models/embedding-001"))
-
-retriever = vector.as_retriever()
+vector = LazyResource("knowledge_base", lambda: index_store.get().load_merged(knowledge_base()))
+# BM25 + dense search with RRF over the knowledge base; see rag/hybrid.py for RETRIEVER_* settings
+knowledge_search = LazyResource("knowledge_search", lambda: HybridSearcher.from_env(vector.get()))
+
+# serve.py builds these once before forking workers: the indexes are
+# read-only afterwards, and creating the schema up front keeps workers
+# from racing to create the same tables.
+PRELOAD = [database, index_store, index, vector, knowledge_search, nutritionist_directory]
+
+
+def after_fork() -> None:
+    """Give a forked worker its own embedding client; the parent's connection is not fork-safe."""
+    if index_store.ready:
+        index_store.get().embedding.embedding = embedding_client()
+
+
+# Response caches; semantic lookups reuse the knowledge base embedding model.
+embedding_provider = lambda: index_store.get().embedding
+llm_cache = cache_from_env("assistant", embedding_provider)
+retriever_cache = cache_from_env("healthline_search", embedding_provider)
+rag_cache = cache_from_env("rag_query_tool", embedding_provider)
+CACHES = [llm_cache, retriever_cache, rag_cache]
+
+retriever = LazyRetriever(
+    resource=knowledge_search,
+    cache=retriever_cache if tool_cache_enabled("healthline_search") else None,
+)
 retriever_tool = create_retriever_tool(
     retriever,
     "healthline_search",
@@ -180,174 +301,40 @@ def calorie_calculator_tool(gender: str, weight: float, height: float, age: int,
             - 'daily_calories': Estimated daily caloric needs based on activity level.
             - 'maintenance_plan': A guide for maintaining current weight.
     """
-    def calculate_daily_calories(gender, weight, height, age, activity_level):
-        # Basal Metabolic Rate (BMR) calculation
-        if gender.lower() == "male":
-            bmr = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
-        elif gender.lower() == "female":
-            bmr = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
-        else:
-            raise ValueError("Invalid sex. Please use 'male' or 'female'.")
-
-        # Activity multipliers
-        activity_multipliers = {
-            "sedentary": 1.2,
-            "light": 1.375,
-            "moderate": 1.55,
-            "active": 1.725,
-            "very_active": 1.9
-        }
-        
-        if activity_level not in activity_multipliers:
-            raise ValueError("Invalid activity level. Choose from 'sedentary', 'light', 'moderate', 'active', or 'very_active'.")
-
-        # Calculate daily caloric needs
-        daily_calories = bmr * activity_multipliers[activity_level]
-
-        base_calories = daily_calories  # Initialize with the calculated calories
-
-        if gender == "female":
-            if activity_level == "lightly":
-                if 2 <= age <= 6:
-                    base_calories = min(max(1000, daily_calories), 1400)
-                elif 7 <= age <= 18:
-                    base_calories = min(max(1200, daily_calories), 1800)
-                elif 19 <= age <= 60:
-                    base_calories = min(max(1600, daily_calories), 2000)
-                elif age >= 61:
-                    base_calories = max(1600, daily_calories)
-            elif activity_level == "active":
-                if 2 <= age <= 6:
-                    base_calories = min(max(1000, daily_calories), 1600)
-                elif 7 <= age <= 18:
-                    base_calories = min(max(1600, daily_calories), 2400)
-                elif 19 <= age <= 60:
-                    base_calories = min(max(1800, daily_calories), 2400)
-                elif age >= 61:
-                    base_calories = min(max(1800, daily_calories), 2000)
-
-        elif gender == "male":
-            if activity_level == "lightly":
-                if 2 <= age <= 6:
-                    base_calories = min(max(1000, daily_calories), 1400)
-                elif 7 <= age <= 18:
-                    base_calories = min(max(1400, daily_calories), 2400)
-                elif 19 <= age <= 60:
-                    base_calories = min(max(2200, daily_calories), 2600)
-                elif age >= 61:
-                    base_calories = max(2000, daily_calories)
-            elif activity_level == "active":
-                if 2 <= age <= 6:
-                    base_calories = min(max(1000, daily_calories), 1800)
-                elif 7 <= age <= 18:
-                    base_calories = min(max(1600, daily_calories), 3200)
-                elif 19 <= age <= 60:
-                    base_calories = min(max(2400, daily_calories), 3000)
-                elif age >= 61:
-                    base_calories = min(max(2200, daily_calories), 2600)
-
-        # Determine if the user needs to gain, lose, or maintain weight
-        if daily_calories < base_calories:
-            weight_goal = "You should increase your calorie intake to gain weight."
-        elif daily_calories > base_calories:
-            weight_goal = "You should decrease your calorie intake to lose weight."
-        else:
-            weight_goal = "Your calorie intake is appropriate for maintaining your current weight."
-
-        # Define diet plans
-        diet_plans = {
-            "1500": {
-                "goal": "Weight Loss",
-                "plan": [
-                    "Breakfast: Greek yogurt with berries and chia seeds or oatmeal with sliced banana",
-                    "Morning Snack: Apple with almond butter or a handful of mixed nuts",
-                    "Lunch: Grilled chicken salad with greens and vinaigrette or quinoa salad with chickpeas and cucumber",
-                    "Afternoon Snack: Cottage cheese with cucumber or carrot sticks with hummus",
-                    "Dinner: Baked salmon, asparagus, and quinoa or stir-fried tofu with broccoli and brown rice",
-                    "Evening Snack: Almonds or a small piece of dark chocolate"
-                ]
-            },
-            "1800": {
-                "goal": "Weight Maintenance",
-                "plan": [
-                    "Breakfast: Scrambled eggs with spinach, whole-grain toast or smoothie with spinach and protein powder",
-                    "Morning Snack: Orange and walnuts or Greek yogurt with honey",
-                    "Lunch: Turkey wrap with hummus and veggies or lentil soup with whole-grain bread",
-                    "Afternoon Snack: Banana with peanut butter or rice cakes with avocado",
-                    "Dinner: Grilled chicken, sweet potato, and broccoli or baked tilapia with quinoa and green beans",
-                    "Evening Snack: Cottage cheese with berries or air-popped popcorn"
-                ]
-            },
-            "2000": {
-                "goal": "Moderate Weight Gain",
-                "plan": [
-                    "Breakfast: Overnight oats with banana and peanut butter or avocado toast with eggs",
-                    "Morning Snack: Smoothie with protein powder or a protein bar",
-                    "Lunch: Brown rice bowl with black beans and salsa or chicken stir-fry with vegetables",
-                    "Afternoon Snack: Toast with cottage cheese and tomatoes or fruit salad",
-                    "Dinner: Steak, mashed potatoes, and green beans or chicken curry with brown rice",
-                    "Evening Snack: Greek yogurt with honey and pumpkin seeds or protein shake"
-                ]
-            },
-            "2200": {
-                "goal": "Active Weight Maintenance/Gain",
-                "plan": [
-                    "Breakfast: Omelet with veggies and whole-grain toast or smoothie bowl with fruits and granola",
-                    "Morning Snack: Greek yogurt with granola and blueberries or nut butter on whole-grain bread",
-                    "Lunch: Tuna wrap with veggies or quinoa salad with chickpeas and feta",
-                    "Afternoon Snack: Apple and almonds or veggie sticks with hummus",
-                    "Dinner: Roasted chicken, brown rice, and carrots or fish tacos with cabbage slaw",
-                    "Evening Snack: Dark chocolate with walnuts or a handful of dried fruit"
-                ]
-            },
-            "2500": {
-                "goal": "High-Calorie for Weight Gain",
-                "plan": [
-                    "Breakfast: Smoothie bowl with peanut butter and granola or pancakes with maple syrup",
-                    "Morning Snack: Crackers with cheese and apple or energy bites with oats and honey",
-                    "Lunch: Quinoa bowl with chickpeas and roasted veggies or burrito with beans and cheese",
-                    "Afternoon Snack: Protein bar or mixed nuts and dried fruit or yogurt with granola",
-                    "Dinner: Pasta with ground turkey and salad or lamb kebabs with rice and grilled vegetables",
-                    "Evening Snack: Cottage cheese with honey and mango or fruit and nut mix"
-                ]
-            }
-        }
-
-        # Select the appropriate diet plan based on the calculated calories
-        if daily_calories <= 1500:
-            selected_diet_plan = diet_plans["1500"]
-        elif daily_calories <= 1800:
-            selected_diet_plan = diet_plans["1800"]
-        elif daily_calories <= 2000:
-            selected_diet_plan = diet_plans["2000"]
-        elif daily_calories <= 2200:
-            selected_diet_plan = diet_plans["2200"]
-        else:
-            selected_diet_plan = diet_plans["2500"]
-        
-        # Create a maintenance plan
-        maintenance_plan = {
-            "maintain": round(daily_calories),
-            "gain_weight": round(daily_calories + 500),
-            "lose_weight": round(daily_calories - 500)
-        }
-        
-        return {
-            "bmr": round(bmr, 2),
-            "daily_calories": round(daily_calories, 2),
-            "maintenance_plan": maintenance_plan,
-            "weight_goal": weight_goal,
-            "selected_diet_plan": selected_diet_plan
-        }
-
-    # Return calculated daily calories
     return calculate_daily_calories(gender, weight, height, age, activity_level)
 
 
-tools = [search, retriever_tool, calorie_calculator_tool, get_appointments, book_appointment, rag_query_tool, delete_appointment]
+# Tavily and the retriever tool are natively async (the hybrid search itself
+# runs on the bounded pool, see rag/hybrid.py). The remaining tools are
+# blocking (SQL sessions, CPU work) and run on the bounded tool pool when the
+# graph is awaited.
+tools = [
+    search,
+    retriever_tool,
+    as_async_tool(calorie_calculator_tool),
+    as_async_tool(find_available_nutritionists),
+    as_async_tool(get_appointments),
+    as_async_tool(book_appointment),
+    as_async_tool(
+        cached_tool(rag_cache, rag_query_tool, skip=is_rag_error),
+        cached_tool(rag_cache, arag_query_tool, name="rag_query_tool", skip=is_rag_error),
+    ),
+    as_async_tool(delete_appointment),
+]
+
 
+# Fully specified calorie and cancellation requests skip the model (ROUTER_ENABLED).
+router = FastPathRouter.from_env([
+    Intent("calories", "calorie_calculator_tool", parse_calorie_request, calorie_calculator_tool, calorie_reply),
+    Intent("cancel_appointment", "delete_appointment", parse_cancel_request, delete_appointment, lambda args, result: result),
+])
 
-llm_with_tools = llm.bind_tools(tools)
+# Concurrent tool calls with timeouts, a turn budget and circuit breakers (TOOL_* settings)
+tool_node = GuardedToolNode.from_env(tools)
+
+llm_with_tools = LazyResource("llm_with_tools", lambda: llm.get().bind_tools(tools))
+
+RESOURCES = [llm, llm_with_tools, index_store, index, vector, knowledge_search, nutritionist_directory, database]
 
 # System message
 sys_msg = SystemMessage(content='''You are a helpful customer support assistant specializing in calorie calculation, personalized diet plans, and health-related services. 
@@ -382,15 +369,16 @@ Your key responsibilities include calculating users' daily calorie intake, provi
 ### **Book Appointment Assistant**:
 - If the user requests an appointment, follow these steps:
   1. Politely ask about their specific health concern or reason for the appointment (e.g., diet consultation, weight management, Cardiac Health Diet, Geriatric Nutrition, Post-Surgery Recovery Diets or a specific health issue).
-  2. Use the **rag_query_tool** to fetch a list of available nutritionists based on the user's requirements, showing their names, specializations, and show available dates and times.
+  2. Use the **find_available_nutritionists** tool to fetch the available nutritionists based on the user's requirements (specialization, date and time), showing their names, specializations, and available dates and times. Only fall back to the **rag_query_tool** for open-ended questions about the nutritionists.
   3. Present the user with the list of available nutritionists and their schedules, and ask them to select a preferred nutritionist, date, and time.
   4. Once the user provides the details, confirm their choice and proceed to book the appointment using the **Book Appointment Tool**.
-  5. Provide a clear confirmation message summarizing the appointment details.
+  5. Provide a clear confirmation message summarizing the appointment details, including the appointment ID.
+  6. If the tool reports that the slot is already booked, tell the user and offer the nutritionist's other available times instead.
 
                         
 ### **Appointment Deletion**:
 - If the user requests to cancel an appointment, follow these steps:
-  1. Ask for the appointment ID or other identifying details.
+  1. Ask for the appointment ID or other identifying details. If the user does not know the ID, use the `get_appointments` tool (filtered by doctor or date) to find it.
   2. Use the `delete_appointment` tool to cancel the booking.
   3. Provide a confirmation message once the appointment is successfully deleted.
   4. If the appointment ID is invalid, notify the user politely and ask for a valid ID.
@@ -415,54 +403,305 @@ Your key responsibilities include calculating users' daily calorie intake, provi
 
 By effectively managing calorie calculations, diet plans, and appointment bookings, aim to offer a seamless and user-friendly experience.''')
 
+# Conversation state: the messages plus a running summary of compacted turns.
+class AssistantState(MessagesState):
+    summary: str
+    # Wall-clock start of the current turn, set by the router; bounds tool time.
+    turn_started: float
+
+
+# Keeps each prompt within CONTEXT_MAX_TOKENS (see context.py).
+conversation = ContextManager.from_env(summarizer=llm.get)
+
 # Node
-def assistant(state: MessagesState) -> MessagesState:
-    return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"][-10:])]}
+def assistant(state: AssistantState, config: RunnableConfig) -> AssistantState:
+    context = conversation.compact(sys_msg, state["messages"], state.get("summary", ""))
+    key, semantic = model_cache_key(context.cache_window())
+    # Near-duplicate answers are only shared within the conversation.
+    scope = config["configurable"].get("thread_id", "")
+    found, message, vector = llm_cache.get(key, semantic=semantic, scope=scope)
+    if not found:
+        started = time.perf_counter()
+        message = llm_with_tools.get().invoke(context.prompt(sys_msg))
+        router.observe_model(time.perf_counter() - started)
+        cache_model_response(llm_cache, key, message, vector, scope=scope)
+    update = context.update()
+    return {**update, "messages": update["messages"] + [cached_message(message)]}
+
+async def aassistant(state: AssistantState, config: RunnableConfig) -> AssistantState:
+    model = await run_blocking(llm_with_tools.get)
+    context = await conversation.acompact(sys_msg, state["messages"], state.get("summary", ""))
+    key, semantic = model_cache_key(context.cache_window())
+    scope = config["configurable"].get("thread_id", "")
+    found, message, vector = await llm_cache.aget(key, semantic=semantic, scope=scope)
+    if not found:
+        started = time.perf_counter()
+        message = await model.ainvoke(context.prompt(sys_msg))
+        router.observe_model(time.perf_counter() - started)
+        cache_model_response(llm_cache, key, message, vector, scope=scope)
+    update = context.update()
+    return {**update, "messages": update["messages"] + [cached_message(message)]}
 
 # Build graph
-builder: StateGraph = StateGraph(MessagesState)
+builder: StateGraph = StateGraph(AssistantState)
 
 # Define nodes: these do the work
-builder.add_node("assistant", assistant)
-builder.add_node("tools", ToolNode(tools))
+builder.add_node("router", RunnableLambda(router.route, afunc=router.aroute, name="router"))
+builder.add_node("assistant", RunnableLambda(assistant, afunc=aassistant, name="assistant"))
+builder.add_node("tools", RunnableLambda(tool_node.invoke, afunc=tool_node.ainvoke, name="tools"))
 
 # Define edges: these determine how the control flow moves
-builder.add_edge(START, "assistant")
+builder.add_edge(START, "router")
+# The router either answered the turn itself or hands it to the assistant
+builder.add_conditional_edges("router", route_after_router, ["assistant", END])
 builder.add_conditional_edges(
     "assistant",
     # If the latest message (result) from assistant is a tool call -> tools_condition routes to tools
     # If the latest message (result) from assistant is a not a tool call -> tools_condition routes to END
     tools_condition,
 )
-builder.add_edge("tools", "assistant")
-memory: MemorySaver = MemorySaver()
+builder.add_conditional_edges("tools", route_after_tools, ["assistant", END])
+# Bounded in-process store by default; CHECKPOINTER=sql keeps threads in the database.
+memory: BaseCheckpointSaver = get_checkpointer()
 react_graph_memory: CompiledStateGraph = builder.compile(checkpointer=memory)
 
 class UserInput(BaseModel):
     input_text: str 
+    thread_id: Optional[str] = PydanticField(default=None, max_length=128)
+
+
+def graph_config(thread_id: str) -> dict:
+    # The callbacks record nodes, model calls, tools and retrievers in the request trace.
+    return {"configurable": {"thread_id": thread_id}, "callbacks": graph_callbacks}
+
+
+def resolve_thread_id(user_input: UserInput, cookie_thread_id: Optional[str]) -> str:
+    """Pick the conversation thread from the request body, then the session cookie.
+
+    New visitors get a fresh thread ID, returned in the body and set as a cookie.
+    """
+    thread_id = user_input.thread_id or cookie_thread_id
+    if not thread_id or len(thread_id) > 128:
+        thread_id = uuid.uuid4().hex
+    return thread_id
+
+
+def set_thread_cookie(response: Response, thread_id: str) -> None:
+    response.set_cookie("thread_id", thread_id, httponly=True, samesite="lax")
+
+# Token-bucket quotas, a run limit and a wait queue in front of the graph (ADMISSION_* settings)
+admission = AdmissionController.from_env()
+ADMISSION_USER_HEADER = os.getenv("ADMISSION_USER_HEADER")
+REJECTION_MESSAGES = {
+    "user_quota": "You have sent a lot of requests in a short time. Please try again shortly.",
+    "global_quota": "The assistant is handling a lot of requests right now. Please try again shortly.",
+    "overloaded": "The assistant is handling a lot of requests right now. Please try again shortly.",
+    "queue_timeout": "The assistant is handling a lot of requests right now. Please try again shortly.",
+}
+
+
+def admission_user(request: Request) -> str:
+    """The user a request is charged to: the gateway's user header when configured, else the client address."""
+    if ADMISSION_USER_HEADER and request.headers.get(ADMISSION_USER_HEADER):
+        return request.headers[ADMISSION_USER_HEADER][:128]
+    return request.client.host if request.client else "unknown"
+
+
+async def admit(request: Request):
+    try:
+        return await admission.admit(admission_user(request))
+    except Rejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=REJECTION_MESSAGES.get(e.reason, str(e)),
+            headers={"Retry-After": e.retry_after_header},
+        )
 
 # API endpoint
 @app.post("/generateanswer")
-async def generate_answer(user_input: UserInput):
+async def generate_answer(user_input: UserInput, request: Request, response: Response, thread_id: Optional[str] = Cookie(default=None)):
+    thread_id = resolve_thread_id(user_input, thread_id)
+    set_thread_cookie(response, thread_id)
+    ticket = await admit(request)
     try:
         messages = [HumanMessage(content=user_input.input_text)]
-        response = react_graph_memory.invoke({"messages": messages}, config={"configurable": {"thread_id": "1"}})
+        with span("graph", "react_graph"):
+            result = await react_graph_memory.ainvoke({"messages": messages}, config=graph_config(thread_id))
 
         # Extract the response from the graph output
-        if response and "messages" in response:
+        if result and "messages" in result:
             # Extract the last message (assistant's response)
-            assistant_response = response["messages"][-1].content
-            return {"response": assistant_response}
+            assistant_response = result["messages"][-1].content
+            return {"response": assistant_response, "thread_id": thread_id}
         else:
-            return {"response": "No response generated."}
+            return {"response": "No response generated.", "thread_id": thread_id}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await admission.release(ticket, request_tokens())
+
+
+# Streaming variant of /generateanswer (Server-Sent Events)
+@app.post("/generateanswer/stream")
+async def generate_answer_stream(user_input: UserInput, request: Request, thread_id: Optional[str] = Cookie(default=None)):
+    thread_id = resolve_thread_id(user_input, thread_id)
+    ticket = await admit(request)
+    messages = [HumanMessage(content=user_input.input_text)]
+    events = stream_graph(
+        react_graph_memory,
+        {"messages": messages},
+        config=graph_config(thread_id),
+    )
+
+    # The run slot is held until the stream ends or the client goes away.
+    async def admitted_events():
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await admission.release(ticket, request_tokens())
+
+    response = StreamingResponse(
+        admitted_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    set_thread_cookie(response, thread_id)
+    return response
+
+
+class CalorieBatch(BaseModel):
+    gender: List[str]
+    weight: List[float]
+    height: List[float]
+    age: List[float]
+    activity_level: List[str]
+
+
+def parse_calorie_csv(text: str) -> CalorieBatch:
+    reader = csv.DictReader(io.StringIO(text))
+    columns = {name: [] for name in CalorieBatch.model_fields}
+    for row in reader:
+        for name in columns:
+            columns[name].append(row.get(name, ""))
+    return CalorieBatch(**columns)
+
+
+# Batch calorie calculation for whole rosters. Accepts JSON arrays per column
+# or a CSV body (Content-Type: text/csv) with the same column names. Answers
+# in columns by default, written straight from the NumPy arrays by orjson;
+# format=records builds one dict per row, which is several times slower for
+# large rosters.
+@app.post("/calories/batch")
+async def calories_batch(request: Request, format: str = "columns"):
+    body = await request.body()
+    csv_body = request.headers.get("content-type", "").startswith("text/csv")
+
+    def compute():
+        # Parsing, computing and encoding all run here, off the event loop.
+        try:
+            batch = parse_calorie_csv(body.decode("utf-8")) if csv_body else CalorieBatch(**orjson.loads(body))
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        columns = calculate_daily_calories_batch(
+            batch.gender, batch.weight, batch.height, batch.age, batch.activity_level
+        )
+        if format == "records":
+            return ORJSONResponse({"results": batch_to_records(columns)})
+        return ORJSONResponse(batch_to_columns(columns))
+
+    try:
+        return await run_blocking(compute)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# Appointments for the frontend: keyset pages, or every match as NDJSON
+@app.get("/appointments")
+async def list_appointments(
+    doctor: str = "",
+    date_from: str = "",
+    date_to: str = "",
+    specialization: str = "",
+    cursor: str = "",
+    limit: int = 50,
+):
+    def fetch():
+        filters = AppointmentFilter.parse(doctor, date_from, date_to, specialization)
+        with Session(database.get()) as session:
+            return query_appointments(session, filters, max(1, min(limit, 500)), cursor or None)
+
+    try:
+        page, next_cursor = await run_blocking(fetch)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"appointments": [to_record(appointment) for appointment in page], "next_cursor": next_cursor}
+
+
+@app.get("/appointments/export")
+def export_appointments(doctor: str = "", date_from: str = "", date_to: str = "", specialization: str = ""):
+    try:
+        filters = AppointmentFilter.parse(doctor, date_from, date_to, specialization)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # A sync generator is iterated in the threadpool, one page in memory at a time.
+    def rows():
+        for appointment in iter_appointments(database.get(), filters):
+            yield json.dumps(to_record(appointment)) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
 
 
 @app.get("/system-status")
 def check_sys_status():
-    return {"response": "System is online"}
+    return {
+        "response": "System is online",
+        **readiness(RESOURCES),
+        "caches": {cache.name: cache.stats() for cache in CACHES},
+        "database": pool_stats(),
+        "context": conversation.stats(),
+        "router": router.stats(),
+        "tools": tool_node.stats(),
+        "admission": admission.stats(),
+    }
+
+
+# Component stats as Prometheus gauges on /metrics
+REGISTRY.gauge("app_router_turns_served", "Turns answered by the fast-path router, by intent.",
+               lambda: {(("intent", name),): count for name, count in router.stats()["by_intent"].items()})
+REGISTRY.gauge("app_router_seconds_saved", "Estimated model time saved by the fast-path router.",
+               lambda: {(): router.stats()["estimated_seconds_saved"]})
+REGISTRY.gauge("app_tool_breaker_open", "1 while a tool's circuit breaker is open.",
+               lambda: {(("tool", name),): int(stats["breaker"] == "open") for name, stats in tool_node.stats()["tools"].items()})
+REGISTRY.gauge("app_cache_hits", "Response cache hits (exact and semantic).",
+               lambda: {(("cache", cache.name),): cache.hits for cache in CACHES})
+REGISTRY.gauge("app_cache_misses", "Response cache misses.",
+               lambda: {(("cache", cache.name),): cache.misses for cache in CACHES})
+REGISTRY.gauge("app_admission_inflight", "Graph runs admitted and not yet finished.",
+               lambda: {(): admission.stats()["inflight"]})
+REGISTRY.gauge("app_admission_waiting", "Requests waiting for a run slot.",
+               lambda: {(): admission.stats()["waiting"]})
+REGISTRY.gauge("app_admission_rejected", "Requests turned away with 429, by reason.",
+               lambda: {(("reason", reason),): count for reason, count in admission.stats()["rejected"].items()})
+REGISTRY.gauge("app_context_compactions", "Conversation compactions (older turns summarized).",
+               lambda: {(): conversation.stats()["compactions"]})
+
+
+# Liveness: the process is up and serving requests.
+@app.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+
+# Readiness: every required subsystem has been warmed.
+@app.get("/health/ready")
+def readiness_probe(response: Response):
+    report = readiness(RESOURCES)
+    if not report["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return report
 # Run the application
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)
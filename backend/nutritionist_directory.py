@@ -0,0 +1,178 @@
+import difflib
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+@dataclass(frozen=True)
+class Slot:
+    date: date
+    start: time
+    end: time
+
+    def __str__(self) -> str:
+        return f"{self.date.isoformat()} {format_time(self.start)} - {format_time(self.end)}"
+
+
+@dataclass
+class Nutritionist:
+    name: str
+    specialization: str
+    slots: List[Slot] = field(default_factory=list)
+
+
+def format_time(value: time) -> str:
+    return value.strftime("%I:%M %p").lstrip("0")
+
+
+def parse_time(value: str) -> time:
+    """Parse times such as '10:00 AM', '2pm', '14:00' or '14:00:00'."""
+    value = value.strip().upper()
+    for fmt in ("%I:%M %p", "%I:%M%p", "%H:%M", "%H:%M:%S", "%I %p", "%I%p"):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {value!r}")
+
+
+def normalize_specialization(value: str) -> str:
+    return re.sub(r"\s+", " ", value).strip().lower()
+
+
+def parse_directory(text: str) -> List[Nutritionist]:
+    """Parse Name / Specialization / Date / Time blocks.
+
+    The n-th date of a block is offered in the n-th time range.
+    """
+    records = []
+    for block in re.split(r"\n\s*\n", text.strip()):
+        fields = {}
+        for line in block.splitlines():
+            key, _, value = line.partition(":")
+            fields[key.strip().lower()] = value.strip()
+        if "name" not in fields:
+            continue
+        dates = [date.fromisoformat(value.strip()) for value in fields.get("date", "").split(",") if value.strip()]
+        ranges = [value.strip() for value in fields.get("time", "").split(",") if value.strip()]
+        slots = []
+        for slot_date, slot_range in zip(dates, ranges):
+            start, _, end = slot_range.partition("-")
+            slots.append(Slot(slot_date, parse_time(start), parse_time(end)))
+        records.append(Nutritionist(fields["name"], fields.get("specialization", ""), slots))
+    return records
+
+
+class NutritionistDirectory:
+    """Typed nutritionist records with in-memory availability indexes.
+
+    Availability queries are answered from dictionaries keyed by
+    specialization, date and (date, hour) slot, so no vector search or LLM
+    call is involved. ``semantic_fallback``, if given, picks the closest of
+    the known specializations for a free-text query and is only consulted
+    when nothing matches exactly or fuzzily.
+    """
+
+    def __init__(
+        self,
+        records: List[Nutritionist],
+        semantic_fallback: Optional[Callable[[str, List[str]], Optional[str]]] = None,
+    ):
+        self.records = records
+        self.semantic_fallback = semantic_fallback
+        self.by_name: Dict[str, Nutritionist] = {record.name: record for record in records}
+        self.by_specialization: Dict[str, List[Nutritionist]] = defaultdict(list)
+        self.by_date: Dict[date, Set[str]] = defaultdict(set)
+        self.by_slot: Dict[tuple, Set[str]] = defaultdict(set)
+        for record in records:
+            self.by_specialization[normalize_specialization(record.specialization)].append(record)
+            for slot in record.slots:
+                self.by_date[slot.date].add(record.name)
+                for hour in range(slot.start.hour, slot.end.hour + (slot.end.minute > 0)):
+                    self.by_slot[(slot.date, hour)].add(record.name)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "NutritionistDirectory":
+        with open(path, encoding="utf-8") as f:
+            return cls(parse_directory(f.read()), **kwargs)
+
+    @property
+    def specializations(self) -> List[str]:
+        return sorted({record.specialization for record in self.records})
+
+    def match_specialization(self, query: str) -> List[Nutritionist]:
+        """Resolve a specialization: exact, then word overlap, then fuzzy, then semantic."""
+        wanted = normalize_specialization(query)
+        if wanted in self.by_specialization:
+            return list(self.by_specialization[wanted])
+
+        words = set(re.findall(r"\w+", wanted)) - {"diet", "diets", "nutrition", "health", "and"}
+        overlap = [
+            record
+            for key, records in self.by_specialization.items()
+            if words & set(re.findall(r"\w+", key))
+            for record in records
+        ]
+        if overlap:
+            return overlap
+
+        close = difflib.get_close_matches(wanted, list(self.by_specialization), n=1, cutoff=0.6)
+        if close:
+            return list(self.by_specialization[close[0]])
+
+        if self.semantic_fallback:
+            best = self.semantic_fallback(query, self.specializations)
+            if best:
+                return list(self.by_specialization[normalize_specialization(best)])
+        return []
+
+    def find(self, specialization: Optional[str] = None, on: Optional[date] = None, at: Optional[time] = None) -> List[tuple]:
+        """Return (nutritionist, slot) pairs matching every given filter."""
+        if specialization:
+            candidates = {record.name for record in self.match_specialization(specialization)}
+        else:
+            candidates = set(self.by_name)
+        if on is not None and at is not None:
+            candidates &= self.by_slot.get((on, at.hour), set())
+        elif on is not None:
+            candidates &= self.by_date.get(on, set())
+
+        results = []
+        for name in sorted(candidates):
+            for slot in self.by_name[name].slots:
+                if on is not None and slot.date != on:
+                    continue
+                if at is not None and not (slot.start <= at < slot.end):
+                    continue
+                results.append((self.by_name[name], slot))
+        return results
+
+
+def embedding_fallback(embedding_provider: Callable[[], Embeddings], threshold: float = 0.6) -> Callable:
+    """Build a semantic fallback that compares embeddings of specializations.
+
+    The specialization embeddings go through the document embedding cache,
+    so only the query is embedded on a normal lookup.
+    """
+    def closest(query: str, specializations: List[str]) -> Optional[str]:
+        embedding = embedding_provider()
+        candidates = np.asarray(embedding.embed_documents(specializations), dtype="float32")
+        wanted = np.asarray(embedding.embed_query(query), dtype="float32")
+        scores = candidates @ wanted / (np.linalg.norm(candidates, axis=1) * np.linalg.norm(wanted) + 1e-9)
+        best = int(np.argmax(scores))
+        return specializations[best] if scores[best] >= threshold else None
+    return closest
+
+
+def format_availability(results: List[tuple]) -> str:
+    if not results:
+        return "No nutritionist is available for that request."
+    return "\n".join(
+        f"{nutritionist.name} ({nutritionist.specialization}): {slot}"
+        for nutritionist, slot in results
+    )
@@ -0,0 +1,134 @@
+"""Approximate nearest neighbour index types for the knowledge base.
+
+The per-source indexes in the store stay exact (flat) so their vectors can
+be merged and re-used; the configured ANN type is only built over the merged
+knowledge base. Settings come from the environment:
+
+    FAISS_INDEX            flat (default), ivf_flat, ivf_sq8, ivf_pq, hnsw or hnsw_sq8
+    FAISS_NLIST            IVF cells; default 4 * sqrt(n)
+    FAISS_NPROBE           IVF cells scanned per query (default 16)
+    FAISS_PQ_M             PQ sub-quantizers; default dim / 8 (must divide dim)
+    FAISS_PQ_BITS          bits per PQ code (default 8)
+    FAISS_HNSW_M           HNSW graph degree (default 32)
+    FAISS_EF_CONSTRUCTION  HNSW build-time candidate list (default 200)
+    FAISS_EF_SEARCH        HNSW query-time candidate list (default 64)
+
+``bench/ann_indexes.py`` compares recall, latency and memory of the types.
+"""
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import faiss
+import numpy as np
+
+KINDS = ("flat", "ivf_flat", "ivf_sq8", "ivf_pq", "hnsw", "hnsw_sq8")
+
+
+@dataclass
+class AnnConfig:
+    kind: str = "flat"
+    nlist: Optional[int] = None
+    nprobe: int = 16
+    pq_m: Optional[int] = None
+    pq_bits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+
+    def __post_init__(self):
+        if self.kind not in KINDS:
+            raise ValueError(f"Unknown FAISS index type {self.kind!r}; expected one of {', '.join(KINDS)}")
+
+    @classmethod
+    def from_env(cls) -> "AnnConfig":
+        optional = lambda name: int(os.environ[name]) if os.getenv(name) else None
+        return cls(
+            kind=os.getenv("FAISS_INDEX", "flat"),
+            nlist=optional("FAISS_NLIST"),
+            nprobe=int(os.getenv("FAISS_NPROBE", "16")),
+            pq_m=optional("FAISS_PQ_M"),
+            pq_bits=int(os.getenv("FAISS_PQ_BITS", "8")),
+            hnsw_m=int(os.getenv("FAISS_HNSW_M", "32")),
+            ef_construction=int(os.getenv("FAISS_EF_CONSTRUCTION", "200")),
+            ef_search=int(os.getenv("FAISS_EF_SEARCH", "64")),
+        )
+
+    def build_signature(self) -> str:
+        """Settings that change the built index (search-time ones excluded)."""
+        settings = asdict(self)
+        settings.pop("nprobe")
+        settings.pop("ef_search")
+        return json.dumps(settings, sort_keys=True)
+
+
+def factory_string(config: AnnConfig, dim: int, count: int) -> str:
+    """The faiss.index_factory description for a config and corpus size."""
+    # IVF needs enough points per cell to train; small corpora stay exact.
+    nlist = config.nlist or max(1, int(4 * math.sqrt(count)))
+    nlist = min(nlist, max(1, count // 39))
+    if config.kind == "flat" or (config.kind.startswith("ivf") and nlist < 4):
+        return "Flat"
+    if config.kind == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if config.kind == "ivf_sq8":
+        return f"IVF{nlist},SQ8"
+    if config.kind == "ivf_pq":
+        m = config.pq_m or max(1, dim // 8)
+        if dim % m:
+            raise ValueError(f"FAISS_PQ_M={m} must divide the embedding dimension {dim}")
+        # Each PQ codebook of 2**bits centroids wants ~39 training points per centroid.
+        if count < 39 * 2 ** config.pq_bits:
+            return f"IVF{nlist},SQ8"
+        return f"IVF{nlist},PQ{m}x{config.pq_bits}"
+    if config.kind == "hnsw":
+        return f"HNSW{config.hnsw_m},Flat"
+    return f"HNSW{config.hnsw_m},SQ8"
+
+
+def build_index(vectors: np.ndarray, config: AnnConfig, metric: int = faiss.METRIC_L2) -> faiss.Index:
+    """Train and fill an index of the configured type over ``vectors``."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    count, dim = vectors.shape
+    index = faiss.index_factory(dim, factory_string(config, dim, count), metric)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        hnsw.efConstruction = config.ef_construction
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    ivf = _ivf(index)
+    if ivf is not None:
+        # Lets callers (e.g. MMR) reconstruct vectors by id.
+        ivf.make_direct_map()
+    apply_search_params(index, config)
+    return index
+
+
+def _ivf(index: faiss.Index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _hnsw(index: faiss.Index):
+    index = faiss.downcast_index(index)
+    return index.hnsw if hasattr(index, "hnsw") else None
+
+
+def apply_search_params(index: faiss.Index, config: AnnConfig) -> None:
+    """Set nprobe / efSearch; they are query-time knobs and need no rebuild."""
+    ivf = _ivf(index)
+    if ivf is not None:
+        ivf.nprobe = config.nprobe
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        hnsw.efSearch = config.ef_search
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Size of the serialized index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,141 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed cache in front of a document embedding model.
+
+    Every document text is keyed by ``sha256(model + text)``. Vectors are
+    kept in a flat float32 file (``<model>.f32``) with the matching keys, one
+    per line and in row order, in ``<model>.keys`` (after a ``dim <n>``
+    header line); both files are only ever appended to. Texts that are not
+    in the cache are de-duplicated and sent to the underlying model in
+    batches of ``batch_size``, at most ``concurrency`` batches at a time,
+    retrying failed batches with exponential backoff.
+
+    Query embeddings are not cached: they use a different task type and are
+    already covered by the response cache.
+
+    Args:
+        embedding: The underlying embedding model.
+        cache_dir: Directory holding the cache files.
+        model_name: Model name, part of the cache key and file name.
+        batch_size: Number of texts per request to the model.
+        concurrency: Maximum number of requests in flight.
+        max_retries: Attempts per batch before giving up.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        cache_dir: str,
+        model_name: str,
+        batch_size: int = 64,
+        concurrency: int = 4,
+        max_retries: int = 5,
+    ):
+        self.embedding = embedding
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.vectors_path = Path(cache_dir) / f"{slug}.f32"
+        self.keys_path = Path(cache_dir) / f"{slug}.keys"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (block, row); each append adds a block so nothing is copied.
+        self._rows: Dict[str, Tuple[int, int]] = {}
+        self._blocks: List[np.ndarray] = []
+        self._load()
+
+    def _load(self) -> None:
+        if not (self.keys_path.exists() and self.vectors_path.exists()):
+            return
+        header, *keys = self.keys_path.read_text().split("\n")
+        keys = [key for key in keys if key]
+        dim = int(header.split()[1])
+        vectors = np.fromfile(self.vectors_path, dtype="float32")
+        # A crash mid-append can leave keys without vectors (or a partial
+        # row); only trust rows that are complete in both files.
+        count = min(len(keys), vectors.size // dim)
+        if count != len(keys) or count * dim != vectors.size:
+            # Truncate both files so later appends stay aligned.
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(count * dim * 4)
+            self.keys_path.write_text("".join(f"{line}\n" for line in [header] + keys[:count]))
+        self._blocks = [vectors[: count * dim].reshape(count, dim)]
+        self._rows = {key: (0, row) for row, key in enumerate(keys[:count])}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        with self._lock:
+            self._blocks.append(vectors)
+            block = len(self._blocks) - 1
+            for row, key in enumerate(keys):
+                self._rows[key] = (block, row)
+            self.vectors_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.vectors_path, "ab") as f:
+                vectors.tofile(f)
+            new_file = not self.keys_path.exists()
+            with open(self.keys_path, "a") as f:
+                if new_file:
+                    f.write(f"dim {vectors.shape[1]}\n")
+                f.write("".join(f"{key}\n" for key in keys))
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries):
+            try:
+                return self.embedding.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                delay = min(30.0, 2 ** attempt) + random.random()
+                print(f"Embedding batch failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+
+        # De-duplicate misses so repeated chunks are embedded once.
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in self._rows and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [
+                missing_keys[start:start + self.batch_size]
+                for start in range(0, len(missing_keys), self.batch_size)
+            ]
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                results = pool.map(lambda batch: self._embed_batch([missing[key] for key in batch]), batches)
+                for batch, vectors in zip(batches, results):
+                    self._append(batch, np.asarray(vectors, dtype="float32"))
+
+        return [self._vector(key).tolist() for key in keys]
+
+    def _vector(self, key: str) -> np.ndarray:
+        block, row = self._rows[key]
+        return self._blocks[block][row]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embedding.aembed_query(text)
@@ -0,0 +1,242 @@
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from executor import run_tool_call
+from shared.telemetry import span
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or should "
+    "than that the this to what when which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and number tokens; '1,500' and '1500' both become '1500'."""
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text.lower())
+    return [token for token in re.findall(r"\w+", text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of document tokens.
+
+    Args:
+        documents: Documents to index; results refer to them by position.
+        tokens: Already tokenized documents, to avoid tokenizing twice.
+        k1: Term frequency saturation.
+        b: Document length normalisation.
+    """
+
+    def __init__(self, documents: Sequence[Document], k1: float = 1.5, b: float = 0.75, tokens: Optional[Sequence[List[str]]] = None):
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = np.zeros(len(documents), dtype="float32")
+        for position, document in enumerate(documents):
+            counts = Counter(tokens[position] if tokens is not None else tokenize(document.page_content))
+            lengths[position] = sum(counts.values())
+            for term, count in counts.items():
+                postings[term].append((position, count))
+        self.size = len(documents)
+        self.average_length = float(lengths.mean()) if self.size else 0.0
+        # Length normalisation is per document, so it is computed once here.
+        self._norm = k1 * (1 - b + b * lengths / (self.average_length or 1.0))
+        self._postings = {
+            term: (
+                np.array([position for position, _ in entries], dtype="int64"),
+                np.array([count for _, count in entries], dtype="float32"),
+                math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5)),
+            )
+            for term, entries in postings.items()
+        }
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (position, score) pairs with a positive score."""
+        scores = np.zeros(self.size, dtype="float32")
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            positions, tf, idf = self._postings[term]
+            scores[positions] += idf * tf * (self.k1 + 1) / (tf + self._norm[positions])
+        candidates = np.flatnonzero(scores)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(position), float(scores[position])) for position in ranked]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Any]], weights: Optional[Sequence[float]] = None, k: int = 60) -> List[Tuple[Any, float]]:
+    """Fuse ranked lists: each item scores sum(weight / (k + rank)) over the lists."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[Any, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+def lexical_rerank(query: str, candidates: List[Tuple[int, float]], tokens: Sequence[List[str]]) -> List[Tuple[int, float]]:
+    """Re-order fused (position, score) candidates by how completely they cover the query.
+
+    A cheap stand-in for a cross-encoder: the fused score is scaled up by the
+    share of query terms present in the chunk (numbers count double, since
+    an exact number is rarely paraphrased) and by an exact phrase match.
+    ``tokens`` holds the tokenized text of every document by position.
+    """
+    query_tokens = tokenize(query)
+    terms = set(query_tokens)
+    if not terms:
+        return candidates
+    weight = {term: 2.0 if term.isdigit() else 1.0 for term in terms}
+    total = sum(weight.values())
+    phrase = " ".join(query_tokens)
+    reranked = []
+    for position, score in candidates:
+        present = set(tokens[position])
+        coverage = sum(weight[term] for term in terms if term in present) / total
+        bonus = 0.5 if len(terms) > 1 and coverage == 1.0 and phrase in " ".join(tokens[position]) else 0.0
+        reranked.append((position, score * (1.0 + coverage + bonus)))
+    return sorted(reranked, key=lambda pair: pair[1], reverse=True)
+
+
+class HybridSearcher:
+    """Dense FAISS search and BM25 fused with reciprocal rank fusion.
+
+    Args:
+        vectorstore: The FAISS store; BM25 is built over its docstore.
+        k: Number of documents returned.
+        fetch_k: Candidates taken from each of the dense and BM25 lists.
+        rrf_k: The RRF smoothing constant.
+        bm25_weight: Weight of the BM25 list in the fusion; 0 gives dense only.
+        score_threshold: Drop dense hits below this relevance score (0-1).
+        mmr: Diversify the final list with maximal marginal relevance.
+        mmr_lambda: MMR trade-off; 1 is pure relevance, 0 pure diversity.
+        rerank: Apply ``lexical_rerank`` to the fused candidates.
+    """
+
+    def __init__(
+        self,
+        vectorstore: FAISS,
+        k: int = 4,
+        fetch_k: int = 20,
+        rrf_k: int = 60,
+        bm25_weight: float = 1.0,
+        score_threshold: float = 0.0,
+        mmr: bool = False,
+        mmr_lambda: float = 0.5,
+        rerank: bool = True,
+    ):
+        self.vectorstore = vectorstore
+        self.k = k
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        self.bm25_weight = bm25_weight
+        self.score_threshold = score_threshold
+        self.mmr = mmr
+        self.mmr_lambda = mmr_lambda
+        self.rerank = rerank
+        # Everything is addressed by FAISS position, so dense and BM25 hits line up.
+        self._documents = [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            for position in range(vectorstore.index.ntotal)
+        ]
+        self._tokens = [tokenize(document.page_content) for document in self._documents]
+        self.bm25 = BM25Index(self._documents, tokens=self._tokens) if bm25_weight > 0 else None
+        self._relevance = vectorstore._select_relevance_score_fn()
+
+    @classmethod
+    def from_env(cls, vectorstore: FAISS) -> "HybridSearcher":
+        return cls(
+            vectorstore,
+            k=int(os.getenv("RETRIEVER_K", "4")),
+            fetch_k=int(os.getenv("RETRIEVER_FETCH_K", "20")),
+            rrf_k=int(os.getenv("RETRIEVER_RRF_K", "60")),
+            bm25_weight=float(os.getenv("RETRIEVER_BM25_WEIGHT", "1.0")),
+            score_threshold=float(os.getenv("RETRIEVER_SCORE_THRESHOLD", "0")),
+            mmr=os.getenv("RETRIEVER_MMR", "false").lower() in ("1", "true", "yes"),
+            mmr_lambda=float(os.getenv("RETRIEVER_MMR_LAMBDA", "0.5")),
+            rerank=os.getenv("RETRIEVER_RERANK", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def _dense(self, query_vector: List[float]) -> List[int]:
+        # Search the FAISS index directly so hits come back as positions.
+        vector = np.asarray([query_vector], dtype="float32")
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vector)
+        distances, positions = self.vectorstore.index.search(vector, self.fetch_k)
+        return [
+            int(position)
+            for position, distance in zip(positions[0], distances[0])
+            if position != -1 and not (self.score_threshold and self._relevance(float(distance)) < self.score_threshold)
+        ]
+
+    def _mmr(self, candidates: List[Tuple[int, float]]) -> List[int]:
+        """Pick ``k`` candidates trading fused relevance against similarity to those already picked."""
+        positions = [position for position, _ in candidates]
+        relevance = np.array([score for _, score in candidates])
+        relevance /= relevance.max() or 1.0
+        vectors = np.vstack([self.vectorstore.index.reconstruct(position) for position in positions])
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
+        chosen: List[int] = []
+        remaining = list(range(len(positions)))
+        while remaining and len(chosen) < self.k:
+            if chosen:
+                redundancy = (vectors[remaining] @ vectors[chosen].T).max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining))
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            chosen.append(remaining.pop(int(np.argmax(scores))))
+        return [positions[i] for i in chosen]
+
+    def search(self, query: str, query_vector: Optional[List[float]] = None) -> List[Document]:
+        if query_vector is None:
+            with span("search", "embed_query"):
+                query_vector = self.vectorstore.embedding_function.embed_query(query)
+        with span("search", "dense"):
+            rankings = [self._dense(query_vector)]
+        weights = [1.0]
+        if self.bm25 is not None:
+            with span("search", "bm25"):
+                rankings.append([position for position, _ in self.bm25.search(query, self.fetch_k)])
+            weights.append(self.bm25_weight)
+        candidates = reciprocal_rank_fusion(rankings, weights, self.rrf_k)
+        if self.rerank:
+            candidates = lexical_rerank(query, candidates, self._tokens)
+        if self.mmr and candidates:
+            positions = self._mmr(candidates)
+        else:
+            positions = [position for position, _ in candidates[: self.k]]
+        return [self._documents[position] for position in positions]
+
+    def as_retriever(
+        self, search_kwargs: Optional[dict] = None, query_vector: Optional[List[float]] = None
+    ) -> "HybridRetriever":
+        return HybridRetriever(searcher=self, query_vector=query_vector)
+
+
+class HybridRetriever(BaseRetriever):
+    """LangChain retriever wrapper around a ``HybridSearcher``.
+
+    ``query_vector`` is an embedding of the query made by the caller (e.g.
+    for a cache lookup), used instead of embedding it again.
+    """
+    searcher: Any
+    query_vector: Optional[List[float]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.searcher.search(query, self.query_vector)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        # Embedding the query and the FAISS and BM25 searches all block. This
+        # runs as the healthline_search tool, so use the tool pool: a search
+        # abandoned by the tool timeout must not hold a shared blocking thread.
+        return await run_tool_call(self.searcher.search, query, self.query_vector)
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import TextSplitter
+
+from rag.ann import AnnConfig, apply_search_params, build_index
+
+MMAP_FLAGS = tuple(flag for flag in (getattr(faiss, "IO_FLAG_MMAP_IFC", None), faiss.IO_FLAG_MMAP) if flag is not None)
+
+
+@dataclass
+class IndexSource:
+    """A document source that is embedded into its own FAISS index.
+
+    Args:
+        name: Stable identifier, used as the directory name in the store.
+        loader: Factory returning the LangChain loader for the source.
+        splitter: Text splitter applied to the loaded documents.
+        local: True when loading the source is cheap (a file on disk). Local
+            sources are re-hashed on every start; remote sources are only
+            fetched again when the store is rebuilt (see build_index.py).
+    """
+    name: str
+    loader: Callable[[], BaseLoader]
+    splitter: TextSplitter
+    local: bool = False
+
+
+def splitter_signature(splitter: TextSplitter) -> str:
+    """Describe the splitter settings that affect the produced chunks."""
+    return json.dumps({
+        "cls": type(splitter).__name__,
+        "chunk_size": splitter._chunk_size,
+        "chunk_overlap": splitter._chunk_overlap,
+    }, sort_keys=True)
+
+
+def content_hash(documents: List[Document]) -> str:
+    """Hash the text and metadata of the raw (unsplit) documents."""
+    digest = hashlib.sha256()
+    for doc in documents:
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def index_key(documents_hash: str, splitter: TextSplitter, model_name: str) -> str:
+    """Key an index by source content, splitter settings and embedding model."""
+    raw = "\n".join([documents_hash, splitter_signature(splitter), model_name])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class IndexStore:
+    """On-disk store of FAISS indexes, one directory per source.
+
+    Layout::
+
+        <root>/<source name>/<key>/index.faiss
+        <root>/<source name>/<key>/index.pkl
+        <root>/<source name>/current.json
+
+    ``current.json`` records the key that was last built for the source, so a
+    process start only has to read it and memory-map the matching index.
+
+    Source indexes are always exact. ``load_merged`` keeps the index over
+    several sources under ``<root>/_merged/<key>``, keyed by the source keys
+    and the ANN build settings, so it is only rebuilt (and, with a non-flat
+    ``ann`` config, retrained) when a source changes. Indexes are loaded as
+    read-only memory maps, so every process serving the same store shares
+    one copy of the vectors through the page cache.
+    """
+
+    def __init__(self, root: str, embedding: Embeddings, model_name: str, ann: Optional[AnnConfig] = None):
+        self.root = Path(root)
+        self.embedding = embedding
+        self.model_name = model_name
+        self.ann = ann or AnnConfig()
+
+    def _source_dir(self, source: IndexSource) -> Path:
+        return self.root / source.name
+
+    def _read_current(self, source: IndexSource) -> Optional[dict]:
+        current = self._source_dir(source) / "current.json"
+        if not current.exists():
+            return None
+        with open(current) as f:
+            return json.load(f)
+
+    def _write_current(self, source: IndexSource, record: dict) -> None:
+        current = self._source_dir(source) / "current.json"
+        tmp = current.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp, current)
+
+    def _load(self, path: Path, mmap: bool = True) -> FAISS:
+        """Load a saved index, memory-mapping the vectors when possible."""
+        index = None
+        # IO_FLAG_MMAP only maps IVF lists; IO_FLAG_MMAP_IFC (faiss >= 1.10)
+        # also maps flat and HNSW codes. Not every index type supports either,
+        # so fall back until a full read.
+        for flags in (MMAP_FLAGS if mmap else ()):
+            try:
+                index = faiss.read_index(str(path / "index.faiss"), flags | faiss.IO_FLAG_READ_ONLY)
+                break
+            except RuntimeError:
+                continue
+        if index is None:
+            index = faiss.read_index(str(path / "index.faiss"))
+        with open(path / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embedding, index, docstore, index_to_docstore_id)
+
+    def _build(self, source: IndexSource, documents: List[Document], key: str, documents_hash: str) -> FAISS:
+        chunks = source.splitter.split_documents(documents)
+        vector = FAISS.from_documents(chunks, self.embedding)
+
+        source_dir = self._source_dir(source)
+        vector.save_local(str(source_dir / key))
+        self._write_current(source, {
+            "key": key,
+            "content_hash": documents_hash,
+            "splitter": splitter_signature(source.splitter),
+            "model": self.model_name,
+            "chunks": len(chunks),
+            "built_at": time.time(),
+        })
+        # Drop indexes built for older versions of the source.
+        for entry in source_dir.iterdir():
+            if entry.is_dir() and entry.name != key:
+                shutil.rmtree(entry, ignore_errors=True)
+        return vector
+
+    def is_current(self, source: IndexSource) -> bool:
+        """True if a stored index matches the source's splitter and model."""
+        record = self._read_current(source)
+        return (
+            record is not None
+            and record["splitter"] == splitter_signature(source.splitter)
+            and record["model"] == self.model_name
+            and (self._source_dir(source) / record["key"]).exists()
+        )
+
+    def load_or_build(self, source: IndexSource, refresh: bool = False, mmap: bool = True) -> FAISS:
+        """Return the FAISS index for a source, embedding it only if needed.
+
+        Local sources are loaded and hashed every time, which is cheap. Remote
+        sources are served from the stored index without being fetched unless
+        ``refresh`` is set or nothing usable has been stored yet.
+
+        Args:
+            source: The source to load.
+            refresh: Fetch the source again and compare its content hash.
+            mmap: Memory-map the stored vectors instead of reading them.
+
+        Returns:
+            The FAISS vector store for the source.
+        """
+        record = self._read_current(source)
+        if not refresh and not source.local and self.is_current(source):
+            return self._load(self._source_dir(source) / record["key"], mmap=mmap)
+
+        documents = source.loader().load()
+        documents_hash = content_hash(documents)
+        key = index_key(documents_hash, source.splitter, self.model_name)
+        if record and record["key"] == key and (self._source_dir(source) / key).exists():
+            return self._load(self._source_dir(source) / key, mmap=mmap)
+        return self._build(source, documents, key, documents_hash)
+
+    def _merged_key(self, sources: List[IndexSource]) -> Optional[str]:
+        records = [self._read_current(source) for source in sources]
+        if any(record is None for record in records):
+            return None
+        raw = "\n".join([record["key"] for record in records] + [self.ann.build_signature()])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def is_merged_current(self, sources: List[IndexSource]) -> bool:
+        """True if ``load_merged`` would load a stored index without merging."""
+        if len(sources) == 1 and self.ann.kind == "flat":
+            return self.is_current(sources[0])
+        key = self._merged_key(sources)
+        return (
+            key is not None
+            and all(self.is_current(source) for source in sources)
+            and (self.root / "_merged" / key).exists()
+        )
+
+    def load_merged(self, sources: List[IndexSource], refresh: bool = False) -> FAISS:
+        """Load several sources as a single vector store.
+
+        Only sources whose content changed are re-embedded; the others are
+        read back from disk. The merged index is saved too, so later starts
+        memory-map it instead of merging again.
+        """
+        if len(sources) == 1 and self.ann.kind == "flat":
+            return self.load_or_build(sources[0], refresh=refresh)
+        stores = [self.load_or_build(source, refresh=refresh) for source in sources]
+        key = self._merged_key(sources)
+        merged_dir = self.root / "_merged"
+        path = merged_dir / key
+        if not path.exists():
+            # The source indexes are read-only mmaps; merge into a copy of the first.
+            merged = stores[0]
+            merged.index = faiss.clone_index(merged.index)
+            for store in stores[1:]:
+                merged.merge_from(store)
+            if self.ann.kind != "flat":
+                vectors = merged.index.reconstruct_n(0, merged.index.ntotal)
+                metric = faiss.METRIC_INNER_PRODUCT if merged.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT else faiss.METRIC_L2
+                merged.index = build_index(vectors, self.ann, metric)
+            merged.save_local(str(path))
+            for entry in merged_dir.iterdir():
+                if entry.is_dir() and entry.name != key:
+                    shutil.rmtree(entry, ignore_errors=True)
+
+        # Search parameters (nprobe, efSearch) are not saved with the index.
+        vector = self._load(path)
+        apply_search_params(vector.index, self.ann)
+        return vector
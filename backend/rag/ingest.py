@@ -0,0 +1,330 @@
+"""Offline ingestion of the knowledge base sources.
+
+Sources are listed in a JSON manifest (``knowledge_sources.json``)::
+
+    {"sources": [
+        {"name": "healthline-1500-calorie-diet",
+         "url": "https://www.healthline.com/nutrition/1500-calorie-diet",
+         "path": "knowledge/healthline-1500-calorie-diet.html"},
+        {"name": "clinic-handout", "path": "knowledge/handout.pdf",
+         "chunk_size": 800, "chunk_overlap": 100}
+    ]}
+
+``url`` is fetched over HTTP; ``path`` is a local HTML, text or PDF file and
+is the only thing read when ingesting offline. Each source is fetched,
+parsed and chunked concurrently, and its chunks are written to
+``<ingest dir>/<name>/chunks.jsonl`` next to a ``source.json`` that holds the
+ETag, Last-Modified and content hash of what was fetched. Remote sources are
+fetched with a conditional request, so an unchanged page costs a 304.
+
+Duplicate chunks are dropped within a source here, and across sources (first
+source in manifest order wins) by ``knowledge_base_sources`` when the chunks
+are handed to the index store, which only re-embeds sources whose kept
+chunks changed.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from rag.index_store import IndexSource
+
+USER_AGENT = os.getenv("USER_AGENT", "diet-assistant-ingest/1.0")
+
+
+@dataclass
+class SourceSpec:
+    name: str
+    url: Optional[str] = None
+    path: Optional[str] = None
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+
+    @property
+    def splitter(self) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+
+@dataclass
+class IngestResult:
+    name: str
+    status: str  # "changed", "unchanged" or "failed"
+    chunks: int = 0
+    error: Optional[str] = None
+
+
+def load_manifest(path: str) -> List[SourceSpec]:
+    base = Path(path).parent
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)["sources"]
+    specs = []
+    for entry in entries:
+        if entry.get("path") and not os.path.isabs(entry["path"]):
+            # Paths in the manifest are relative to the manifest itself.
+            entry = {**entry, "path": str(base / entry["path"])}
+        specs.append(SourceSpec(**entry))
+    return specs
+
+
+def chunk_hash(text: str) -> str:
+    """Hash a chunk after normalising case and whitespace."""
+    return hashlib.sha256(re.sub(r"\s+", " ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def html_to_text(html: str) -> tuple:
+    """Return (title, text) of an HTML page without scripts and navigation."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg"]):
+        tag.decompose()
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    text = soup.get_text("\n")
+    return title, re.sub(r"\n\s*\n+", "\n\n", text).strip()
+
+
+def pdf_to_text(data: bytes) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("PDF sources need pypdf; install it with `pip install pypdf`.")
+    import io
+
+    reader = PdfReader(io.BytesIO(data))
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def parse(data: bytes, kind: str) -> tuple:
+    """Return (title, text) for raw source bytes of the given kind."""
+    if kind == "pdf":
+        return "", pdf_to_text(data)
+    text = data.decode("utf-8", errors="replace")
+    if kind == "html":
+        return html_to_text(text)
+    return "", text
+
+
+def source_kind(location: str, content_type: str = "") -> str:
+    location = location.lower().split("?")[0]
+    if location.endswith(".pdf") or "pdf" in content_type:
+        return "pdf"
+    if location.endswith((".txt", ".md")) or content_type.startswith("text/plain"):
+        return "text"
+    return "html"
+
+
+class Ingestor:
+    """Fetches, parses and chunks manifest sources into the ingest directory.
+
+    Args:
+        root: Directory for per-source chunk files and manifests.
+        offline: Read only local ``path`` files; never touch the network.
+        save_snapshots: After fetching a URL, write the raw page to the
+            source's ``path`` so later offline runs can use it.
+        concurrency: Sources processed at a time.
+        timeout: HTTP timeout in seconds.
+    """
+
+    def __init__(self, root: str, offline: bool = False, save_snapshots: bool = False, concurrency: int = 8, timeout: float = 30.0):
+        self.root = Path(root)
+        self.offline = offline
+        self.save_snapshots = save_snapshots
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def _dir(self, name: str) -> Path:
+        return self.root / name
+
+    def read_record(self, name: str) -> Optional[dict]:
+        path = self._dir(name) / "source.json"
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def has_chunks(self, name: str) -> bool:
+        return (self._dir(name) / "chunks.jsonl").exists()
+
+    def read_chunks(self, name: str) -> List[Document]:
+        documents = []
+        with open(self._dir(name) / "chunks.jsonl", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return documents
+
+    def _fetch(self, spec: SourceSpec, record: Optional[dict]) -> Optional[dict]:
+        """Return {"data", "kind", "etag", "last_modified", "location"}, or None if unchanged."""
+        if self.offline or not spec.url:
+            if not spec.path:
+                raise ValueError("offline ingestion needs a local path for this source")
+            if not os.path.exists(spec.path):
+                raise FileNotFoundError(f"{spec.path} is missing; fetch it once with --save-snapshots")
+            with open(spec.path, "rb") as f:
+                return {"data": f.read(), "kind": source_kind(spec.path), "etag": None,
+                        "last_modified": None, "location": spec.path}
+
+        headers = {"User-Agent": USER_AGENT}
+        if record and self.has_chunks(spec.name) and record.get("url") == spec.url:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+        request = urllib.request.Request(spec.url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+                content_type = response.headers.get("Content-Type", "")
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+        if self.save_snapshots and spec.path:
+            Path(spec.path).parent.mkdir(parents=True, exist_ok=True)
+            Path(spec.path).write_bytes(data)
+        return {"data": data, "kind": source_kind(spec.url, content_type), "etag": etag,
+                "last_modified": last_modified, "location": spec.url}
+
+    def _write(self, spec: SourceSpec, chunks: List[Document], record: dict) -> None:
+        directory = self._dir(spec.name)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / "chunks.jsonl.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps({"text": chunk.page_content, "metadata": chunk.metadata}) + "\n")
+        os.replace(tmp, directory / "chunks.jsonl")
+        tmp = directory / "source.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp, directory / "source.json")
+
+    def ingest_source(self, spec: SourceSpec) -> IngestResult:
+        record = self.read_record(spec.name)
+        try:
+            fetched = self._fetch(spec, record)
+        except Exception as e:
+            return IngestResult(spec.name, "failed", error=str(e))
+        if fetched is None:
+            return IngestResult(spec.name, "unchanged", record.get("chunks", 0))
+
+        content = hashlib.sha256(fetched["data"]).hexdigest()
+        splitter_settings = {"chunk_size": spec.chunk_size, "chunk_overlap": spec.chunk_overlap}
+        if (
+            record and self.has_chunks(spec.name)
+            and record.get("content_hash") == content
+            and record.get("splitter") == splitter_settings
+        ):
+            return IngestResult(spec.name, "unchanged", record.get("chunks", 0))
+
+        try:
+            title, text = parse(fetched["data"], fetched["kind"])
+        except Exception as e:
+            return IngestResult(spec.name, "failed", error=f"could not parse: {e}")
+        metadata = {"source": fetched["location"], "source_name": spec.name}
+        if title:
+            metadata["title"] = title
+
+        chunks, seen = [], set()
+        for chunk in spec.splitter.split_documents([Document(page_content=text, metadata=metadata)]):
+            key = chunk_hash(chunk.page_content)
+            if key in seen:
+                continue
+            seen.add(key)
+            chunk.metadata = {**chunk.metadata, "chunk_hash": key}
+            chunks.append(chunk)
+
+        self._write(spec, chunks, {
+            "name": spec.name,
+            "url": spec.url,
+            "path": spec.path,
+            "etag": fetched["etag"],
+            "last_modified": fetched["last_modified"],
+            "content_hash": content,
+            "splitter": splitter_settings,
+            "chunks": len(chunks),
+            "fetched_at": time.time(),
+        })
+        return IngestResult(spec.name, "changed", len(chunks))
+
+    def ingest(self, specs: List[SourceSpec]) -> List[IngestResult]:
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(self.ingest_source, specs))
+
+
+class ChunkLoader(BaseLoader):
+    """Loads the kept (cross-source de-duplicated) chunks of one source."""
+
+    def __init__(self, plan: "DedupPlan", name: str):
+        self.plan = plan
+        self.name = name
+
+    def load(self) -> List[Document]:
+        return self.plan.chunks(self.name)
+
+    def lazy_load(self):
+        yield from self.load()
+
+
+class DedupPlan:
+    """Assigns each distinct chunk to the first source (in manifest order) that has it.
+
+    Sources that were never ingested are ingested on first use.
+    """
+
+    def __init__(self, ingestor: Ingestor, specs: List[SourceSpec]):
+        self.ingestor = ingestor
+        self.specs = specs
+        self._kept: Optional[Dict[str, List[Document]]] = None
+
+    def _plan(self) -> Dict[str, List[Document]]:
+        if self._kept is None:
+            missing = [spec for spec in self.specs if not self.ingestor.has_chunks(spec.name)]
+            for result in self.ingestor.ingest(missing):
+                if result.status == "failed":
+                    print(f"Ingesting {result.name} failed: {result.error}")
+            kept, seen = {}, set()
+            for spec in self.specs:
+                kept[spec.name] = []
+                if not self.ingestor.has_chunks(spec.name):
+                    continue
+                for chunk in self.ingestor.read_chunks(spec.name):
+                    key = chunk.metadata["chunk_hash"]
+                    if key not in seen:
+                        seen.add(key)
+                        kept[spec.name].append(chunk)
+            self._kept = kept
+        return self._kept
+
+    def chunks(self, name: str) -> List[Document]:
+        return self._plan()[name]
+
+    def available(self) -> List[SourceSpec]:
+        return [spec for spec in self.specs if self._plan()[spec.name]]
+
+
+def knowledge_base_sources(ingestor: Ingestor, specs: List[SourceSpec]) -> List[IndexSource]:
+    """Index store sources for every ingested manifest entry with chunks to index."""
+    plan = DedupPlan(ingestor, specs)
+    return [
+        IndexSource(
+            name=spec.name,
+            loader=lambda name=spec.name: ChunkLoader(plan, name),
+            splitter=spec.splitter,
+            # Chunk files are on disk, so hashing them at start-up is cheap.
+            local=True,
+        )
+        for spec in plan.available()
+    ]
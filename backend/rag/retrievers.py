@@ -0,0 +1,53 @@
+from typing import Any, List
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from executor import run_blocking
+from rag.hybrid import HybridSearcher
+
+
+class LazyRetriever(BaseRetriever):
+    """Retriever over a vector store that is only loaded on first query.
+
+    ``resource`` is a ``LazyResource`` whose value is a LangChain vector
+    store; ``search_kwargs`` are passed to ``as_retriever``. An optional
+    ``ResponseCache`` short-circuits repeated (or near-duplicate) queries;
+    on a miss, a ``HybridSearcher`` searches with the embedding the cache
+    lookup already made.
+    """
+    resource: Any
+    search_kwargs: dict = {}
+    cache: Any = None
+
+    def _retriever(self, store: Any, vector: Any) -> BaseRetriever:
+        if vector is not None and isinstance(store, HybridSearcher):
+            return store.as_retriever(self.search_kwargs, query_vector=vector)
+        return store.as_retriever(search_kwargs=self.search_kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        vector = None
+        if self.cache is not None:
+            found, documents, vector = self.cache.get(query)
+            if found:
+                return documents
+        retriever = self._retriever(self.resource.get(), vector)
+        documents = retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        if self.cache is not None:
+            self.cache.put(query, documents, vector)
+        return documents
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        vector = None
+        if self.cache is not None:
+            found, documents, vector = await self.cache.aget(query)
+            if found:
+                return documents
+        # Loading may hit the disk or embed a changed source, so keep it off the loop.
+        store = await run_blocking(self.resource.get)
+        retriever = self._retriever(store, vector)
+        documents = await retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        if self.cache is not None:
+            self.cache.put(query, documents, vector)
+        return documents
@@ -0,0 +1,61 @@
+import os
+
+from typing import List
+
+from langchain_community.document_loaders import TextLoader
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_text_splitters import CharacterTextSplitter
+
+from rag.ann import AnnConfig
+from rag.embedding_cache import CachedEmbeddings
+from rag.index_store import IndexSource, IndexStore
+from rag.ingest import Ingestor, knowledge_base_sources, load_manifest
+
+EMBEDDING_MODEL = "models/embedding-001"
+INDEX_STORE_DIR = os.getenv("INDEX_STORE_DIR", "index_store")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(INDEX_STORE_DIR, "embeddings"))
+
+# Nutritionist directory used by rag_query_tool
+NUTRITIONISTS = IndexSource(
+    name="nutritionists",
+    loader=lambda: TextLoader("nutritionists.txt"),
+    splitter=CharacterTextSplitter(chunk_size=1500, chunk_overlap=200),
+    local=True,
+)
+
+# Web pages and local dumps behind retriever_tool; see rag/ingest.py
+KNOWLEDGE_MANIFEST = os.getenv("KNOWLEDGE_MANIFEST", "knowledge_sources.json")
+INGEST_DIR = os.getenv("INGEST_DIR", os.path.join(INDEX_STORE_DIR, "ingest"))
+
+
+def get_ingestor(offline: bool = False, save_snapshots: bool = False) -> Ingestor:
+    return Ingestor(
+        INGEST_DIR,
+        offline=offline or os.getenv("INGEST_OFFLINE", "").lower() in ("1", "true", "yes"),
+        save_snapshots=save_snapshots,
+        concurrency=int(os.getenv("INGEST_CONCURRENCY", "8")),
+    )
+
+
+def knowledge_base(offline: bool = False) -> List[IndexSource]:
+    """Index sources for the knowledge base manifest, ingesting missing ones."""
+    sources = knowledge_base_sources(get_ingestor(offline), load_manifest(KNOWLEDGE_MANIFEST))
+    if not sources:
+        raise RuntimeError(f"No knowledge base source could be ingested from {KNOWLEDGE_MANIFEST}.")
+    return sources
+
+
+def embedding_client() -> GoogleGenerativeAIEmbeddings:
+    return GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+
+
+def get_index_store() -> IndexStore:
+    # Chunks already embedded by an earlier build are served from the cache.
+    embedding = CachedEmbeddings(
+        embedding_client(),
+        EMBEDDING_CACHE_DIR,
+        EMBEDDING_MODEL,
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+        concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "4")),
+    )
+    return IndexStore(INDEX_STORE_DIR, embedding, EMBEDDING_MODEL, AnnConfig.from_env())
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class LazyResource:
+    """Holds an expensive object that is built on first use.
+
+    The factory runs at most once at a time. A failed build is recorded and
+    retried on the next ``get()``, so a transient error (e.g. a slow remote
+    page) does not leave the process permanently degraded.
+
+    Args:
+        name: Subsystem name reported by the readiness probe.
+        factory: Zero-argument callable that builds the resource.
+        required: Whether the service is considered ready without it.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool = True):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.status = "cold"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def get(self) -> Any:
+        """Return the resource, building it first if needed."""
+        if self.status == "ready":
+            return self._value
+        with self._lock:
+            if self.status == "ready":
+                return self._value
+            self.status = "warming"
+            start = time.perf_counter()
+            try:
+                self._value = self.factory()
+            except Exception as e:
+                self.status = "failed"
+                self.error = str(e)
+                raise
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self.status = "ready"
+            self.error = None
+            return self._value
+
+    async def warm(self) -> None:
+        """Build the resource on a worker thread without raising."""
+        try:
+            await asyncio.to_thread(self.get)
+        except Exception as e:
+            print(f"Error while warming {self.name}:", e)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+async def warm_up(resources: Iterable[LazyResource]) -> None:
+    """Warm all resources concurrently."""
+    await asyncio.gather(*(resource.warm() for resource in resources))
+
+
+def readiness(resources: Iterable[LazyResource]) -> Dict[str, Any]:
+    """Summarise which subsystems are warm."""
+    resources = list(resources)
+    return {
+        "ready": all(resource.ready for resource in resources if resource.required),
+        "subsystems": {resource.name: resource.describe() for resource in resources},
+    }
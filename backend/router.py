@@ -0,0 +1,283 @@
+"""Deterministic fast path in front of the assistant model.
+
+Some requests carry everything a tool needs, such as "I'm a 30 year old
+woman, 65 kg, 168 cm, moderately active, what are my daily calories?" or
+"cancel appointment 42". For these the router runs the tool itself and
+answers from a template. That saves the model call that picks the tool
+and the one that phrases its result. Anything incomplete or ambiguous
+goes to the assistant unchanged. Set ROUTER_ENABLED=false to send every
+turn to the model.
+
+A fast-path turn is written to the thread as the model would have written
+it: an AI message with the tool call, the tool result, then the reply. Later
+turns and the context summary therefore still see it.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.graph import END
+
+from executor import run_blocking
+
+NUMBER = r"(\d+(?:\.\d+)?)"
+
+
+def _one(patterns: Dict[str, str], text: str) -> Optional[str]:
+    """The single key whose pattern matches ``text``; None if none or several do."""
+    found = {key for key, pattern in patterns.items() if re.search(pattern, text)}
+    return found.pop() if len(found) == 1 else None
+
+
+GENDERS = {
+    "male": r"\b(male|man|boy|guy|he|him|his)\b",
+    "female": r"\b(female|woman|girl|lady|she|her|hers)\b",
+}
+ACTIVITY_LEVELS = {
+    "sedentary": r"\b(sedentary|inactive|desk job|no exercise)\b",
+    "light": r"\b(lightly active|light activity|light exercise|slightly active)\b",
+    "moderate": r"\b(moderately active|moderate(ly)? (activity|exercise)|moderate)\b",
+    "active": r"(?<!very )(?<!moderately )(?<!lightly )(?<!slightly )\bactive\b",
+    "very_active": r"\b(very active|extremely active|athlete)\b",
+}
+# "not very active", "never active", "somewhat active": the level can't be read off reliably.
+NEGATED_OR_HEDGED = (
+    r"\b(not|never|no longer|hardly|barely|rarely|don'?t|doesn'?t|isn'?t|aren'?t|wasn'?t|can'?t|cannot)\b"
+    r"|\b(somewhat|fairly|quite|pretty|kind of|sort of|less|more|semi|used to be)\s*-?\s*active\b"
+)
+CALORIE_INTENT = r"\b(calories|calorie|kcal|tdee|bmr|calorie needs|how much should i eat)\b"
+# Requests mentioning these need the model (or another tool) as well.
+OTHER_INTENTS = r"\b(book|appointment|nutritionist|schedule|cancel|delete|recipe|search)\b"
+
+
+def _single(values: List[float]) -> Optional[float]:
+    """The value if exactly one distinct value was found ("80 kg, lose 5 kg" is ambiguous)."""
+    return values[0] if len(set(values)) == 1 else None
+
+
+def parse_age(text: str) -> Optional[float]:
+    return _single(
+        [float(value) for value in re.findall(NUMBER + r"\s*(?:-\s*)?(?:years?|yrs?|y/?o)\b", text)]
+        + [float(value) for value in re.findall(r"\b(?:age|aged)\s*(?:is|:)?\s*" + NUMBER, text)]
+    )
+
+
+def parse_weight(text: str) -> Optional[float]:
+    """Weight in kilograms."""
+    return _single(
+        [float(value) for value in re.findall(NUMBER + r"\s*(?:kg|kgs|kilos?|kilograms?)\b", text)]
+        + [round(float(value) * 0.45359237, 1) for value in re.findall(NUMBER + r"\s*(?:lbs?|pounds?)\b", text)]
+    )
+
+
+def parse_height(text: str) -> Optional[float]:
+    """Height in centimetres."""
+    return _single(
+        [float(value) for value in re.findall(NUMBER + r"\s*(?:cm|centimet(?:er|re)s?)\b", text)]
+        + [
+            round((int(feet) * 12 + int(inches or 0)) * 2.54, 1)
+            for feet, inches in re.findall(r"\b(\d)\s*(?:'|ft|feet|foot)\s*(\d{1,2})?(?!\d)", text)
+        ]
+        + [round(float(value) * 100, 1) for value in re.findall(r"\b([12](?:\.\d{1,2})?)\s*(?:m|meters?|metres?)\b", text)]
+    )
+
+
+def parse_calorie_request(text: str) -> Optional[Dict[str, Any]]:
+    """Arguments for calorie_calculator_tool, or None unless every one is stated unambiguously."""
+    text = text.lower()
+    if not re.search(CALORIE_INTENT, text) or re.search(OTHER_INTENTS, text) or re.search(NEGATED_OR_HEDGED, text):
+        return None
+    args = {
+        "gender": _one(GENDERS, text),
+        "weight": parse_weight(text),
+        "height": parse_height(text),
+        "age": parse_age(text),
+        "activity_level": _one(ACTIVITY_LEVELS, text),
+    }
+    if any(value is None for value in args.values()):
+        return None
+    if not (2 <= args["age"] <= 120 and 20 <= args["weight"] <= 350 and 50 <= args["height"] <= 250):
+        return None
+    args["age"] = int(args["age"])
+    return args
+
+
+def parse_cancel_request(text: str) -> Optional[Dict[str, Any]]:
+    """Arguments for delete_appointment from e.g. "cancel appointment #42"."""
+    text = text.lower().strip()
+    if re.search(r"\b(don'?t|do not|not|never|whether|should|how|what|why|if)\b", text):
+        return None
+    match = re.fullmatch(
+        r"(?:please\s+)?(?:cancel|delete|remove)\s+(?:my\s+)?appointment\s*(?:id|number|no\.?)?\s*(?:#|:)?\s*(\d+)(?:\s*please)?[.!]?",
+        text,
+    )
+    return {"appointment_id": int(match.group(1))} if match else None
+
+
+ACTIVITY_LABELS = {"sedentary": "sedentary", "light": "lightly active", "moderate": "moderately active",
+                   "active": "active", "very_active": "very active"}
+
+
+def calorie_reply(args: Dict[str, Any], result: Dict[str, Any]) -> str:
+    plan = result["maintenance_plan"]
+    diet = result["selected_diet_plan"]
+    lines = [
+        f"Your basal metabolic rate is about **{result['bmr']:.0f} kcal** and, being {ACTIVITY_LABELS[args['activity_level']]}, "
+        f"you need about **{result['daily_calories']:.0f} kcal per day**.",
+        "",
+        f"- Maintain your weight: {plan['maintain']} kcal/day",
+        f"- Lose weight: {plan['lose_weight']} kcal/day",
+        f"- Gain weight: {plan['gain_weight']} kcal/day",
+        "",
+        f"Suggested plan ({diet['goal']}):",
+    ]
+    lines += [f"- {meal}" for meal in diet["plan"]]
+    lines += ["", "Tell me your goal and I can tailor the plan further."]
+    return "\n".join(lines)
+
+
+@dataclass
+class Intent:
+    """A structured request the router can serve without the model.
+
+    Args:
+        name: Name used in the stats.
+        tool: Name of the tool the call is recorded under.
+        parse: Returns the tool arguments, or None to fall through.
+        run: Runs the tool with those arguments.
+        reply: Formats the answer from the arguments and the tool result.
+    """
+    name: str
+    tool: str
+    parse: Callable[[str], Optional[Dict[str, Any]]]
+    run: Callable[..., Any]
+    reply: Callable[[Dict[str, Any], Any], str]
+
+
+class FastPathRouter:
+    """Serves matching turns from ``intents`` and counts what that saved.
+
+    Each model turn (an assistant node call) is timed via ``observe_model``.
+    A routed turn is credited with two of them, the tool choice and the
+    phrasing, minus its own run time.
+    """
+
+    def __init__(self, intents: List[Intent], enabled: bool = True):
+        self.intents = intents
+        self.enabled = enabled
+        self.turns = 0
+        self.served: Dict[str, int] = {intent.name: 0 for intent in intents}
+        self.failures = 0
+        self.fast_seconds = 0.0
+        self.model_calls = 0
+        self.model_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, intents: List[Intent]) -> "FastPathRouter":
+        return cls(intents, enabled=os.getenv("ROUTER_ENABLED", "true").lower() in ("1", "true", "yes"))
+
+    def observe_model(self, seconds: float) -> None:
+        with self._lock:
+            self.model_calls += 1
+            self.model_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        served = sum(self.served.values())
+        return {
+            "enabled": self.enabled,
+            "turns": self.turns,
+            "served_without_model": served,
+            "served_share": round(served / self.turns, 3) if self.turns else 0.0,
+            "by_intent": dict(self.served),
+            "failures": self.failures,
+            "avg_fast_ms": round(1000 * self.fast_seconds / served, 2) if served else 0.0,
+            "avg_model_call_ms": round(1000 * self.model_seconds / self.model_calls, 1) if self.model_calls else 0.0,
+            "estimated_seconds_saved": round(self.saved_seconds, 2),
+        }
+
+    def match(self, messages: List[BaseMessage]):
+        """The (intent, args) for the newest human message, if any intent parses it."""
+        if not self.enabled or not messages or not isinstance(messages[-1], HumanMessage):
+            return None, None
+        text = messages[-1].content
+        if not isinstance(text, str):
+            return None, None
+        for intent in self.intents:
+            args = intent.parse(text)
+            if args is not None:
+                return intent, args
+        return None, None
+
+    def _messages(self, intent: Intent, args: Dict[str, Any], result: Any) -> List[BaseMessage]:
+        call_id = f"fastpath-{uuid.uuid4().hex[:12]}"
+        return [
+            AIMessage(content="", tool_calls=[{"name": intent.tool, "args": args, "id": call_id}]),
+            # Serialised as ToolNode does, so the thread reads the same as a model-driven turn.
+            ToolMessage(
+                content=result if isinstance(result, str) else json.dumps(result, ensure_ascii=False),
+                name=intent.tool,
+                tool_call_id=call_id,
+            ),
+            AIMessage(content=intent.reply(args, result)),
+        ]
+
+    def _record(self, intent: Optional[Intent], started: float, failed: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.turns += 1
+            if failed:
+                self.failures += 1
+            if intent is None or failed:
+                return
+            self.served[intent.name] += 1
+            self.fast_seconds += elapsed
+            if self.model_calls:
+                self.saved_seconds += max(0.0, 2 * self.model_seconds / self.model_calls - elapsed)
+
+    def route(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        # Every turn starts here, so this also stamps the turn for the tool budget.
+        update = {"messages": [], "turn_started": time.time()}
+        started = time.perf_counter()
+        intent, args = self.match(state["messages"])
+        if intent is None:
+            self._record(None, started)
+            return update
+        try:
+            result = intent.run(**args)
+        except Exception as e:
+            print(f"Fast path {intent.name} failed, using the assistant: {e}")
+            self._record(intent, started, failed=True)
+            return update
+        self._record(intent, started)
+        return {**update, "messages": self._messages(intent, args, result)}
+
+    async def aroute(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        update = {"messages": [], "turn_started": time.time()}
+        started = time.perf_counter()
+        intent, args = self.match(state["messages"])
+        if intent is None:
+            self._record(None, started)
+            return update
+        try:
+            # Tools may touch the database; keep them off the event loop.
+            result = await run_blocking(lambda: intent.run(**args))
+        except Exception as e:
+            print(f"Fast path {intent.name} failed, using the assistant: {e}")
+            self._record(intent, started, failed=True)
+            return update
+        self._record(intent, started)
+        return {**update, "messages": self._messages(intent, args, result)}
+
+
+def route_after_router(state: Dict[str, Any]) -> str:
+    """Conditional edge: finish if the router answered, otherwise ask the assistant."""
+    last = state["messages"][-1]
+    return END if isinstance(last, AIMessage) and not last.tool_calls else "assistant"
@@ -0,0 +1,170 @@
+"""Production launcher: N pre-forked uvicorn workers on one listening socket.
+
+    poetry run python serve.py chat --workers 4 --port 8001
+    poetry run python serve.py login --workers 2 --port 8055
+
+The parent imports the service and builds its read-only resources once
+(``PRELOAD`` in main.py: the FAISS indexes, BM25 and the nutritionist
+directory), then forks the workers. They share those objects copy-on-write,
+and the FAISS vectors are read-only memory maps of the index store, so N
+workers hold about one copy of the indexes rather than N. Each worker then
+runs the service's ``after_fork`` hook and opens its own database
+connections.
+
+Conversation state must be visible to every worker, so with more than one
+worker the checkpointer defaults to ``sql`` (see checkpointers.py) and
+``CHECKPOINTER=memory`` is refused. Response caches, router and tool
+statistics and /metrics stay per worker.
+
+The parent restarts workers that die and passes SIGINT/SIGTERM on to them.
+WEB_WORKERS, WEB_HOST and WEB_PORT set the defaults of the options below.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional, Sequence
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORTS = {"chat": 8001, "login": 8055}
+
+
+def load_service(service: str):
+    """Import a service; returns (app, resources to build before forking, after-fork hook)."""
+    directory = os.path.join(BACKEND_DIR, "login") if service == "login" else BACKEND_DIR
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+
+    import main
+
+    if service == "login":
+        main.create_tables()
+    return main.app, getattr(main, "PRELOAD", []), getattr(main, "after_fork", None)
+
+
+def listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app: Any, sock: socket.socket, after_fork: Optional[Callable[[], None]] = None) -> None:
+    import uvicorn
+
+    from shared.db import dispose_engines
+
+    dispose_engines()
+    if after_fork is not None:
+        after_fork()
+    uvicorn.Server(uvicorn.Config(app, log_level=os.getenv("LOG_LEVEL", "info").lower())).run(sockets=[sock])
+
+
+def serve(
+    app: Any,
+    workers: int,
+    host: str,
+    port: int,
+    preload: Sequence[Any] = (),
+    after_fork: Optional[Callable[[], None]] = None,
+) -> None:
+    """Build ``preload`` once, then serve ``app`` from ``workers`` forked processes.
+
+    Args:
+        app: The ASGI app.
+        workers: Worker processes; 1 serves from this process without forking.
+        host: Interface to listen on.
+        port: Port to listen on.
+        preload: LazyResources to build before forking. One that fails is
+            left to the workers, which retry it lazily.
+        after_fork: Called in each worker before it starts serving.
+    """
+    for resource in preload:
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"Error while preloading {resource.name}:", e)
+    sock = listen(host, port)
+    if workers <= 1:
+        run_worker(app, sock)
+        return
+
+    # Everything built so far lives as long as the process; keep the garbage
+    # collector from writing to (and so copying) those pages in the workers.
+    gc.freeze()
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(app, sock, after_fork)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        # SIGTERM rather than the signal received: a second SIGINT makes uvicorn drop in-flight requests.
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"Serving on http://{host}:{port} with {workers} workers (parent {os.getpid()})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with {os.waitstatus_to_exitcode(status)}; starting a new one")
+        if time.monotonic() - started < 1:
+            # Don't spin if workers die on startup.
+            time.sleep(1)
+        spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("service", choices=sorted(DEFAULT_PORTS))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--host", default=os.getenv("WEB_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEB_PORT", "0")) or None)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Read when main.py is imported, so it must be settled first.
+        checkpointer = os.environ.setdefault("CHECKPOINTER", "sql")
+        if args.service == "chat" and checkpointer != "sql":
+            parser.error(f"CHECKPOINTER={checkpointer} keeps conversations in one worker; use sql with --workers > 1.")
+
+    app, preload, after_fork = load_service(args.service)
+    serve(app, args.workers, args.host, args.port or DEFAULT_PORTS[args.service], preload, after_fork)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Database engines shared by the chat and login services.
+
+Both services build their engines here so pooling, timeouts and metrics are
+configured the same way. Settings come from the environment:
+
+    DB_URI                   connection string (required)
+    DB_POOL_SIZE             connections kept open per process (default 5)
+    DB_MAX_OVERFLOW          extra connections allowed under load (default 10)
+    DB_POOL_TIMEOUT          seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE          seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING         test connections before use (default true)
+    DB_STATEMENT_TIMEOUT_MS  per-statement timeout on Postgres (default 0, off)
+    DB_ASYNC_URI             URL for the optional async engine (derived from
+                             DB_URI when unset)
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlmodel import create_engine
+
+from shared.telemetry import REGISTRY, instrument_engine
+
+# Engines by name, for pool metrics
+ENGINES: Dict[str, Engine] = {}
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Build create_engine keyword arguments for a URL from the environment."""
+    parsed = make_url(url)
+    options: Dict[str, Any] = {
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    # In-memory SQLite uses a single-connection pool that takes no sizing.
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+
+    statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+    if statement_timeout and parsed.get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    elif parsed.get_backend_name() == "sqlite":
+        # Wait for locks instead of failing at once; needed for concurrent writers.
+        options["connect_args"] = {"timeout": statement_timeout / 1000 if statement_timeout else 30}
+    return options
+
+
+class PoolMetrics:
+    """Counts connection events for one engine."""
+
+    def __init__(self):
+        self.connections_opened = 0
+        self.checkouts = 0
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> None:
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connections_opened += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+
+
+def create_db_engine(name: str, url: Optional[str] = None, **overrides: Any) -> Engine:
+    """Create (or return the existing) pooled engine registered under ``name``."""
+    if name in ENGINES:
+        return ENGINES[name]
+    url = url or os.getenv("DB_URI")
+    engine = create_engine(url, **{**engine_options(url), **overrides})
+    metrics = PoolMetrics()
+    metrics.attach(engine)
+    instrument_engine(engine, name)
+    ENGINES[name] = engine
+    _metrics[name] = metrics
+    return engine
+
+
+def create_async_db_engine(url: Optional[str] = None, **overrides: Any):
+    """Create an async engine (asyncpg for Postgres, aiosqlite for SQLite).
+
+    The async driver is an optional dependency; install ``asyncpg`` or
+    ``aiosqlite`` to use it.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url or os.getenv("DB_ASYNC_URI")
+    if not url:
+        parsed = make_url(os.getenv("DB_URI"))
+        driver = ASYNC_DRIVERS.get(parsed.drivername)
+        if driver is None:
+            raise ValueError(f"No async driver known for {parsed.drivername}; set DB_ASYNC_URI.")
+        url = parsed.set(drivername=driver).render_as_string(hide_password=False)
+    options = engine_options(url)
+    connect_args = options.pop("connect_args", {})
+    if "options" in connect_args:
+        # asyncpg takes server settings instead of a libpq options string.
+        statement_timeout = connect_args.pop("options").split("=", 1)[1]
+        connect_args["server_settings"] = {"statement_timeout": statement_timeout}
+    return create_async_engine(url, connect_args=connect_args, **{**options, **overrides})
+
+
+def dispose_engines() -> None:
+    """Drop pooled connections inherited from a parent process; call in a worker right after fork."""
+    for engine in ENGINES.values():
+        engine.dispose(close=False)
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Pool utilisation for every registered engine."""
+    stats = {}
+    for name, engine in ENGINES.items():
+        pool = engine.pool
+        metrics = _metrics[name]
+        entry: Dict[str, Any] = {
+            "pool": type(pool).__name__,
+            "connections_opened": metrics.connections_opened,
+            "checkouts": metrics.checkouts,
+        }
+        if hasattr(pool, "checkedout"):
+            size = pool.size()
+            checked_out = pool.checkedout()
+            capacity = size + max(getattr(pool, "_max_overflow", 0), 0)
+            entry.update(
+                size=size,
+                checked_in=pool.checkedin(),
+                checked_out=checked_out,
+                overflow=pool.overflow(),
+                utilization=round(checked_out / capacity, 3) if capacity else None,
+            )
+        stats[name] = entry
+    return stats
+
+
+def _pool_gauge(key: str):
+    return lambda: {(("engine", name),): entry.get(key) for name, entry in pool_stats().items()}
+
+
+REGISTRY.gauge("db_pool_checked_out", "Connections currently checked out of the pool.", _pool_gauge("checked_out"))
+REGISTRY.gauge("db_pool_size", "Connections the pool keeps open.", _pool_gauge("size"))
+REGISTRY.gauge("db_pool_overflow", "Connections open beyond the pool size.", _pool_gauge("overflow"))
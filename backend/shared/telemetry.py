@@ -0,0 +1,341 @@
+"""Request tracing, Prometheus metrics and JSON logs shared by both services.
+
+``install(app, service)`` adds the middleware and a ``/metrics`` endpoint in
+the Prometheus text format. Every request gets an ID (taken from the
+``X-Request-ID`` header when present) and a trace. Code running on behalf of
+the request records timed spans into it with ``span()`` or ``record_span()``;
+the database listeners below, and the LangChain callback handler of the chat
+service, do so for SQL statements, graph nodes, model calls, tools and
+retrievers. Settings come from the environment:
+
+    LOG_FORMAT        "json" writes one JSON line per request (default: off)
+    LOG_SPANS         include every span in the JSON line (default false)
+    SLOW_REQUEST_MS   always log requests slower than this, even without
+                      LOG_FORMAT=json (default 0, off)
+
+Responses carry a ``Server-Timing`` header with the time per span kind, so
+the breakdown is visible in browser dev tools as well.
+
+The metrics are kept in-process: with several workers, each reports its
+own numbers and Prometheus sums them.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "")
+LOG_SPANS = os.getenv("LOG_SPANS", "false").lower() in ("1", "true", "yes")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[tuple(labels)] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics plus gauge callbacks that are read when ``/metrics`` is scraped."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self.gauges: List[Tuple[str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        with self._lock:
+            return self.metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self.metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]) -> None:
+        """Register a gauge whose samples ``read()`` returns as {((label, value), ...): number}."""
+        with self._lock:
+            self.gauges = [gauge for gauge in self.gauges if gauge[0] != name] + [(name, help, read)]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self.metrics.values()):
+            lines += metric.render()
+        for name, help, read in list(self.gauges):
+            try:
+                samples = read()
+            except Exception as e:
+                print(f"Reading gauge {name} failed: {e}")
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            for labels, value in samples.items():
+                if value is not None:
+                    lines.append(f"{name}{_labels([k for k, _ in labels], [v for _, v in labels])} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+SERVICE = {"name": "app"}
+
+REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status.", ("service", "method", "route", "status"))
+REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency.", ("service", "method", "route"))
+SPAN_SECONDS = REGISTRY.histogram("app_span_duration_seconds", "Time spent per span kind and name.", ("service", "kind", "name"))
+SPAN_ERRORS = REGISTRY.counter("app_span_errors_total", "Spans that ended with an error.", ("service", "kind", "name"))
+
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    start: float
+    seconds: float
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Seconds per span kind. Kinds nest (a tool span contains its DB spans), so they do not add up."""
+        totals: Dict[str, float] = defaultdict(float)
+        for span in list(self.spans):
+            totals[span.kind] += span.seconds
+        return dict(totals)
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def record_span(kind: str, name: str, seconds: float, error: Optional[str] = None, **attributes: Any) -> None:
+    """Record a finished span in the metrics and, when inside a request, in its trace."""
+    service = SERVICE["name"]
+    SPAN_SECONDS.observe(seconds, service, kind, name)
+    if error:
+        SPAN_ERRORS.inc(service, kind, name)
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(Span(kind, name, time.perf_counter() - seconds - trace.started, seconds, error, attributes))
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a block; attributes set on the yielded dict are kept with the span."""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record_span(kind, name, time.perf_counter() - started, error, **attributes)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Time every SQL statement of ``engine`` as a "db" span named after the engine and verb."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("span_started", []).append(time.perf_counter())
+
+    def finish(conn, statement: str, error: Optional[str] = None):
+        starts = conn.info.get("span_started")
+        if starts:
+            verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+            record_span("db", f"{name}.{verb}", time.perf_counter() - starts.pop(), error)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        finish(conn, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        if context.connection is not None and context.statement:
+            finish(context.connection, context.statement, type(context.original_exception).__name__)
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+
+logger = logging.getLogger("app.requests")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _route(scope: dict) -> str:
+    # The route template keeps label cardinality bounded (/appointments, not /appointments?cursor=...).
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class TelemetryMiddleware:
+    """ASGI middleware: request ID, trace, HTTP metrics, Server-Timing and the request log line."""
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        trace = Trace(request_id)
+        token = _trace.set(trace)
+        status = {"code": 500}
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                timing = ", ".join(f"{kind};dur={seconds * 1000:.1f}" for kind, seconds in trace.breakdown().items())
+                extra = [(b"x-request-id", request_id.encode("latin-1"))]
+                if timing:
+                    extra.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _trace.reset(token)
+            # Streaming responses finish here, after their last chunk was sent.
+            elapsed = time.perf_counter() - trace.started
+            route = _route(scope)
+            if route != "/metrics":
+                REQUESTS.inc(self.service, scope["method"], route, str(status["code"]))
+                REQUEST_SECONDS.observe(elapsed, self.service, scope["method"], route)
+                self._log(scope, route, status["code"], elapsed, trace)
+
+    def _log(self, scope: dict, route: str, status: int, elapsed: float, trace: Trace) -> None:
+        slow = SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS
+        if LOG_FORMAT != "json" and not slow:
+            return
+        fields = {
+            "service": self.service,
+            "request_id": trace.request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "breakdown_ms": {kind: round(seconds * 1000, 1) for kind, seconds in trace.breakdown().items()},
+            "spans": len(trace.spans),
+        }
+        if LOG_SPANS:
+            fields["span_list"] = [
+                {"kind": s.kind, "name": s.name, "start_ms": round(s.start * 1000, 1), "ms": round(s.seconds * 1000, 1),
+                 **({"error": s.error} if s.error else {}), **s.attributes}
+                for s in trace.spans
+            ]
+        if LOG_FORMAT == "json":
+            logger.info("request", extra={"fields": fields})
+        else:
+            logger.info(f"slow request {fields['method']} {fields['path']} {fields['duration_ms']}ms {fields['breakdown_ms']}")
+
+
+def install(app, service: str) -> None:
+    """Add the telemetry middleware and a ``/metrics`` endpoint to a FastAPI app."""
+    from fastapi.responses import PlainTextResponse
+
+    SERVICE["name"] = service
+    app.add_middleware(TelemetryMiddleware, service=service)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,62 @@
+import json
+import time
+from typing import Any, AsyncIterator, Dict
+
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph.state import CompiledStateGraph
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def stream_graph(graph: CompiledStateGraph, inputs: dict, config: dict) -> AsyncIterator[str]:
+    """Run the graph and yield SSE frames as work happens.
+
+    Emits ``token`` frames for assistant output as the model produces it,
+    ``tool_start``/``tool_end`` frames around each tool call, and a final
+    ``done`` frame carrying the complete answer (or ``error`` on failure).
+    """
+    tool_started: Dict[str, float] = {}
+    answer = []
+    try:
+        async for event in graph.astream_events(inputs, config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if TAG_NOSTREAM in event.get("tags", []):
+                # Internal model calls, e.g. conversation summaries.
+                continue
+
+            if kind == "on_chat_model_stream" and node == "assistant":
+                content = event["data"]["chunk"].content
+                if isinstance(content, str) and content:
+                    answer.append(content)
+                    yield sse_event("token", {"content": content})
+
+            elif kind == "on_chat_model_end" and node == "assistant":
+                # A tool-calling turn is not the final answer; start over.
+                if event["data"]["output"].tool_calls:
+                    answer.clear()
+
+            elif kind == "on_tool_start":
+                tool_started[event["run_id"]] = time.perf_counter()
+                yield sse_event("tool_start", {"tool": event["name"]})
+
+            elif kind == "on_tool_end":
+                started = tool_started.pop(event["run_id"], None)
+                elapsed = round(time.perf_counter() - started, 3) if started else None
+                yield sse_event("tool_end", {"tool": event["name"], "seconds": elapsed})
+
+        if not answer:
+            # Models that don't stream still leave the final message in the state.
+            state = await graph.aget_state(config)
+            messages = state.values.get("messages", [])
+            if messages:
+                answer.append(messages[-1].content)
+        yield sse_event("done", {
+            "response": "".join(answer) or "No response generated.",
+            "thread_id": config["configurable"]["thread_id"],
+        })
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "bench"))
+
+
+@pytest.fixture(scope="session")
+def chat(tmp_path_factory):
+    """The chat service module with the bench fakes (see bench/fake_services.py), offline."""
+    directory = tmp_path_factory.mktemp("chat")
+    os.environ.update({
+        "INDEX_STORE_DIR": str(directory / "index"),
+        "DB_URI": f"sqlite:///{directory / 'chat.db'}",
+        "FAKE_LLM_MS": "0",
+        "FAKE_EMBED_MS": "0",
+        "FAKE_SEARCH_MS": "0",
+        "ADMISSION_ENABLED": "false",
+    })
+    from fake_services import chat_app
+
+    return chat_app()
+
+
+@pytest.fixture
+def client(chat):
+    from fastapi.testclient import TestClient
+
+    # Not used as a context manager: the lifespan warm-up is not needed here.
+    return TestClient(chat.app)
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, Limit, Rejected
+
+
+def controller(**kwargs):
+    # A refill of 0.01 tokens a second keeps the bucket levels exact enough to compare.
+    return AdmissionController(
+        user_limit=Limit.per_minute(0.6, 10_000),
+        global_limit=None,
+        max_inflight=1,
+        estimate_tokens=3000,
+        **kwargs,
+    )
+
+
+def level(admission, user):
+    limit = admission.user_limit
+    return admission.buckets._level(f"user:{user}", limit.rate, limit.capacity, time.time())
+
+
+def test_cancelled_while_queued_refunds_the_reservation():
+    admission = controller(queue_seconds=10)
+
+    async def scenario():
+        first = await admission.admit("alice")
+        queued = asyncio.create_task(admission.admit("alice"))
+        await asyncio.sleep(0.05)
+        assert admission.waiting == 1 and level(admission, "alice") == pytest.approx(4000, abs=1)
+        queued.cancel()  # the client disconnected
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert admission.waiting == 0 and level(admission, "alice") == pytest.approx(7000, abs=1)
+        await admission.release(first, 3000)
+        assert level(admission, "alice") == pytest.approx(7000, abs=1)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_refunds_the_reservation():
+    admission = controller(queue_seconds=0.05)
+
+    async def scenario():
+        first = await admission.admit("bob")
+        with pytest.raises(Rejected) as rejected:
+            await admission.admit("bob")
+        assert rejected.value.reason == "queue_timeout"
+        assert level(admission, "bob") == pytest.approx(7000, abs=1)
+        await admission.release(first, 1000)
+        assert level(admission, "bob") == pytest.approx(9000, abs=1)
+
+    asyncio.run(scenario())
+
+
+def test_turns_without_model_calls_leave_the_estimate_alone():
+    admission = controller()
+
+    async def scenario():
+        for _ in range(50):  # router fast-path answers
+            await admission.release(await admission.admit("carol"), 0)
+        assert admission.estimate_tokens == 3000
+        await admission.release(await admission.admit("carol"), 2000)
+        assert admission.estimate_tokens == pytest.approx(2900)
+
+    asyncio.run(scenario())
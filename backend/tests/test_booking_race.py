@@ -0,0 +1,59 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, select
+
+from appointments import Appointment, book, ensure_slot_index
+from shared.db import create_db_engine
+
+THREADS = 16
+BOOKINGS = 64
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # BOOKING_RACE_DB_URI points the test at a real server (e.g. postgres); SQLite otherwise.
+    url = os.getenv("BOOKING_RACE_DB_URI") or f"sqlite:///{tmp_path}/booking_race.db"
+    engine = create_db_engine("booking_race", url, pool_size=THREADS, max_overflow=0)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    with Session(engine) as session:
+        for appointment in session.exec(select(Appointment).where(Appointment.doctor.startswith("Race Test"))):
+            session.delete(appointment)
+        session.commit()
+    engine.dispose()
+
+
+def test_concurrent_bookings_of_one_slot_book_it_once(engine):
+    doctor = f"Race Test {os.getpid()}"
+    barrier = threading.Barrier(THREADS)
+
+    def attempt(i):
+        if i < THREADS:
+            barrier.wait()  # release the first wave together
+        return book(engine, doctor, "2030-01-01", "10:00", "Race Test").status
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        outcomes = Counter(pool.map(attempt, range(BOOKINGS)))
+
+    assert outcomes == {"booked": 1, "conflict": BOOKINGS - 1}
+    with Session(engine) as session:
+        assert len(session.exec(select(Appointment).where(Appointment.doctor == doctor)).all()) == 1
+
+
+def test_slot_index_is_added_to_a_table_created_without_it(tmp_path):
+    engine = create_db_engine("booking_legacy", f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE appointment (id INTEGER PRIMARY KEY, doctor VARCHAR NOT NULL, date DATE NOT NULL, "
+            "time TIME NOT NULL, specialization VARCHAR NOT NULL)"
+        ))
+
+    assert ensure_slot_index(engine) is True
+    assert ensure_slot_index(engine) is False
+    assert book(engine, "Legacy", "2030-01-01", "10:00", "Test").status == "booked"
+    assert book(engine, "Legacy", "2030-01-01", "10:00", "Test").status == "conflict"
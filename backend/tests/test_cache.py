@@ -0,0 +1,107 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, HumanMessage
+
+from cache import ResponseCache, cache_model_response, model_cache_key
+from rag.hybrid import HybridSearcher
+from rag.retrievers import LazyRetriever
+from resources import LazyResource
+
+
+class WordEmbeddings(Embeddings):
+    """Bag of words without digits, so prompts differing only in an ID embed identically."""
+
+    VOCABULARY = ["cancel", "appointment", "book", "nutritionist", "monday", "protein", "snack"]
+
+    def embed_query(self, text):
+        words = text.lower().split()
+        return [float(words.count(word)) for word in self.VOCABULARY]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def model_cache():
+    return ResponseCache("assistant", embedding_provider=WordEmbeddings, similarity_threshold=0.95)
+
+
+def ask(cache, prompt, response):
+    key, semantic = model_cache_key([HumanMessage(content=prompt)])
+    found, value, vector = cache.get(key, semantic=semantic)
+    if not found:
+        cache_model_response(cache, key, response, vector)
+    return found, value
+
+
+def tool_call(name, **args):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call-{name}"}])
+
+
+def test_state_changing_tool_calls_are_not_cached():
+    cache = model_cache()
+    ask(cache, "cancel appointment 42", tool_call("delete_appointment", appointment_id=42))
+    assert ask(cache, "cancel appointment 41", tool_call("delete_appointment", appointment_id=41)) == (False, None)
+    assert ask(cache, "cancel appointment 42", tool_call("delete_appointment", appointment_id=42)) == (False, None)
+
+    ask(cache, "book nutritionist 3 monday", tool_call("book_appointment", nutritionist_id=3, date="monday"))
+    assert ask(cache, "book nutritionist 7 monday", tool_call("book_appointment", nutritionist_id=7, date="monday"))[0] is False
+
+
+def test_tool_calls_are_exact_match_only():
+    cache = model_cache()
+    first = tool_call("find_available_nutritionists", date="monday")
+    ask(cache, "nutritionist on monday 9", first)
+    assert ask(cache, "nutritionist on monday 10", tool_call("find_available_nutritionists"))[0] is False
+    assert ask(cache, "Nutritionist on monday 9?", tool_call("find_available_nutritionists")) == (True, first)
+
+
+def test_answers_are_matched_semantically():
+    cache = model_cache()
+    answer = AIMessage(content="Greek yogurt or almonds.")
+    ask(cache, "protein snack", answer)
+    assert ask(cache, "snack protein", AIMessage(content="unused")) == (True, answer)
+    assert cache.semantic_hits == 1
+
+
+def test_semantic_matches_stay_within_their_scope():
+    cache = model_cache()
+    answer = AIMessage(content="About 2400 kcal.")
+    key, semantic = model_cache_key([HumanMessage(content="protein snack")])
+    found, _, vector = cache.get(key, semantic=semantic, scope="thread-a")
+    cache_model_response(cache, key, answer, vector, scope="thread-a")
+
+    other, semantic = model_cache_key([HumanMessage(content="snack protein")])
+    assert cache.get(other, semantic=semantic, scope="thread-b")[:2] == (False, None)
+    assert cache.get(other, semantic=semantic, scope="thread-a")[:2] == (True, answer)
+    # The exact text is shared: it gets the same answer whoever asks.
+    assert cache.get(key, semantic=semantic, scope="thread-b")[:2] == (True, answer)
+
+
+class CountingEmbeddings(WordEmbeddings):
+    calls = 0
+
+    def embed_query(self, text):
+        CountingEmbeddings.calls += 1
+        return super().embed_query(text)
+
+
+class RecordingSearcher(HybridSearcher):
+    def __init__(self):
+        self.vectors = []
+
+    def search(self, query, query_vector=None):
+        self.vectors.append(query_vector)
+        return [Document(page_content=query)]
+
+
+def test_retriever_miss_reuses_the_lookup_embedding():
+    searcher = RecordingSearcher()
+    cache = ResponseCache("healthline_search", embedding_provider=CountingEmbeddings)
+    retriever = LazyRetriever(resource=LazyResource("search", lambda: searcher), cache=cache)
+
+    CountingEmbeddings.calls = 0
+    assert retriever.invoke("protein snack")[0].page_content == "protein snack"
+    assert CountingEmbeddings.calls == 1
+    assert searcher.vectors == [WordEmbeddings().embed_query("protein snack")]
+    assert retriever.invoke("Snack protein?")[0].page_content == "protein snack"
+    assert CountingEmbeddings.calls == 2 and len(searcher.vectors) == 1
@@ -0,0 +1,62 @@
+import numpy as np
+
+from calories import (
+    ERRORS,
+    batch_to_columns,
+    batch_to_records,
+    calculate_daily_calories,
+    calculate_daily_calories_batch,
+)
+
+ROSTER = {
+    "gender": ["male", "female", "Male", "FEMALE", "other", "female", "male", "female"],
+    "weight": [80, 60, 70, 55, 70, 62, 90, 48],
+    "height": [180, 165, 175, 160, 170, 168, 185, 150],
+    "age": [35, 28, 4, 15, 40, 70, 65, 12],
+    "activity_level": ["moderate", "light", "active", "sedentary", "light", "lightly", "very_active", "jogging"],
+}
+
+
+def single(row):
+    try:
+        return calculate_daily_calories(*row)
+    except ValueError as e:
+        return {"error": str(e)}
+
+
+def test_batch_matches_single_call():
+    expected = [single(row) for row in zip(*ROSTER.values())]
+    assert batch_to_records(calculate_daily_calories_batch(**ROSTER)) == expected
+
+
+def test_precomputed_codes_match_strings():
+    codes = {
+        **ROSTER,
+        "gender": np.array([0, 1, 0, 1, 2, 1, 0, 1]),
+    }
+    by_string = calculate_daily_calories_batch(**{**ROSTER, "gender": [g.lower() for g in ROSTER["gender"]]})
+    by_code = calculate_daily_calories_batch(**codes)
+    np.testing.assert_array_equal(by_string["daily_calories"], by_code["daily_calories"])
+    np.testing.assert_array_equal(by_string["error"], by_code["error"])
+
+
+def test_endpoint_answers_in_columns_by_default(client):
+    response = client.post("/calories/batch", json=ROSTER)
+    assert response.status_code == 200
+    columns = response.json()
+    expected = batch_to_columns(calculate_daily_calories_batch(**ROSTER))
+    assert columns["maintain"] == expected["maintain"]
+    assert columns["error"][4] == ERRORS[0] and columns["error"][7] == ERRORS[1]
+    assert columns["bmr"][4] is None and columns["weight_goal"][4] is None
+
+    records = [single(row) for row in zip(*ROSTER.values())]
+    for i, record in enumerate(records):
+        if "error" not in record:
+            assert columns["bmr"][i] == record["bmr"]
+            assert columns["weight_goals"][columns["weight_goal"][i]] == record["weight_goal"]
+            assert columns["diet_plans"][columns["plan"][i]] == record["selected_diet_plan"]
+
+    valid = {name: values[:4] for name, values in ROSTER.items()}
+    assert client.post("/calories/batch", json=valid).json()["maintain"] == columns["maintain"][:4]
+
+    assert client.post("/calories/batch?format=records", json=ROSTER).json()["results"] == records
@@ -0,0 +1,50 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from checkpointers import BoundedMemorySaver, get_checkpointer
+
+
+def test_default_checkpointer_is_bounded_memory(monkeypatch):
+    monkeypatch.delenv("CHECKPOINTER", raising=False)
+    assert isinstance(get_checkpointer(), BoundedMemorySaver)
+
+
+def test_graph_turns_through_default_checkpointer(chat, client):
+    assert isinstance(chat.memory, BoundedMemorySaver)
+    for question in ("Which foods are high in protein?", "And which of them are good for breakfast?"):
+        response = client.post("/generateanswer", json={"input_text": question, "thread_id": "checkpointer-test"})
+        assert response.status_code == 200, response.text
+        assert response.json()["response"]
+
+    state = chat.react_graph_memory.get_state({"configurable": {"thread_id": "checkpointer-test"}})
+    humans = [m.content for m in state.values["messages"] if isinstance(m, HumanMessage)]
+    assert humans[-2:] == ["Which foods are high in protein?", "And which of them are good for breakfast?"]
+    assert chat.memory.stats()["threads"] >= 1
+
+
+def test_keeps_last_checkpoints_and_evicts_threads(chat):
+    from langgraph.graph import END, START, MessagesState, StateGraph
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", lambda state: {"messages": [AIMessage(content="ok")]})
+    builder.add_edge(START, "reply")
+    builder.add_edge("reply", END)
+    saver = BoundedMemorySaver(max_threads=2, keep_last=2)
+    graph = builder.compile(checkpointer=saver)
+
+    for thread in ("a", "b", "c"):
+        for turn in range(3):
+            graph.invoke({"messages": [HumanMessage(content=f"{thread}{turn}")]}, {"configurable": {"thread_id": thread}})
+
+    assert saver.stats()["threads"] == 2
+    assert saver.evictions == 1
+    assert graph.get_state({"configurable": {"thread_id": "a"}}).values == {}
+    assert all(len(checkpoints) <= 2 for checkpoints in saver.storage["c"].values())
+    assert {key[2] for key in saver.writes if key[0] == "c"} <= set(saver.storage["c"][""]) | {
+        parent for _, _, parent in saver.storage["c"][""].values()
+    }
+    assert len(graph.get_state({"configurable": {"thread_id": "c"}}).values["messages"]) == 6
+    assert saver.total_bytes > 0
+    # Reads add keys to the writes defaultdict too; the per-thread index must cover them.
+    assert set(saver._write_keys) == {"b", "c"}
+    assert {key for key in saver.writes if key[0] in ("b", "c")} <= saver._write_keys["b"] | saver._write_keys["c"]
+    assert not [key for key in saver.writes if key[0] == "a"]
@@ -0,0 +1,78 @@
+from langchain_community.document_loaders import TextLoader
+from langchain_text_splitters import CharacterTextSplitter
+
+from fakes import FakeEmbeddings
+from rag.ann import AnnConfig, _hnsw
+from rag.index_store import IndexSource, IndexStore
+
+
+def sources(tmp_path, texts):
+    result = []
+    for name, text in texts.items():
+        path = tmp_path / f"{name}.txt"
+        path.write_text(text)
+        result.append(IndexSource(
+            name=name,
+            loader=lambda path=path: TextLoader(str(path)),
+            splitter=CharacterTextSplitter(separator="\n", chunk_size=60, chunk_overlap=0),
+            local=True,
+        ))
+    return result
+
+
+def test_merged_index_is_stored_and_checked(tmp_path):
+    texts = {
+        "oats": "\n".join(f"Oats line {i} has fibre and {i} grams of protein." for i in range(40)),
+        "salmon": "\n".join(f"Salmon line {i} has omega-3 and {i} grams of fat." for i in range(40)),
+    }
+    kb = sources(tmp_path, texts)
+    store = IndexStore(str(tmp_path / "store"), FakeEmbeddings(dim=32, latency=0), "fake", AnnConfig(kind="hnsw", ef_search=37))
+    assert not store.is_merged_current(kb)
+
+    merged = store.load_merged(kb, refresh=True)
+    assert merged.index.ntotal == 80
+    assert _hnsw(merged.index).efSearch == 37
+    assert _hnsw(store.load_merged(kb).index).efSearch == 37
+    assert store.is_merged_current(kb)
+    assert len(list((tmp_path / "store" / "_merged").iterdir())) == 1
+
+    # Other ANN build settings need another merged index.
+    ivf = IndexStore(str(tmp_path / "store"), store.embedding, "fake", AnnConfig(kind="ivf_flat", nlist=4))
+    assert not ivf.is_merged_current(kb)
+    ivf.load_merged(kb)
+    assert ivf.is_merged_current(kb) and not store.is_merged_current(kb)
+
+
+def test_hybrid_retriever_searches_on_the_blocking_pool(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+
+    from rag.hybrid import HybridSearcher
+
+    kb = sources(tmp_path, {"oats": "\n".join(f"Oats line {i} has fibre." for i in range(10))})
+    store = IndexStore(str(tmp_path / "store"), FakeEmbeddings(dim=32, latency=0), "fake")
+    searcher = HybridSearcher(store.load_merged(kb), k=2)
+    threads = []
+    search = searcher.search
+
+    def record(query, query_vector=None):
+        threads.append(threading.current_thread().name)
+        return search(query, query_vector)
+
+    monkeypatch.setattr(searcher, "search", record)
+
+    documents = asyncio.run(searcher.as_retriever().ainvoke("oats line 3"))
+    assert "Oats line 3" in documents[0].page_content
+    assert len(threads) == 1 and threads[0].startswith("tool")
+
+
+def test_merged_index_gets_search_params_on_build_and_load(tmp_path):
+    from rag.ann import _ivf
+
+    texts = {name: "\n".join(f"{name} line {i} has {i} grams." for i in range(200)) for name in ("oats", "salmon")}
+    kb = sources(tmp_path, texts)
+    config = AnnConfig(kind="ivf_flat", nlist=4, nprobe=3)
+    store = IndexStore(str(tmp_path / "store"), FakeEmbeddings(dim=32, latency=0), "fake", config)
+
+    assert _ivf(store.load_merged(kb).index).nprobe == 3  # freshly built
+    assert _ivf(store.load_merged(kb).index).nprobe == 3  # read back from disk
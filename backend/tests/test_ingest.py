@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+import rag.sources
+from fakes import FakeEmbeddings
+from rag.ann import AnnConfig
+from rag.embedding_cache import CachedEmbeddings
+from rag.index_store import IndexStore
+from rag.ingest import DedupPlan, Ingestor, load_manifest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST = os.path.join(BACKEND_DIR, "tests", "fixtures", "knowledge_sources.json")
+
+
+def test_offline_ingestion_of_snapshots(tmp_path):
+    specs = load_manifest(MANIFEST)
+    ingestor = Ingestor(str(tmp_path), offline=True)
+
+    results = ingestor.ingest(specs)
+    assert [result.status for result in results] == ["changed"] * 3
+    assert all(result.chunks > 0 for result in results)
+    assert [result.status for result in ingestor.ingest(specs)] == ["unchanged"] * 3
+
+    page = ingestor.read_chunks("healthline-1500-calorie-diet")
+    text = "\n".join(chunk.page_content for chunk in page)
+    assert "lean protein" in text
+    assert "analytics" not in text and "Subscribe" not in text and "Fixture page" not in text
+    assert page[0].metadata["title"] == "A 1,500 Calorie Diet: Food Lists, Meal Plan and Tips"
+
+    # The water paragraph is on both pages; only the first source keeps it.
+    plan = DedupPlan(ingestor, specs)
+    water = [
+        spec.name for spec in specs for chunk in plan.chunks(spec.name)
+        if "thirst from hunger" in chunk.page_content
+    ]
+    assert water == ["healthline-1500-calorie-diet"]
+
+
+def test_build_index_offline(tmp_path, monkeypatch, capsys):
+    import build_index
+
+    embedding = CachedEmbeddings(FakeEmbeddings(dim=64, latency=0), str(tmp_path / "embeddings"), "fake")
+    store = IndexStore(str(tmp_path / "store"), embedding, "fake", AnnConfig(kind="hnsw"))
+    monkeypatch.chdir(BACKEND_DIR)
+    monkeypatch.setattr(rag.sources, "KNOWLEDGE_MANIFEST", MANIFEST)
+    monkeypatch.setattr(rag.sources, "INGEST_DIR", str(tmp_path / "ingest"))
+    monkeypatch.setattr(build_index, "KNOWLEDGE_MANIFEST", MANIFEST)
+    monkeypatch.setattr(build_index, "get_index_store", lambda: store)
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["build_index.py", "--offline", *args])
+        with pytest.raises(SystemExit) as exit:
+            build_index.main()
+            raise SystemExit(0)
+        return exit.value.code, capsys.readouterr().out
+
+    code, out = run("--check")
+    assert code == 1 and "stale: merged knowledge base (hnsw)" in out
+
+    code, out = run()
+    assert code == 0, out
+    assert "clinic-handout: unchanged (2 chunks)" in out  # ingested by --check already
+    assert "knowledge base (3 sources, hnsw, 14 vectors)" in out  # 15 chunks, one shared
+
+    code, out = run("--check")
+    assert (code, out) == (0, "")
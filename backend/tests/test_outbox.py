@@ -0,0 +1,34 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+from sqlmodel import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "login"))
+
+from config.migrations import migrate  # noqa: E402
+from mailer import outbox_stats, purge_sent, requeue_dead  # noqa: E402
+from models.outbox import EmailOutbox  # noqa: E402
+from shared.db import create_db_engine  # noqa: E402
+
+
+def message(status, sent_days_ago=None):
+    sent_at = datetime.utcnow() - timedelta(days=sent_days_ago) if sent_days_ago is not None else None
+    return EmailOutbox(recipient="user@example.com", subject="Hi", body="Hello", status=status, attempts=6, sent_at=sent_at)
+
+
+def test_outbox_retention_indexes_and_requeue(tmp_path):
+    engine = create_db_engine("outbox_test", f"sqlite:///{tmp_path}/users.db")
+    migrate(engine)
+    indexes = {info["name"]: info["column_names"] for info in inspect(engine).get_indexes("emailoutbox")}
+    assert indexes["ix_emailoutbox_status_sent_at"] == ["status", "sent_at"]
+
+    with Session(engine) as session:
+        session.add_all([message("sent", 30), message("sent", 1), message("dead"), message("pending")])
+        session.commit()
+
+    assert purge_sent(engine, timedelta(days=7)) == 1
+    assert outbox_stats(engine) == {"sent": 1, "dead": 1, "pending": 1}
+    assert requeue_dead(engine) == 1
+    assert outbox_stats(engine) == {"sent": 1, "pending": 2}
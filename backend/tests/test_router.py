@@ -0,0 +1,44 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from calories import calculate_daily_calories
+from router import FastPathRouter, Intent, calorie_reply, parse_calorie_request
+
+PROFILE = "I'm a 30 year old woman, 65 kg, 168 cm, {}, what are my daily calories?"
+
+
+@pytest.mark.parametrize("phrase, level", [
+    ("moderately active", "moderate"),
+    ("very active", "very_active"),
+    ("active", "active"),
+    ("sedentary", "sedentary"),
+])
+def test_parses_stated_activity_level(phrase, level):
+    assert parse_calorie_request(PROFILE.format(phrase))["activity_level"] == level
+
+
+@pytest.mark.parametrize("phrase", [
+    "not very active",
+    "not active at all",
+    "never active",
+    "somewhat active",
+    "fairly active",
+    "I don't exercise, not active",
+])
+def test_negated_or_hedged_activity_falls_through(phrase):
+    assert parse_calorie_request(PROFILE.format(phrase)) is None
+
+
+def test_tool_message_is_json_like_tool_node():
+    intent = Intent("calories", "calorie_calculator_tool", parse_calorie_request, calculate_daily_calories, calorie_reply)
+    router = FastPathRouter([intent])
+    update = router.route({"messages": [HumanMessage(content=PROFILE.format("moderately active"))]})
+
+    call, tool, reply = update["messages"]
+    assert isinstance(call, AIMessage) and call.tool_calls[0]["name"] == "calorie_calculator_tool"
+    assert isinstance(tool, ToolMessage)
+    assert json.loads(tool.content) == calculate_daily_calories("female", 65.0, 168.0, 30, "moderate")
+    assert isinstance(reply, AIMessage) and "kcal per day" in reply.content
+    assert router.stats()["by_intent"]["calories"] == 1
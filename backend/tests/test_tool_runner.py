@@ -0,0 +1,50 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool
+
+from executor import as_async_tool, blocking_pool, run_blocking
+from tool_runner import GuardedToolNode
+
+REQUEST = contextvars.ContextVar("request", default=None)
+
+
+def lookup(topic: str) -> str:
+    """Look up a topic."""
+    return f"{topic} seen by {REQUEST.get()} on {threading.current_thread().name}"
+
+
+def slow_lookup(topic: str) -> str:
+    """Look up a topic slowly."""
+    time.sleep(0.5)
+    return topic
+
+
+def state(*names):
+    calls = [{"name": name, "args": {"topic": "oats"}, "id": f"call-{i}"} for i, name in enumerate(names)]
+    return {"messages": [HumanMessage(content="oats?"), AIMessage(content="", tool_calls=calls)], "turn_started": time.time()}
+
+
+def test_sync_calls_carry_context_variables():
+    node = GuardedToolNode([StructuredTool.from_function(lookup)])
+    REQUEST.set("request-1")
+    (message,) = node.invoke(state("lookup"))["messages"]
+    assert "seen by request-1 on tool-call" in message.content
+
+
+def test_timed_out_calls_do_not_hold_the_blocking_pool():
+    node = GuardedToolNode([as_async_tool(slow_lookup)], timeout=0.05)
+
+    async def turn():
+        messages = (await node.ainvoke(state(*["slow_lookup"] * blocking_pool._max_workers)))["messages"]
+        # The abandoned calls are still sleeping; other blocking work must not queue behind them.
+        started = time.perf_counter()
+        await run_blocking(lambda: None)
+        return messages, time.perf_counter() - started
+
+    messages, waited = asyncio.run(turn())
+    assert all(message.status == "error" and "did not respond" in message.content for message in messages)
+    assert waited < 0.25
@@ -0,0 +1,285 @@
+"""Tool execution stage of the agent graph with timeouts and circuit breakers.
+
+``GuardedToolNode`` replaces LangGraph's ``ToolNode``. It runs the tool
+calls of one model turn concurrently and bounds each of them:
+
+    TOOL_TIMEOUT           seconds per tool call (default 10)
+    TOOL_TIMEOUTS          per-tool overrides, e.g. "tavily_search_results_json=6,rag_query_tool=15"
+    TOOL_TURN_BUDGET       seconds a whole turn may take before tools stop being started (default 30)
+    TOOL_MAX_PARALLEL      tool calls run at once within a turn (default 4)
+    TOOL_MAX_ROUNDS        assistant -> tools round trips per turn (default 4)
+    TOOL_BREAKER_FAILURES  consecutive failures that open a tool's breaker (default 3)
+    TOOL_BREAKER_RESET     seconds before an open breaker lets a trial call through (default 30)
+    TOOL_CALL_THREADS      threads for blocking tool calls (default TOOL_THREADS; see executor.py)
+
+A call that times out, fails, or hits an open breaker gets an error
+ToolMessage. The model can then answer from the other results instead of
+the whole turn hanging. Once a turn has used TOOL_MAX_ROUNDS round trips,
+further calls are refused. If the model still insists, the turn ends with
+a short apology.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langgraph.graph import END
+
+from executor import submit_tool_call
+
+LIMIT_REPLY = "I couldn't finish looking this up for you. Please try again, or ask a narrower question."
+
+
+def parse_timeouts(value: str) -> Dict[str, float]:
+    """Parse "name=seconds,name=seconds"."""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, seconds = item.split("=", 1)
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive failures; lets one trial call through after ``reset_seconds``."""
+
+    def __init__(self, failures: int = 3, reset_seconds: float = 30.0):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.consecutive = 0
+                self.opened_at = None
+                return
+            self.consecutive += 1
+            if self.opened_at is not None or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+
+
+class ToolStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def as_dict(self, breaker: CircuitBreaker) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "avg_ms": round(1000 * self.seconds / self.calls, 1) if self.calls else 0.0,
+            "breaker": breaker.state,
+        }
+
+
+def turn_messages(messages: Sequence[BaseMessage]) -> Sequence[BaseMessage]:
+    """Messages of the current turn, from the newest human message on."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
+
+
+def tool_rounds(messages: Sequence[BaseMessage]) -> int:
+    """Model messages with tool calls in the current turn, the pending one included."""
+    return sum(1 for message in turn_messages(messages) if isinstance(message, AIMessage) and message.tool_calls)
+
+
+class GuardedToolNode:
+    """Runs a turn's tool calls concurrently with timeouts, a turn budget and breakers.
+
+    Args:
+        tools: The tools the model may call.
+        timeout: Default seconds per call.
+        timeouts: Per-tool overrides of ``timeout``.
+        turn_budget: Seconds since the turn started after which no more
+            tools are started; also caps each call's timeout.
+        max_parallel: Calls run at once.
+        max_rounds: Assistant -> tools round trips allowed per turn.
+        breaker_failures: Consecutive failures that open a tool's breaker.
+        breaker_reset: Seconds an open breaker waits before a trial call.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        timeout: float = 10.0,
+        timeouts: Optional[Dict[str, float]] = None,
+        turn_budget: float = 30.0,
+        max_parallel: int = 4,
+        max_rounds: int = 4,
+        breaker_failures: int = 3,
+        breaker_reset: float = 30.0,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.turn_budget = turn_budget
+        self.max_parallel = max_parallel
+        self.max_rounds = max_rounds
+        self.breakers = {name: CircuitBreaker(breaker_failures, breaker_reset) for name in self.tools}
+        self.stats_by_tool = {name: ToolStats() for name in self.tools}
+        self.rounds_capped = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, tools: Sequence[BaseTool]) -> "GuardedToolNode":
+        return cls(
+            tools,
+            timeout=float(os.getenv("TOOL_TIMEOUT", "10")),
+            timeouts=parse_timeouts(os.getenv("TOOL_TIMEOUTS", "")),
+            turn_budget=float(os.getenv("TOOL_TURN_BUDGET", "30")),
+            max_parallel=int(os.getenv("TOOL_MAX_PARALLEL", "4")),
+            max_rounds=int(os.getenv("TOOL_MAX_ROUNDS", "4")),
+            breaker_failures=int(os.getenv("TOOL_BREAKER_FAILURES", "3")),
+            breaker_reset=float(os.getenv("TOOL_BREAKER_RESET", "30")),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds_capped": self.rounds_capped,
+            "tools": {name: stats.as_dict(self.breakers[name]) for name, stats in self.stats_by_tool.items()},
+        }
+
+    def _remaining(self, state: Dict[str, Any]) -> float:
+        started = state.get("turn_started")
+        if not started:
+            return self.turn_budget
+        return self.turn_budget - (time.time() - started)
+
+    def _error(self, call: Dict[str, Any], text: str) -> ToolMessage:
+        return ToolMessage(content=f"Error: {text}", name=call["name"], tool_call_id=call["id"], status="error")
+
+    def _plan(self, state: Dict[str, Any]):
+        """Return (calls to run with their timeouts, messages decided without running anything)."""
+        message = state["messages"][-1]
+        calls = message.tool_calls if isinstance(message, AIMessage) else []
+        rounds = tool_rounds(state["messages"])
+        if rounds > self.max_rounds:
+            with self._lock:
+                self.rounds_capped += 1
+            refused = [self._error(call, "tool limit for this turn reached; answer with the information you already have.") for call in calls]
+            if rounds > self.max_rounds + 1:
+                # The model ignored the refusal; end the turn rather than loop.
+                refused.append(AIMessage(content=LIMIT_REPLY))
+            return [], refused
+
+        remaining = self._remaining(state)
+        runnable, decided = [], []
+        for call in calls:
+            name = call["name"]
+            if name not in self.tools:
+                decided.append(self._error(call, f"{name} is not a valid tool, try one of [{', '.join(self.tools)}]."))
+            elif remaining <= 0:
+                self._count(name, rejected=True)
+                decided.append(self._error(call, f"{name} was skipped because the time budget for this turn ran out."))
+            elif not self.breakers[name].allow():
+                self._count(name, rejected=True)
+                decided.append(self._error(call, f"{name} is temporarily unavailable after repeated failures."))
+            else:
+                runnable.append((call, min(self.timeouts.get(name, self.timeout), remaining)))
+        return runnable, decided
+
+    def _count(self, name: str, seconds: float = 0.0, error: bool = False, timeout: bool = False, rejected: bool = False) -> None:
+        with self._lock:
+            stats = self.stats_by_tool[name]
+            if rejected:
+                stats.rejected += 1
+                return
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.errors += error
+            stats.timeouts += timeout
+
+    def _finish(self, call: Dict[str, Any], started: float, result: Any = None, error: Optional[BaseException] = None, timeout: Optional[float] = None) -> ToolMessage:
+        name = call["name"]
+        elapsed = time.perf_counter() - started
+        if timeout is not None:
+            self._count(name, elapsed, timeout=True)
+            self.breakers[name].record(False)
+            return self._error(call, f"{name} did not respond within {timeout:.3g}s; answer without it or suggest trying again later.")
+        if error is not None:
+            self._count(name, elapsed, error=True)
+            self.breakers[name].record(False)
+            return self._error(call, f"{error!r}\n Please fix your mistakes.")
+        self._count(name, elapsed)
+        self.breakers[name].record(True)
+        return result
+
+    def _order(self, calls: List[Dict[str, Any]], messages: List[BaseMessage]) -> Dict[str, List[BaseMessage]]:
+        """Results in the order the model made the calls; a closing reply goes last."""
+        by_id = {message.tool_call_id: message for message in messages if isinstance(message, ToolMessage)}
+        ordered = [by_id[call["id"]] for call in calls if call["id"] in by_id]
+        return {"messages": ordered + [message for message in messages if not isinstance(message, ToolMessage)]}
+
+    def invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        runnable, results = self._plan(state)
+        # At most max_parallel calls at once, like the semaphore in ainvoke.
+        for batch in range(0, len(runnable), self.max_parallel):
+            futures = [
+                (call, timeout, time.perf_counter(), submit_tool_call(self.tools[call["name"]].invoke, {**call, "type": "tool_call"}))
+                for call, timeout in runnable[batch:batch + self.max_parallel]
+            ]
+            for call, timeout, started, future in futures:
+                try:
+                    wait = max(0.0, timeout - (time.perf_counter() - started))
+                    results.append(self._finish(call, started, result=future.result(timeout=wait)))
+                except FutureTimeout:
+                    future.cancel()
+                    results.append(self._finish(call, started, timeout=timeout))
+                except Exception as e:
+                    results.append(self._finish(call, started, error=e))
+        return self._order(state["messages"][-1].tool_calls, results)
+
+    async def ainvoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        runnable, results = self._plan(state)
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def run(call: Dict[str, Any], timeout: float) -> ToolMessage:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(self.tools[call["name"]].ainvoke({**call, "type": "tool_call"}), timeout)
+                except asyncio.TimeoutError:
+                    return self._finish(call, started, timeout=timeout)
+                except Exception as e:
+                    return self._finish(call, started, error=e)
+                return self._finish(call, started, result=result)
+
+        results += await asyncio.gather(*(run(call, timeout) for call, timeout in runnable))
+        return self._order(state["messages"][-1].tool_calls, results)
+
+
+def route_after_tools(state: Dict[str, Any]) -> str:
+    """Conditional edge: the tools node may close the turn when the round cap is exceeded."""
+    last = state["messages"][-1]
+    return END if isinstance(last, AIMessage) else "assistant"
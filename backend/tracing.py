@@ -0,0 +1,117 @@
+"""LangChain callbacks that feed the request trace and metrics (see shared/telemetry.py).
+
+Pass ``graph_callbacks`` in the config of a graph run. Graph nodes, model
+calls (with token counts), tool calls and retriever calls are then
+recorded as spans of the current request.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from shared.telemetry import REGISTRY, SERVICE, current_trace, record_span
+
+LLM_TOKENS = REGISTRY.counter("app_llm_tokens_total", "Model tokens by model and direction.", ("service", "model", "direction"))
+RETRIEVED_DOCUMENTS = REGISTRY.histogram(
+    "app_retrieved_documents", "Documents returned per retriever call.", ("service", "retriever"), buckets=(0, 1, 2, 4, 8, 16, 32)
+)
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    name = params.get("model") or params.get("model_name") or (serialized or {}).get("name") or "model"
+    return str(name).removeprefix("models/")
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Times graph nodes, model, tool and retriever runs by their LangChain run IDs."""
+
+    # Inline, so the handler sees the request's context variables.
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[str, str, float]] = {}
+
+    def _start(self, run_id: UUID, kind: str, name: str) -> None:
+        self._runs[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any) -> Optional[Tuple[str, str]]:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        kind, name, started = run
+        record_span(kind, name, time.perf_counter() - started, type(error).__name__ if error else None, **attributes)
+        return kind, name
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        name = kwargs.get("name")
+        parent = self._runs.get(parent_run_id) if parent_run_id else None
+        # A node's own runnable shows up nested under the node run with the same name.
+        if node and name == node and not node.startswith("__") and not (parent and parent[0] == "node" and parent[1] == node):
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm", _model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm", _model_name(serialized, kwargs))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        usage: Dict[str, int] = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                for key, value in (getattr(message, "usage_metadata", None) or {}).items():
+                    if key in ("input_tokens", "output_tokens"):
+                        usage[key] = usage.get(key, 0) + value
+        if run is not None:
+            for key, value in usage.items():
+                LLM_TOKENS.inc(SERVICE["name"], run[1], key.removesuffix("_tokens"), amount=value)
+        self._end(run_id, **usage)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "retrieval", kwargs.get("name") or (serialized or {}).get("name") or "retriever")
+
+    def on_retriever_end(self, documents: List[Any], *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._end(run_id, hits=len(documents))
+        if run is not None:
+            RETRIEVED_DOCUMENTS.observe(len(documents), SERVICE["name"], run[1])
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+
+graph_callbacks = [TelemetryCallbackHandler()]
+
+
+def request_tokens() -> int:
+    """Model tokens, input and output, recorded so far in the current request's trace."""
+    trace = current_trace()
+    if trace is None:
+        return 0
+    return sum(
+        span.attributes.get("input_tokens", 0) + span.attributes.get("output_tokens", 0)
+        for span in list(trace.spans)
+        if span.kind == "llm"
+    )